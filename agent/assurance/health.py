@@ -33,12 +33,22 @@ class Metric():
       self.islist=bool(int(islist))
       self.counter=bool(counter)
       
+# subservice path prefixes and the collectors they read from, most
+# specific first
+_collector_paths = [
+   ("/node/bm/cgroups", "cgroup"),
+   ("/node/bm", "bm"),
+   ("/node/vm", "vm"),
+   ("/node/kb", "vpp"),
+]
+
 class HealthEngine():
    def __init__(self, data, info, parent):      
       self._data = data
       self.info = info
       self.parent = parent
       self.sysinfo = SysInfo()
+      self.stale = set()
       
       self._data["/node/vm"], self._data["/node/kb"] = {}, {}
       self._data["symptoms"] = []
@@ -117,6 +127,15 @@ class HealthEngine():
                             r["unit"], r["is_list"], r["counter"])
             self.metrics[r["name"]] = metric
             
+   def is_stale(self, path):
+      """
+      @return True if the collector subservice path reads from is stale
+      """
+      for prefix, collector in _collector_paths:
+         if path.startswith(prefix):
+            return collector in self.stale
+      return False
+
    def _update_graph_changed_timestamp(self):
       self.dependency_graph_changed = str(time.time())
       self.dependency_graph_version += 1
@@ -135,7 +154,7 @@ class HealthEngine():
       root_path = self.root.fullname
       
       # . update vms&kbs
-      if self.vbox_supported:
+      if self.vbox_supported and "vm" not in self.stale:
          vms = set(s.name for s in self.root.dependencies if isinstance(s, VM))
          monitored_vms = set(self._data["virtualbox/vms"].keys())
          # remove expired nodes
@@ -146,7 +165,7 @@ class HealthEngine():
          for vm in monitored_vms - vms:
             self.add_node(self.root, vm, "vm", hypervisor="virtualbox")
          
-      if "vpp/gnmi" in self._data:
+      if "vpp/gnmi" in self._data and "vpp" not in self.stale:
          kbs = set(s.name for s in self.root.dependencies if isinstance(s, KBNet))
          monitored_kbs = set(self._data["vpp/gnmi"].keys())
          # local vpp 
@@ -183,14 +202,15 @@ class HealthEngine():
                                 subdict=self._data["/node/bm/net/ioam"][ioam_node])
          
       # interfaces
-      # .a bm interfaces
-      parent = self.get_node(root_path+"/bm/net")
-      current=set(self._data["net/dev"].keys())
-      previous=set(self._data["/node/bm/net/if"].keys())
-      self._update_childs(previous, current, parent, "if")
+      if "bm" not in self.stale:
+         # .a bm interfaces
+         parent = self.get_node(root_path+"/bm/net")
+         current=set(self._data["net/dev"].keys())
+         previous=set(self._data["/node/bm/net/if"].keys())
+         self._update_childs(previous, current, parent, "if")
 
       # .b vm interfaces
-      if self.vbox_supported:
+      if self.vbox_supported and "vm" not in self.stale:
          vms = set(s.name for s in self.root.dependencies if isinstance(s, VM))
          for vm in vms:
             parent = self.get_node(root_path+"/vm[name={}]/net".format(vm))
@@ -216,50 +236,61 @@ class HealthEngine():
                if_node._vbox_api_prefix = prefixes[if_name]
             
       # .c kb interfaces
-      kbs = set(s.name for s in self.root.dependencies if isinstance(s, KBNet))       
-      for kb in kbs:
-         parent = self.get_node(root_path+"/kb[name={}]/net".format(kb))
-         previous = set(s.name for s in parent.dependencies) 
-         if kb == "localhost":
-            current = set(self._data["vpp/stats/if"].keys())
-         else:
-            current = set(self._data["vpp/gnmi"][kb]["net_if"])
-         self._update_childs(previous, current, parent, "if",
-                             subdict=self._data["/node/kb"][kb])
+      if "vpp" not in self.stale:
+         kbs = set(s.name for s in self.root.dependencies if isinstance(s, KBNet))       
+         for kb in kbs:
+            parent = self.get_node(root_path+"/kb[name={}]/net".format(kb))
+            previous = set(s.name for s in parent.dependencies) 
+            if kb == "localhost":
+               current = set(self._data["vpp/stats/if"].keys())
+            else:
+               current = set(self._data["vpp/gnmi"][kb]["net_if"])
+            self._update_childs(previous, current, parent, "if",
+                                subdict=self._data["/node/kb"][kb])
       
-      # disks
-      parent = self.get_node(root_path+"/bm/disks")
       # init metric rbs if needed
-      if "/node/bm/disks/disk" not in self._data:
-         self._data["/node/bm/disks/disk"] = {}
-      previous=set(self._data["/node/bm/disks/disk"].keys())
-      current=set(list(self._data["diskstats"].keys())
-                  +list(self._data["swaps"].keys()))
-      self._update_childs(previous, current, parent, "disk")
+      for path in ["/node/bm/disks/disk", "/node/bm/sensors/sensor",
+                   "/node/bm/cpus/cpu"]:
+         if path not in self._data:
+            self._data[path] = {}
+
+      # disks
+      if "bm" not in self.stale:
+         parent = self.get_node(root_path+"/bm/disks")
+         previous=set(self._data["/node/bm/disks/disk"].keys())
+         current=set(list(self._data["diskstats"].keys())
+                     +list(self._data["swaps"].keys()))
+         self._update_childs(previous, current, parent, "disk")
             
-      # sensors
-      parent = self.get_node(root_path+"/bm/sensors")
-      if "/node/bm/sensors/sensor" not in self._data:
-         self._data["/node/bm/sensors/sensor"] = {}
-      previous=set(self._data["/node/bm/sensors/sensor"].keys())
-      current=set(
-         [k+":"+d["type"]._top() for k,d in self._data["sensors/thermal"].items()]
-       + [k+":"+d["label"]._top() for k,d in self._data["sensors/fans"].items()]
-       + [k+":"+d["label"]._top() for k,d in self._data["sensors/coretemp"].items()]
-      )
-      self._update_childs(previous, current, parent, "sensor")
+         # sensors
+         parent = self.get_node(root_path+"/bm/sensors")
+         previous=set(self._data["/node/bm/sensors/sensor"].keys())
+         current=set(
+            [k+":"+d["type"]._top() for k,d in self._data["sensors/thermal"].items()]
+          + [k+":"+d["label"]._top() for k,d in self._data["sensors/fans"].items()]
+          + [k+":"+d["label"]._top() for k,d in self._data["sensors/coretemp"].items()]
+         )
+         self._update_childs(previous, current, parent, "sensor")
+
+      # cgroups
+      if "cgroups" in self._data and "cgroup" not in self.stale:
+         parent = self.get_node(root_path+"/bm/cgroups")
+         if "/node/bm/cgroups/cgroup" not in self._data:
+            self._data["/node/bm/cgroups/cgroup"] = {}
+         previous=set(self._data["/node/bm/cgroups/cgroup"].keys())
+         with self._data["cgroups"].lock():
+            current=set(self._data["cgroups"].keys())
+         self._update_childs(previous, current, parent, "cgroup")
       
       # cpus (they are dynamic if agent is ran in vm)
-      parent = self.get_node(root_path+"/bm/cpus")
-      if "/node/bm/cpus/cpu" not in self._data:
-         self._data["/node/bm/cpus/cpu"] = {}
-      
-      previous=set(self._data["/node/bm/cpus/cpu"].keys())
-      current=set(self._data["stat/cpu"].keys())
-      self._update_childs(previous, current, parent, "cpu")
+      if "bm" not in self.stale:
+         parent = self.get_node(root_path+"/bm/cpus")
+         previous=set(self._data["/node/bm/cpus/cpu"].keys())
+         current=set(self._data["stat/cpu"].keys())
+         self._update_childs(previous, current, parent, "cpu")
       
       #.a vm cpus
-      if self.vbox_supported:
+      if self.vbox_supported and "vm" not in self.stale:
          for vm in vms:
             parent = self.get_node(root_path+"/vm[name={}]/cpus".format(vm))
             previous = set(s.name for s in parent.dependencies)
@@ -338,7 +369,12 @@ class HealthEngine():
       parent.remove_node(name, _type)
       self._update_graph_changed_timestamp()
       
-   def update_health(self):
+   def update_health(self, stale=[]):
+      """
+      @param stale the collectors still writing their input, subservices
+                   that read from them keep their previous metrics
+      """
+      self.stale = set(stale)
       self._update_dependency_graph()
       self.root.update_metrics()
       self._data["symptoms"], self._data["health_scores"] = self.root.update_symptoms()
@@ -604,7 +640,9 @@ class Subservice():
       update metrics for this subservice and its dependencies
 
       """
-      self._update_metrics()
+      # stale input is still being written, keep the previous metrics
+      if not self.engine.is_stale(self.path):
+         self._update_metrics()
       if not self.active:
          return
       for subservice in self.dependencies:
@@ -628,6 +666,8 @@ class Subservice():
    ("Linux","/node/bm/disks/disk") : self._update_metrics_linux_bm_disks_disk,
    ("Linux","/node/bm/mem")        : self._update_metrics_linux_bm_mem,
    ("Linux","/node/bm/proc")       : self._update_metrics_linux_bm_proc,
+   ("Linux","/node/bm/cgroups")    : self._update_metrics_linux_bm_cgroups,
+   ("Linux","/node/bm/cgroups/cgroup") : self._update_metrics_linux_bm_cgroups_cgroup,
    ("Linux","/node/bm/net")        : self._update_metrics_linux_bm_net,
    ("Linux","/node/bm/net/if")     : self._update_metrics_linux_bm_net_if,
    ("Linux","/node/bm/net/ioam")   : self._update_metrics_linux_bm_net_ioam,
@@ -654,22 +694,42 @@ class Subservice():
       
       """
       cpu_label = self.name
-      rbs = self._data["stat/cpu"].get(cpu_label)
-      if rbs:
-         self._data["/node/bm/cpus/cpu"][cpu_label]["idle_time"].append(
-            rbs["idle_all_perc"]._top())
-         self._data["/node/bm/cpus/cpu"][cpu_label]["system_time"].append(
-            rbs["system_all_perc"]._top())
-         self._data["/node/bm/cpus/cpu"][cpu_label]["user_time"].append(
-            rbs["user_perc"]._top())
-         self._data["/node/bm/cpus/cpu"][cpu_label]["guest_time"].append(
-            rbs["guest_all_perc"]._top())      
+      # read from the percentages matrix of the last /proc/stat sample
+      bm_watcher = self.engine.parent.bm_watcher
+      percs = bm_watcher.stat_cpu_perc.get(cpu_label)
+      if percs:
+         index = bm_watcher.stat_perc_index
+         rbs = self._data["/node/bm/cpus/cpu"][cpu_label]
+         rbs["idle_time"].append(percs[index["idle_all_perc"]])
+         rbs["system_time"].append(percs[index["system_all_perc"]])
+         rbs["user_time"].append(percs[index["user_perc"]])
+         rbs["guest_time"].append(percs[index["guest_all_perc"]])
+      # network softirqs
+      softirqs = self._data["softirqs"].get(cpu_label)
+      if softirqs and not softirqs["NET_RX"].is_empty():
+         rbs = self._data["/node/bm/cpus/cpu"][cpu_label]
+         rbs["net_rx_rate"].append(softirqs["NET_RX"]._top())
+         rbs["net_tx_rate"].append(softirqs["NET_TX"]._top())
 
    def _update_metrics_linux_bm_cpus(self):
       """Update metrics for linux BM cpu subservice
 
       """
-      pass
+      # distribution of receive softirqs over online cpus
+      rates = [rbs["NET_RX"]._top()
+               for cpu_label, rbs in self._data["softirqs"].items()
+               if cpu_label in self._data["stat/cpu"]
+                  and not rbs["NET_RX"].is_empty()]
+      if rates:
+         total = sum(rates)
+         self._data["/node/bm/cpus"]["net_rx_total"].append(total)
+         self._data["/node/bm/cpus"]["net_rx_imbalance"].append(
+            round(max(rates)*len(rates)/total, 2) if total else 1.0)
+      # pressure stall information
+      pressure = self._data["pressure"].get("cpu")
+      if pressure and not pressure["some_avg10"].is_empty():
+         self._data["/node/bm/cpus"]["psi_cpu_some"].append(
+            pressure["some_avg10"]._top())
             
    def _update_metrics_linux_bm_sensors_sensor(self):
       """Update metrics for linux a BM sensor subservice
@@ -723,12 +783,14 @@ class Subservice():
       disk = self.name
       rbs  = self._data["diskstats"].get(disk)
       if rbs:
+         # backing devices are not mounted
          self._data["/node/bm/disks/disk"][disk]["type"].append(
-            rbs["fs_vfstype"]._top())
-         self._data["/node/bm/disks/disk"][disk]["total_user"].append(
-            rbs["total"]._top()/1000.0)
-         self._data["/node/bm/disks/disk"][disk]["free_user"].append(
-            rbs["free_user"]._top()/1000.0)
+            rbs["fs_vfstype"]._top() or rbs["device_type"]._top())
+         if not rbs["total"].is_empty():
+            self._data["/node/bm/disks/disk"][disk]["total_user"].append(
+               rbs["total"]._top()/1000.0)
+            self._data["/node/bm/disks/disk"][disk]["free_user"].append(
+               rbs["free_user"]._top()/1000.0)
          self._data["/node/bm/disks/disk"][disk]["read_time"].append(
             rbs["perc_reading"]._top())
          self._data["/node/bm/disks/disk"][disk]["write_time"].append(
@@ -737,6 +799,22 @@ class Subservice():
             rbs["perc_io"]._top())
          self._data["/node/bm/disks/disk"][disk]["discard_time"].append(
             rbs["perc_discarding"]._top())
+         attr_mapping = {"read_iops": "read_iops",
+                         "write_iops": "write_iops",
+                         "read_throughput": "read_throughput",
+                         "write_throughput": "write_throughput",
+                         "read_await": "read_await",
+                         "write_await": "write_await",
+                         "queue_depth": "queue_depth",
+                         "inflight_reads": "inflight_reads",
+                         "inflight_writes": "inflight_writes",}
+         for attr,metric in attr_mapping.items():
+            if not rbs[attr].is_empty():
+               self._data["/node/bm/disks/disk"][disk][metric].append(
+                  rbs[attr]._top())
+         if not rbs["responsive"].is_empty():
+            self._data["/node/bm/disks/disk"][disk]["responsive"].append(
+               rbs["responsive"]._top())
 
       rbs = self._data["swaps"].get(disk)
       if rbs:
@@ -750,7 +828,13 @@ class Subservice():
       """Update metrics for linux BM disks subservice
 
       """
-      pass
+      # pressure stall information
+      pressure = self._data["pressure"].get("io")
+      if pressure and not pressure["some_avg10"].is_empty():
+         self._data["/node/bm/disks"]["psi_io_some"].append(
+            pressure["some_avg10"]._top())
+         self._data["/node/bm/disks"]["psi_io_full"].append(
+            pressure["full_avg10"]._top())
 
    def _update_metrics_linux_bm_mem(self):
       """Update metrics for linux BM mem subservice
@@ -778,6 +862,47 @@ class Subservice():
          self._data["meminfo"]["HugePages_Rsvd"]._top())
       self._data["/node/bm/mem"]["pages_size"].append(
          self._data["meminfo"]["Hugepagesize"]._top()/1000)
+      # reclaim, stalls and faults
+      summary = self._data["vmstat/summary"]
+      if not summary["pgscan"].is_empty():
+         for attr, metric in [("pgscan", "pgscan_rate"),
+                              ("allocstall", "allocstall_rate"),
+                              ("compact_stall", "compact_stall_rate"),
+                              ("pgmajfault", "pgmajfault_rate"),
+                              ("reclaim_efficiency", "reclaim_efficiency")]:
+            self._data["/node/bm/mem"][metric].append(summary[attr]._top())
+      # free memory fragmentation, over all zones
+      zones = self._data["buddyinfo"].values()
+      free = sum(rbs["free_pages"]._top() for rbs in zones)
+      if free:
+         self._data["/node/bm/mem"]["frag_index"].append(round(
+            sum(rbs["free_pages"]._top()*rbs["unusable_index"]._top()
+                for rbs in zones)/free, 2))
+      # slabs
+      self._data["/node/bm/mem"]["slab_total"].append(
+         self._data["meminfo"]["Slab"]._top()/1000)
+      with self._data["slabinfo"].lock():
+         top = max(self._data["slabinfo"].items(), default=None,
+                   key=lambda item: item[1]["size"]._top())
+      if top:
+         self._data["/node/bm/mem"]["slab_top_cache"].append(top[0])
+         self._data["/node/bm/mem"]["slab_top_size"].append(
+            top[1]["size"]._top()/1000000)
+      # allocations that missed their preferred numa node
+      hits = sum(rbs["numa_hit"].delta(count=1)
+                 for rbs in self._data["numa/numastat"].values())
+      misses = sum(rbs["numa_miss"].delta(count=1)
+                   for rbs in self._data["numa/numastat"].values())
+      if hits+misses:
+         self._data["/node/bm/mem"]["numa_miss_perc"].append(
+            round(misses/(hits+misses)*100.0, 2))
+      # pressure stall information
+      pressure = self._data["pressure"].get("memory")
+      if pressure and not pressure["some_avg10"].is_empty():
+         self._data["/node/bm/mem"]["psi_mem_some"].append(
+            pressure["some_avg10"]._top())
+         self._data["/node/bm/mem"]["psi_mem_full"].append(
+            pressure["full_avg10"]._top())
 
    def _update_metrics_linux_bm_proc(self):
       """Update metrics for linux BM proc subservice
@@ -798,6 +923,44 @@ class Subservice():
       self._data["/node/bm/proc"]["dead_count"].append(
          self._data["stats_global"]["dead_count"]._top())
 
+   def _update_metrics_linux_bm_cgroups_cgroup(self):
+      """Update metrics for a linux BM cgroup subservice
+
+      """
+      cgroup = self.name
+      rbs = self._data["cgroups"].get(cgroup)
+      if not rbs:
+         return
+      metrics = self._data["/node/bm/cgroups/cgroup"][cgroup]
+      attr_mapping = {"cpu_usage_perc": "cpu_usage",
+                      "throttled_perc": "cpu_throttled",
+                      "cpu_some_avg10": "cpu_some_pressure",
+                      "memory_some_avg10": "mem_some_pressure",
+                      "memory_full_avg10": "mem_full_pressure",
+                      "io_some_avg10": "io_some_pressure",
+                      "io_full_avg10": "io_full_pressure",}
+      for attr,metric in attr_mapping.items():
+         if not rbs[attr].is_empty():
+            metrics[metric].append(rbs[attr]._top())
+      # memory controller may not be enabled for this cgroup
+      attr_mapping = {"memory_current": "mem_current",
+                      "anon": "mem_anon",
+                      "file": "mem_file",}
+      for attr,metric in attr_mapping.items():
+         if not rbs[attr].is_empty():
+            metrics[metric].append(rbs[attr]._top()/1000000)
+      attr_mapping = {"rbytes": "io_read",
+                      "wbytes": "io_write",}
+      for attr,metric in attr_mapping.items():
+         if not rbs[attr].is_empty():
+            metrics[metric].append(rbs[attr]._top()/1000)
+
+   def _update_metrics_linux_bm_cgroups(self):
+      """Update metrics for linux BM cgroups subservice
+
+      """
+      pass
+
 
    def _update_metrics_linux_bm_net_if(self):
       attr_mapping = {"rx_packets": "rx_packets",
@@ -856,10 +1019,52 @@ class Subservice():
          if attr in rbs and not rbs[attr].is_empty():
             self._data["/node/bm/net/if"][self.name][metric].append(
               rbs[attr]._top())
-      # other fields
-      if "ip4_gw_addr" in rbs:
-         self._data["/node/bm/net/if"][self.name]["gw_in_arp"].append(
-            rbs["ip4_gw_addr"]._top() in self._data["net/arp"])
+      # interrupts
+      rbs = self._data["net/irqs"].get(self.name)
+      if rbs:
+         metrics = self._data["/node/bm/net/if"][self.name]
+         metrics["irq_rate"].append(rbs["rate"]._top())
+         metrics["irq_cpus"].append(rbs["cpu_count"]._top())
+      # interrupts affinity
+      rbs = self._data["net/irq_affinity"].get(self.name)
+      if rbs:
+         metrics = self._data["/node/bm/net/if"][self.name]
+         metrics["irq_affinity_remote"].append(rbs["remote_perc"]._top())
+         metrics["irq_affinity_cpus"].append(rbs["affinity_cpus"]._top())
+      # numa locality
+      rbs = self._data["numa/net"].get(self.name)
+      if rbs:
+         metrics = self._data["/node/bm/net/if"][self.name]
+         if not rbs["irq_remote_perc"].is_empty():
+            metrics["numa_irq_remote"].append(rbs["irq_remote_perc"]._top())
+         if not rbs["proc_remote_perc"].is_empty():
+            metrics["numa_proc_remote"].append(
+               rbs["proc_remote_perc"]._top())
+      # egress root qdisc, its statistics include children qdiscs
+      rbs = self._data["net/qdisc"].get(self.name+":root")
+      if rbs:
+         metrics = self._data["/node/bm/net/if"][self.name]
+         metrics["qdisc"].append(rbs["kind"]._top())
+         metrics["qdisc_bytes"].append(rbs["bytes"]._top())
+         metrics["qdisc_packets"].append(rbs["packets"]._top())
+         metrics["qdisc_drops"].append(rbs["drops"]._top())
+         metrics["qdisc_overlimits"].append(rbs["overlimits"]._top())
+         metrics["qdisc_requeues"].append(rbs["requeues"]._top())
+         metrics["qdisc_backlog"].append(rbs["backlog"]._top())
+         metrics["qdisc_qlen"].append(rbs["qlen"]._top())
+      # neighbours
+      rbs = self._data["net/neigh"].get(self.name)
+      if rbs:
+         metrics = self._data["/node/bm/net/if"][self.name]
+         metrics["neigh_count"].append(rbs["total"]._top())
+         metrics["neigh_failed"].append(rbs["failed"]._top())
+         metrics["neigh_incomplete"].append(rbs["incomplete"]._top())
+         # gateways with a usable neighbour entry
+         for attr,metric in [("ip4_gw_state", "gw_in_arp"),
+                             ("ip6_gw_state", "gw_in_ndisc")]:
+            if not rbs[attr].is_empty():
+               metrics[metric].append(
+                  rbs[attr]._top() not in ["incomplete", "failed", "none"])
             
    def _update_metrics_linux_bm_net_ioam_ns(self):
       self.ioam_node = self.parent.name
@@ -895,6 +1100,72 @@ class Subservice():
          if metric_name not in self._data["/node/bm/net"]:
             continue
          self._data["/node/bm/net"][metric_name].append(rb._top())
+      # routing tables aggregates
+      summary = self._data["routes/summary"]
+      if summary:
+         self._data["/node/bm/net"]["route4_count"].append(
+            summary["ipv4"]["total"]._top())
+         self._data["/node/bm/net"]["route6_count"].append(
+            summary["ipv6"]["total"]._top())
+         self._data["/node/bm/net"]["route4_main"].append(
+            summary["ipv4"]["main"]._top())
+         self._data["/node/bm/net"]["route6_main"].append(
+            summary["ipv6"]["main"]._top())
+         self._data["/node/bm/net"]["route4_default"].append(
+            summary["ipv4"]["default"]._top())
+         self._data["/node/bm/net"]["route6_default"].append(
+            summary["ipv6"]["default"]._top())
+         self._data["/node/bm/net"]["route_churn"].append(
+            summary["ipv4"]["churn"]._top()+summary["ipv6"]["churn"]._top())
+      # softnet backlog, summed over cpus
+      softnet = self._data["softnet"].values()
+      if softnet:
+         self._data["/node/bm/net"]["softnet_dropped"].append(
+            sum(rbs["dropped_rate"]._top() for rbs in softnet))
+         self._data["/node/bm/net"]["softnet_squeezed"].append(
+            sum(rbs["squeeze_rate"]._top() for rbs in softnet))
+      backlog = self._data["proc/sys"]["net.core.netdev_max_backlog"]
+      if not backlog.is_empty():
+         max_backlog = int(backlog._top())
+         self._data["/node/bm/net"]["netdev_max_backlog"].append(max_backlog)
+         # fullest backlog queue, relative to netdev_max_backlog
+         if softnet and max_backlog:
+            self._data["/node/bm/net"]["softnet_backlog"].append(
+               round(max(rbs["backlog_len"]._top() for rbs in softnet)
+                     / max_backlog*100.0, 2))
+      # conntrack table
+      conntrack = self._data["conntrack/summary"]
+      if conntrack:
+         self._data["/node/bm/net"]["conntrack_count"].append(
+            conntrack["count"]._top())
+         self._data["/node/bm/net"]["conntrack_max"].append(
+            conntrack["max"]._top())
+         self._data["/node/bm/net"]["conntrack_fill"].append(
+            conntrack["fill_perc"]._top())
+         attr_mapping = {"drop": "conntrack_drop",
+                         "early_drop": "conntrack_early_drop",
+                         "insert_failed": "conntrack_insert_failed",}
+         for attr,metric in attr_mapping.items():
+            if attr in conntrack:
+               self._data["/node/bm/net"][metric].append(
+                  conntrack[attr]._top())
+      # tcp sockets
+      tcp = self._data["sockets"]["tcp"]
+      if not tcp["total"].is_empty():
+         self._data["/node/bm/net"]["tcp_established"].append(
+            tcp["established"]._top())
+         self._data["/node/bm/net"]["tcp_time_wait"].append(
+            tcp["time_wait"]._top())
+         self._data["/node/bm/net"]["tcp_syn_recv"].append(
+            tcp["syn_recv"]._top()+tcp["new_syn_recv"]._top())
+         self._data["/node/bm/net"]["tcp_retrans"].append(
+            tcp["retrans"]._top())
+         # fullest accept queue
+         with self._data["sockets/listen"].lock():
+            percs = [rbs["accept_perc"]._top()
+                     for rbs in self._data["sockets/listen"].values()]
+         self._data["/node/bm/net"]["tcp_accept_queue"].append(
+            max(percs, default=0))
          
    def _update_metrics_linux_vm_cpus(self):
       """Update metrics for linux VM cpu subservice
@@ -1130,11 +1401,13 @@ class Baremetal(Subservice):
    def __init__(self, _type, name, engine, parent=None):
       super(Baremetal, self).__init__(_type, name, engine, parent=parent)
       
-      deps = ["cpus", "sensors", "disks", "mem", "proc", "net"]
+      deps = ["cpus", "sensors", "disks", "mem", "proc", "net", "cgroups"]
       self.dependencies = [Subservice(dep, None, self.engine, parent=self) for dep in deps]
       # init metrics for non-list RBs
       self._data["/node/bm/net/if"] = {}
       self._data["/node/bm/net/ioam"] = {}
+      self._data["/node/bm/cpus"] = self._init_metrics_rb("cpus")
+      self._data["/node/bm/disks"] = self._init_metrics_rb("disks")
       self._data["/node/bm/net"] = self._init_metrics_rb("net")
       self._data["/node/bm/mem"] = self._init_metrics_rb("mem")
       self._data["/node/bm/proc"] = self._init_metrics_rb("proc")
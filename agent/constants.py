@@ -2,6 +2,9 @@
 # pick a divider of 60
 AGENT_INPUT_PERIOD=3.0
 
+# minimum delay between early pressure refreshes on stall events
+AGENT_WAKE_PERIOD=1.0
+
 # shmem reading delay
 TOP_INPUT_PERIOD=3.0
 
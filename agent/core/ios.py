@@ -12,6 +12,9 @@ import configparser
 import logging
 import logging.config
 import os
+import ipaddress
+
+from ..input.psi import parse_trigger
 
 class IOManager():
    """
@@ -166,6 +169,16 @@ class IOManager():
       # parse gnmi target url
       self.gnmi_target = self.config["gnmi"].get("target")
 
+      # collectors deadlines, in seconds
+      self.collector_deadlines = {}
+      for collector in ["bm", "cgroup", "vm", "vpp"]:
+         self.collector_deadlines[collector] = self.config["core"].getfloat(
+                  collector+"_deadline", 2.0)
+
+      # self-monitoring, trace allocations of each stage
+      self.trace_malloc = self.config["core"].getboolean("trace_malloc",
+                                                         False)
+
       # parse VPP gNMI nodes
       self.vpp_gnmi_nodes = []
       vpp_gnmi_nodes = self.config["vpp"].get("gnmi_nodes")
@@ -177,7 +190,68 @@ class IOManager():
       ioam_gnmi_nodes = self.config["ioam"].get("gnmi_nodes")
       if ioam_gnmi_nodes:
          self.ioam_gnmi_nodes = [node.rstrip().lstrip() for node in ioam_gnmi_nodes.split(",")]
-      
+
+      # baremetal collection settings
+      if not self.config.has_section("baremetal"):
+         self.config.add_section("baremetal")
+      self.route_tracking = self.config["baremetal"].get("route_tracking",
+                                                         "events")
+      if self.route_tracking not in ["events", "dump"]:
+         print("Invalid route_tracking:", self.route_tracking)
+         sys.exit(1)
+      self.route_summary = self.config["baremetal"].getboolean(
+                                             "route_summary", False)
+      route_watch = self.config["baremetal"].get("route_watch",
+                                                 "0.0.0.0/0, ::/0")
+      self.route_watch = [prefix.rstrip().lstrip() for prefix
+                          in route_watch.split(",") if prefix.strip()]
+      for prefix in self.route_watch:
+         try:
+            ipaddress.ip_network(prefix, strict=False)
+         except ValueError:
+            print("Invalid route_watch prefix:", prefix)
+            sys.exit(1)
+      self.neigh_tracking = self.config["baremetal"].get("neigh_tracking",
+                                                         "events")
+      if self.neigh_tracking not in ["events", "dump"]:
+         print("Invalid neigh_tracking:", self.neigh_tracking)
+         sys.exit(1)
+      self.proc_tracking = self.config["baremetal"].get("proc_tracking",
+                                                        "all")
+      self.proc_top_k = self.config["baremetal"].getint("proc_top_k", 20)
+      self.proc_top_key = self.config["baremetal"].get("proc_top_key", "cpu")
+      self.proc_top_hysteresis = self.config["baremetal"].getint(
+                                             "proc_top_hysteresis", 3)
+      if self.proc_tracking not in ["all", "topk"]:
+         print("Invalid proc_tracking:", self.proc_tracking)
+         sys.exit(1)
+      if self.proc_top_key not in ["cpu", "rss", "io"]:
+         print("Invalid proc_top_key:", self.proc_top_key)
+         sys.exit(1)
+      self.cgroup_max_depth = self.config["baremetal"].getint(
+                                             "cgroup_max_depth", 2)
+      self.cgroup_rescan_interval = self.config["baremetal"].getfloat(
+                                             "cgroup_rescan_interval", 60.0)
+      self.fsprobe_workers = self.config["baremetal"].getint(
+                                             "fsprobe_workers", 4)
+      self.fsprobe_timeout = self.config["baremetal"].getfloat(
+                                             "fsprobe_timeout", 0.5)
+      self.read_backend = self.config["baremetal"].get("read_backend",
+                                                       "io_uring")
+      if self.read_backend not in ["io_uring", "pread"]:
+         print("Invalid read_backend:", self.read_backend)
+         sys.exit(1)
+      psi_triggers = self.config["baremetal"].get("psi_triggers", "")
+      try:
+         self.psi_triggers = [parse_trigger(trigger) for trigger
+                              in psi_triggers.split(",") if trigger.strip()]
+      except ValueError as e:
+         print("Invalid psi_triggers:", e)
+         sys.exit(1)
+      if self.cgroup_max_depth < 1:
+         print("Invalid cgroup_max_depth:", self.cgroup_max_depth)
+         sys.exit(1)
+
       return self.config
 
    ########################################################
@@ -46,6 +46,21 @@ def init_rb_dict(keys, type=int, types=None,
                               unit=units[i] if units else unit) 
                for i,attr in enumerate(keys)}
 
+def append_rows(rb_dicts, keys, rows):
+   """
+   bulk append a matrix of values, row i is appended to rb_dicts[i]
+
+   Values are not cast, they must already have the ringbuffers type.
+
+   @rb_dicts a list of dicts of ringbuffers
+   @keys the dict keys, one per column
+   @rows the list of rows
+   """
+   append = collections.deque.append
+   for rbs, row in zip(rb_dicts, rows):
+      for key, val in zip(keys, row):
+         append(rbs[key], val)
+
 class Severity(Enum):
    """
    Severity indicator
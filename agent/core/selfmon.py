@@ -0,0 +1,68 @@
+"""
+selfmon.py
+
+   agent self-monitoring
+
+@author: K.Edeline
+"""
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from .rbuffer import init_rb_dict
+from .rbuffer import MDict
+
+class SelfMonitor():
+   """
+   SelfMonitor
+
+   Measure the duration of agent stages, and optionally the memory they
+   allocate, into data[category][stage].
+
+   NOTE: tracemalloc deltas are process-wide, they include allocations
+         made by concurrent collectors.
+
+   """
+   def __init__(self, data, category="agent/stages", trace_malloc=False):
+      self._data = data
+      self.category = category
+      self.trace_malloc = trace_malloc
+      # stages are added from collector threads
+      self._data[self.category] = MDict()
+      if self.trace_malloc and not tracemalloc.is_tracing():
+         tracemalloc.start()
+
+   def _stage_dict(self, stage):
+      stages = self._data[self.category]
+      if stage not in stages:
+         attr_list = ["duration", "alloc"]
+         type_list = [float, int]
+         unit_list = ["ms", "B"]
+         with stages.lock():
+            stages.setdefault(stage, init_rb_dict(attr_list, types=type_list,
+                                                units=unit_list, metric=True))
+      return stages[stage]
+
+   @contextmanager
+   def measure(self, stage):
+      """
+      time the enclosed block
+
+      @param stage the stage name
+      """
+      rbs = self._stage_dict(stage)
+      if self.trace_malloc:
+         allocated = tracemalloc.get_traced_memory()[0]
+      start = time.perf_counter()
+      try:
+         yield
+      finally:
+         rbs["duration"].append(round((time.perf_counter()-start)*1000.0, 3))
+         if self.trace_malloc:
+            rbs["alloc"].append(tracemalloc.get_traced_memory()[0]-allocated)
+
+   def exit(self):
+      if self.trace_malloc:
+         tracemalloc.stop()
+
@@ -7,16 +7,23 @@ dxagent.py
 
 """
 
-import sched
 import time
+import queue
 import signal
+import asyncio
 import importlib
+import threading
+import concurrent.futures
 
 from .constants import AGENT_INPUT_PERIOD
+from .constants import AGENT_WAKE_PERIOD
 from .core.ios import IOManager
 from .core.daemon import Daemon
+from .core.rbuffer import init_rb_dict
+from .core.selfmon import SelfMonitor
 from .input.sysinfo import SysInfo
 from .input.bm_input import BMWatcher
+from .input.cgroup_input import CGroupWatcher
 from .input.vm_input import VMWatcher
 from .input.vpp_input import VPPWatcher
 from .assurance.health import HealthEngine
@@ -43,10 +50,13 @@ class DXAgent(Daemon, IOManager):
 
    def _init(self):
       self.sysinfo = SysInfo()
-      self.scheduler = sched.scheduler()
+      # collection tick, gNMI clients, exporter and shm writer all run on
+      # this loop
+      self.loop = asyncio.new_event_loop()
 
       # ringbuffers are stored here
       self._data = {}
+      self.selfmon = SelfMonitor(self._data, trace_malloc=self.trace_malloc)
 
       # SharedMemory with dxtop.
       # Drop privileges to avoid dxtop root requirements
@@ -55,60 +65,276 @@ class DXAgent(Daemon, IOManager):
          with self.drop():
             self.sbuffer = getattr(mod, "ShareableBuffer")(create=True)
 
-      # watchers.
-      self.bm_watcher = BMWatcher(self._data, self.info, self)
-      self.vm_watcher = VMWatcher(self._data, self.info, self)
-      self.vpp_watcher = VPPWatcher(self._data, self.info, self)
+      # watchers, a collector owns the categories its watcher creates
+      self._categories = {}
+      self.bm_watcher = self._init_watcher("bm", BMWatcher)
+      self.cgroup_watcher = self._init_watcher("cgroup", CGroupWatcher)
+      self.vm_watcher = self._init_watcher("vm", VMWatcher)
+      self.vpp_watcher = self._init_watcher("vpp", VPPWatcher)
+
+      # collectors, each runs on its own worker thread
+      self._init_collectors()
 
       # health engine
       self.engine = HealthEngine(self._data, self.info, self)
 
       # exporter
+      self.exporter = None
       if self.gnmi_target:
          self.exporter = DXAgentExporter(self._data, self.info, self,
                                          target_url=self.gnmi_target)
-         self.exporter.run()
+
+      # collection tick event, created on the loop by _run()
+      self._tick = None
+      self._last_wake = None
 
       # catch signal for cleanup
-      signal.signal(signal.SIGTERM, self.exit)
+      self.loop.add_signal_handler(signal.SIGTERM, self.stop_loop)
+
+   def _init_watcher(self, name, cls):
+      """
+      @return the watcher, its categories are recorded for collector name
+      """
+      previous = set(self._data)
+      watcher = cls(self._data, self.info, self)
+      self._categories[name] = set(self._data) - previous
+      return watcher
+
+   def _init_collectors(self):
+      """
+      A collector always runs on the same worker thread, and is not
+      submitted again until its previous run has returned.
+
+      Workers are daemon threads, a collector stuck in a hung call does not
+      block exit.
 
-   def _input(self):
-      self.bm_watcher.input()
-      self.vm_watcher.input()
-      self.vpp_watcher.input()
+      """
+      self._collectors = {
+         "bm": self.bm_watcher,
+         "cgroup": self.cgroup_watcher,
+         "vm": self.vm_watcher,
+         "vpp": self.vpp_watcher,
+      }
+      self._queues = {}
+      self._workers = {}
+      self._futures = {}
+      attr_list = ["stale", "overruns", "duration"]
+      type_list = [int, int, float]
+      counter_list = [False, True, False]
+      self._data["agent/collectors"] = {}
+      for name in self._collectors:
+         self._queues[name] = queue.Queue()
+         self._workers[name] = threading.Thread(target=self._collector_worker,
+                  args=(name,), name="collector-"+name, daemon=True)
+         self._workers[name].start()
+         self._futures[name] = None
+         self._data["agent/collectors"][name] = init_rb_dict(attr_list,
+                  types=type_list, counters=counter_list)
+         self._data["agent/collectors"][name]["overruns"].append(0)
+
+   def _collector_worker(self, name):
+      """
+      run the futures submitted to collector name, until None
+      """
+      while True:
+         future = self._queues[name].get()
+         if future is None:
+            return
+         if future.set_running_or_notify_cancel():
+            future.set_result(self._run_collector(name))
+
+   def _submit(self, name):
+      """
+      @return the future of the collector run
+      """
+      future = concurrent.futures.Future()
+      self._queues[name].put(future)
+      return future
 
-   def process(self):
+   def busy_collectors(self):
+      """
+      @return the collectors still running, e.g., late ones
+      """
+      return [name for name, future in self._futures.items()
+              if future and not future.done()]
+
+   def busy_categories(self):
+      """
+      A running collector writes its categories without locking, readers
+      on the loop skip them and keep the previous values.
+
+      @return the list of categories owned by running collectors
+      """
+      return [category for name in self.busy_collectors()
+              for category in self._categories[name]]
+
+   def _run_collector(self, name):
+      """
+      @return the collector run duration, None if it failed
+      """
+      start = time.monotonic()
+      try:
+         with self.selfmon.measure(name):
+            self._collectors[name].input()
+      except Exception as e:
+         self.info("collector {} failed: {}".format(name, repr(e)))
+         return None
+      return time.monotonic() - start
+
+   async def _input(self):
+      """
+      run collectors concurrently, and wait until they return or their
+      deadline expires
+
+      A collector that misses its deadline is marked stale and keeps its
+      previous values, it is submitted again once it returns.
+
+      """
+      start = time.monotonic()
+      for name, future in self._futures.items():
+         if future and not future.done():
+            continue
+         self._futures[name] = self._submit(name)
+
+      for name, future in self._futures.items():
+         rbs = self._data["agent/collectors"][name]
+         timeout = self.collector_deadlines[name] - (time.monotonic()-start)
+         try:
+            # shield: a late collector keeps running
+            if not future.done():
+               await asyncio.wait_for(
+                     asyncio.shield(asyncio.wrap_future(future)),
+                     timeout=max(timeout, 0))
+         except asyncio.TimeoutError:
+            if not rbs["stale"]._top():
+               self.info("collector {} missed its deadline".format(name))
+            rbs["stale"].append(1)
+            rbs["overruns"].append(rbs["overruns"]._top()+1)
+            continue
+         duration = future.result()
+         if duration is None:
+            rbs["stale"].append(1)
+            continue
+         rbs["stale"].append(0)
+         rbs["duration"].append(duration)
+
+   async def process(self):
       """
       read input data, process and write it to shmem.
-      re-schedule itself.
 
       """
-      # fetch input
-      self._input()
-      # compute metrics&symptoms from input
-      self.engine.update_health()
-      # write to shmem
-      if not self.args.disable_shm:
-         skip=["stats"] if not self.args.verbose else []
-         self.sbuffer.write(self._data, skip=skip, info=self.info)
+      try:
+         # fetch input
+         with self.selfmon.measure("input"):
+            await self._input()
+         # compute metrics&symptoms from input, late collectors are still
+         # writing their categories
+         with self.selfmon.measure("health"):
+            self.engine.update_health(stale=self.busy_collectors())
+         # write to shmem
+         if not self.args.disable_shm:
+            skip=["stats"] if not self.args.verbose else []
+            skip.extend(self.busy_categories())
+            with self.selfmon.measure("shm"):
+               self.sbuffer.write(self._data, skip=skip, info=self.info)
+      except Exception as e:
+         self.info("processing failed: {}".format(repr(e)))
       #self.info(list(self.exporter._iterate_data()))
-      self.scheduler.enter(AGENT_INPUT_PERIOD,0,self.process)
 
-   def exit(self, signum=None, stackframe=None):
+   def stop_loop(self):
       """
-      cleanup before exiting
+      stop the collection tick, cleanup is done by run()
 
       """
       self.running = False
-      time.sleep(AGENT_INPUT_PERIOD)
+      # SIGTERM may arrive before _run() created the tick
+      if self._tick:
+         self._tick.set()
+
+   def wake(self):
+      """
+      refresh pressure now (e.g., on stall events), may be called from
+      any thread
+
+      """
+      if self._tick:
+         self.loop.call_soon_threadsafe(self._refresh_pressure)
+
+   def _refresh_pressure(self):
+      """
+      An early refresh only reads pressure and writes it to shmem, the
+      collectors and the health engine keep their regular period so that
+      rule windows (e.g., 1min()) keep covering their sample count.
+
+      Refreshes are at least AGENT_WAKE_PERIOD apart, and skipped while
+      the bm collector is running.
+
+      """
+      now = self.loop.time()
+      if (self._last_wake is not None
+            and now - self._last_wake < AGENT_WAKE_PERIOD):
+         return
+      if "bm" in self.busy_collectors():
+         return
+      self._last_wake = now
+      try:
+         with self.selfmon.measure("pressure"):
+            self.bm_watcher.input_pressure()
+         if not self.args.disable_shm:
+            skip=["stats"] if not self.args.verbose else []
+            skip.extend(self.busy_categories())
+            self.sbuffer.write(self._data, skip=skip, info=self.info)
+      except Exception as e:
+         self.info("pressure refresh failed: {}".format(repr(e)))
+
+   def exit(self):
+      """
+      cleanup before exiting
 
+      """
+      for name, worker in self._workers.items():
+         self._queues[name].put(None)
+      for name, worker in self._workers.items():
+         worker.join(timeout=self.collector_deadlines[name])
+         if worker.is_alive():
+            self.info("collector {} still running at exit".format(name))
       self.bm_watcher.exit()
+      self.cgroup_watcher.exit()
       self.vm_watcher.exit()
       self.vpp_watcher.exit()
+      self.selfmon.exit()
       if not self.args.disable_shm:
          self.sbuffer.unlink()
          del self.sbuffer
 
+   async def _run(self):
+      """
+      collection tick, runs every AGENT_INPUT_PERIOD
+
+      """
+      self._tick = asyncio.Event()
+      if self.exporter:
+         await self.exporter.run()
+
+      next_tick = self.loop.time()
+      while self.running:
+         await self.process()
+         # skip missed ticks rather than bursting
+         next_tick = max(next_tick+AGENT_INPUT_PERIOD, self.loop.time())
+         try:
+            await asyncio.wait_for(self._tick.wait(),
+                                   timeout=next_tick-self.loop.time())
+         except asyncio.TimeoutError:
+            pass
+         self._tick.clear()
+
+      self.exit()
+      if self.exporter:
+         await self.exporter.stop()
+      # wait for cancelled gNMI client streams
+      tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+      await asyncio.gather(*tasks, return_exceptions=True)
+
    def run(self):
       """
       main function
@@ -118,9 +344,9 @@ class DXAgent(Daemon, IOManager):
       self.running = True
 
       self.info(self.sysinfo)
-      self.process()
-
-      while self.running:
-         self.scheduler.run(blocking=False)
-         time.sleep(AGENT_INPUT_PERIOD)
+      asyncio.set_event_loop(self.loop)
+      try:
+         self.loop.run_until_complete(self._run())
+      finally:
+         self.loop.close()
 
@@ -172,32 +172,59 @@ class DXTop(IOManager):
 
       # baremetal 
       self._format_attrs_list_rb_percpu("stat/cpu", 0)
+      self._format_attrs_list_rb_percpu("softirqs", 0)
       self._format_attrs_list_rb("sensors/thermal", 0)
       self._format_attrs_list_rb("sensors/fans", 0)
       self._format_attrs_list_rb("sensors/coretemp", 0)
       self._format_attrs_list_rb_percpu("rt-cache", 0)
+      self._format_attrs_list_rb_percpu("softnet", 0)
+      self._format_attrs_list_rb_percpu("conntrack", 0)
       self._format_attrs_list_rb_percpu("arp-cache", 0)
       self._format_attrs_list_rb_percpu("ndisc-cache", 0)
 
       self._format_attrs_list_rb("diskstats", 1)
       self._format_attrs_list_rb("swaps", 1)
       self._format_attrs_rb("meminfo", 1)
+      self._format_attrs_rb("vmstat/summary", 1)
+      self._format_attrs_list_rb("buddyinfo", 1)
+      self._format_attrs_list_rb("slabinfo", 1)
+      self._format_attrs_list_rb("numa/numastat", 1)
+      self._format_attrs_list_rb("numa/meminfo", 1)
 
       self._format_attrs_rb("stats_global", 2)
       self._format_attrs_rb("loadavg", 2)
+      self._format_attrs_list_rb("pressure", 2)
       self._format_attrs_rb("stat", 2)
+      self._format_attrs_list_rb("cgroups", 2)
+      self._format_attrs_list_rb("agent/collectors", 2)
+      self._format_attrs_list_rb("agent/stages", 2)
 
       # XXX: very verbose at the end, also very greedy
       if self.args.verbose:
          self._format_attrs_list_rb("stats", 2)
+         self._format_attrs_rb("vmstat", 1)
+         self._format_attrs_list_rb("numa/vmstat", 1)
 
       self._format_attrs_list_rb("net/dev", 3)
       self._format_attrs_list_rb("routes4", 3)
       self._format_attrs_list_rb("routes6", 3)
+      self._format_attrs_list_rb("routes/summary", 3)
+      self._format_attrs_list_rb("routes/proto", 3)
+      self._format_attrs_list_rb("routes/table", 3)
+      self._format_attrs_list_rb("routes/nexthop", 3)
       self._format_attrs_rb("proc/sys", 3)
       self._format_attrs_rb("netstat", 3)
       self._format_attrs_rb("snmp", 3)
-      self._format_attrs_list_rb("net/arp", 3)
+      self._format_attrs_list_rb("sockets", 3)
+      self._format_attrs_rb("conntrack/summary", 3)
+      self._format_attrs_list_rb("sockets/listen", 3)
+      self._format_attrs_list_rb("net/irqs", 3)
+      self._format_attrs_list_rb("net/irq_affinity", 3)
+      self._format_attrs_list_rb("interrupts/net", 3)
+      self._format_attrs_list_rb("numa/net", 3)
+      self._format_attrs_list_rb("net/qdisc", 3)
+      self._format_attrs_list_rb("net/neigh", 3)
+      self._format_attrs_list_rb("net/neigh/gw", 3)
       if "ioam/gnmi" in self._data:
          self._append_content(self._center_text("ioam/gnmi"), 3, curses.A_BOLD)
          for ioam_name in self._data["ioam/gnmi"]:
@@ -254,6 +281,7 @@ class DXTop(IOManager):
          self._append_content(self._center_text(" "), 6)
 
       self._append_content(self._center_text("Metrics"), 6, curses.A_REVERSE)
+      self._format_attrs_rb("/node/bm/cpus", 6, health=True)
       self._format_attrs_list_rb_percpu("/node/bm/cpus/cpu", 6, health=True)
       self._format_attrs_list_rb("/node/bm/net/if", 6, health=True)
       
@@ -274,7 +302,9 @@ class DXTop(IOManager):
       self._format_attrs_list_rb("/node/bm/sensors/sensor", 6, health=True)
       self._format_attrs_rb("/node/bm/mem", 6, health=True)
       self._format_attrs_rb("/node/bm/proc", 6, health=True)
+      self._format_attrs_rb("/node/bm/disks", 6, health=True)
       self._format_attrs_list_rb("/node/bm/disks/disk", 6, health=True)
+      self._format_attrs_list_rb("/node/bm/cgroups/cgroup", 6, health=True)
       self._format_attrs_rb("/node/bm/net", 6, health=True)
       
       if "/node/vm" in self._data:
@@ -321,7 +351,7 @@ class DXTop(IOManager):
       #self.info(self._data["health_scores"]) 
       #self.info(path)
       
-      suffixes = ["/if", "/cpu", "/sensor", "/disk", "/namespace"]
+      suffixes = ["/if", "/cpu", "/sensor", "/disk", "/cgroup", "/namespace"]
       for suffix in suffixes:
          path = remove_suffix(path, suffix)
       
@@ -494,7 +524,7 @@ class DXTop(IOManager):
          data=subdict
       else:
          data=self._data
-      if category not in data:
+      if not data.get(category):
          return
       cpu_slice = 8
       cpu_count = len(data[category])-1
@@ -6,11 +6,14 @@
    K.Edeline
 """
 
-import threading
+import asyncio
 import time
 
 import grpc
-from cisco_gnmi import ClientBuilder
+from cisco_gnmi import ClientBuilder, Client
+from cisco_gnmi.auth import CiscoAuthPlugin
+from cisco_gnmi.util import gen_target_netloc
+from cisco_gnmi.util import get_cert_from_target, get_cn_from_cert
 from google.protobuf import json_format
 from cisco_gnmi.proto import gnmi_pb2, gnmi_pb2_grpc
 
@@ -24,26 +27,38 @@ MAX_RETRIES=3
 # time for gNMI to wait before retry connecting
 GNMI_RETRY_INTERVAL=30
 
-class BaseGNMIClient(threading.Thread):
-   def __init__(self, node, info, data, sync_mode=True,
+class BaseGNMIClient():
+   """
+   BaseGNMIClient
+
+   A gNMI subscription that runs as a grpc.aio stream on the agent event
+   loop. connect() and start() can be called from any thread.
+
+   """
+   def __init__(self, node, info, data, loop, sync_mode=True,
                 user='a', password='a'):
-      super().__init__()
       self.node = node
       self.info = info
       self._data = data
+      self.loop = loop
       self.user = user
       self.password = password
       # if set to True, client does not parse before it is synced
       self.sync_mode = sync_mode
-      self.client = None
+      self.netloc = None
+      self.credentials = None
+      self.options = []
       self.connected = False
       self.last_attempt = None
       self.retry=0
       self._exit=False
+      self._future = None
       self.synced = False
          
    def disconnect(self):
       self._exit=True
+      if self._future:
+         self._future.cancel()
 
    def connect(self):
       """
@@ -52,6 +67,9 @@ class BaseGNMIClient(threading.Thread):
       If more than MAX_RETRIES, do not connect. Wait at least 
       GNMI_RETRY_INTERVAL before re-connecting.
 
+      The target certificate is fetched here, the channel itself is
+      opened on the event loop by start().
+
       """
       # too much retries
       if self.retry > MAX_RETRIES:
@@ -64,10 +82,15 @@ class BaseGNMIClient(threading.Thread):
 
       self.info("connecting to gNMI node {}".format(self.node))
       try:
-         builder = ClientBuilder(self.node)
-         builder.set_secure_from_target()
-         builder.set_call_authentication(self.user, self.password)
-         self.client = builder.construct()
+         netloc = gen_target_netloc(self.node)
+         root_certificates = get_cert_from_target(netloc)
+         self.credentials = grpc.composite_channel_credentials(
+            grpc.ssl_channel_credentials(root_certificates),
+            grpc.metadata_call_credentials(
+               CiscoAuthPlugin(self.user, self.password)))
+         self.options = [("grpc.ssl_target_name_override",
+                          get_cn_from_cert(root_certificates))]
+         self.netloc = netloc.netloc
          self.connected=True
          self.retry = 0
          return True
@@ -76,6 +99,16 @@ class BaseGNMIClient(threading.Thread):
          self.retry += 1
          return False
 
+   def start(self):
+      """
+      schedule the subscription on the event loop
+
+      """
+      self._future = asyncio.run_coroutine_threadsafe(self.run(), self.loop)
+
+   def is_alive(self):
+      return self._future is not None and not self._future.done()
+
    def is_connected(self):
       return self.connected and self.is_alive()
 
@@ -96,26 +129,45 @@ class BaseGNMIClient(threading.Thread):
       if not self.connected and self.retry <= MAX_RETRIES:
          return "connecting"
 
-   def run(self,xpath="/"):
+   def _subscribe_request(self, xpath):
+      """
+      @return a STREAM SubscribeRequest that samples xpath 
+
+      """
+      subscription = gnmi_pb2.Subscription(
+         path=Client.parse_xpath_to_gnmi_path(xpath),
+         mode=gnmi_pb2.SubscriptionMode.Value("SAMPLE"),
+         sample_interval=GNMI_SAMPLING_PERIOD)
+      subscription_list = gnmi_pb2.SubscriptionList(
+         subscription=[subscription],
+         mode=gnmi_pb2.SubscriptionList.Mode.Value("STREAM"),
+         encoding=gnmi_pb2.Encoding.Value("JSON"))
+      return gnmi_pb2.SubscribeRequest(subscribe=subscription_list)
+
+   async def run(self,xpath="/"):
       """
       
       """
       _synced = False
 
       try:
-         for response in self.client.subscribe_xpaths(xpath,
-                         sample_interval=GNMI_SAMPLING_PERIOD):
-            if self._exit:
-               break
-            if not self.sync_mode or _synced:
-               self.parse_json(json_format.MessageToJson(response))
-               self.synced = True
-            elif response.sync_response:
-               _synced = True
+         async with grpc.aio.secure_channel(self.netloc, self.credentials,
+                                            options=self.options) as channel:
+            stub = gnmi_pb2_grpc.gNMIStub(channel)
+            async for response in stub.Subscribe(
+                                    iter([self._subscribe_request(xpath)])):
+               if self._exit:
+                  break
+               if not self.sync_mode or _synced:
+                  self.parse_json(json_format.MessageToJson(response))
+                  self.synced = True
+               elif response.sync_response:
+                  _synced = True
       except Exception as e:
          self.info(e)
       finally:
          self.connected = False
+         self.synced = False
 
 class DXAgentGNMIClient:
 
@@ -8,7 +8,7 @@ exporter.py
 
 import re
 import time
-from concurrent import futures
+import asyncio
 import grpc
 from google.protobuf import json_format
 from cisco_gnmi.proto import gnmi_pb2, gnmi_pb2_grpc
@@ -109,26 +109,32 @@ class DXAgentServicer(gNMIServicer):
       return response
       
    # gNMI Services Capabilities Routine
-   def Capabilities(self, request, context):
+   async def Capabilities(self, request, context):
       return self._capabilitiesResponse()
       
    # gNMI Services Get Routine
-   def Get(self, request, context):
+   async def Get(self, request, context):
       return self._getResponse(request)
       
    # gNMI Services Subscribe Routine
-   def Subscribe(self, requests, context):
+   async def Subscribe(self, requests, context):
 
-      for request in requests:
+      async for request in requests:
          request_json = json.loads(json_format.MessageToJson(request))
          paths,sample_interval = self._validate_subscriptions(request_json)
 
          while True:
             response = self._subscribeResponse(paths)
             yield response
-            time.sleep(sample_interval)
+            await asyncio.sleep(sample_interval)
         
 class DXAgentExporter():
+   """
+   DXAgentExporter
+
+   grpc.aio gNMI server, it runs on the agent event loop.
+
+   """
    def __init__(self, data, info, agent,
                 target_url="0.0.0.0:50051",
                 tls_enabled=True):
@@ -136,29 +142,41 @@ class DXAgentExporter():
       self.info = info
       self.agent = agent
       self.target_url = target_url
+      self.credentials = None
+      self._server = None
       
       pkeypath = self.agent.args.certs_dir+"/device.key"
       certpath = self.agent.args.certs_dir+"/device.crt"
       
-      self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-      gnmi_pb2_grpc.add_gNMIServicer_to_server(
-           DXAgentServicer(self), self._server)
       if tls_enabled:
          with open(pkeypath, 'rb') as f:
             privateKey = f.read()
          with open(certpath, 'rb') as f:
             certChain = f.read()
-         credentials = grpc.ssl_server_credentials(((privateKey, certChain, ), ))
-         self._server.add_secure_port(self.target_url, credentials)         
-      else:
-         self._server.add_insecure_port(self.target_url)
+         self.credentials = grpc.ssl_server_credentials(
+                                          ((privateKey, certChain, ), ))
        
-   def run(self, wait=False):
+   async def run(self, wait=False):
+      """
+      start serving, must be awaited from the event loop
+
+      """
       if not self.target_url:
          return
-      self._server.start()
+      self._server = grpc.aio.server()
+      gnmi_pb2_grpc.add_gNMIServicer_to_server(
+           DXAgentServicer(self), self._server)
+      if self.credentials:
+         self._server.add_secure_port(self.target_url, self.credentials)
+      else:
+         self._server.add_insecure_port(self.target_url)
+      await self._server.start()
       if wait:
-         self._server.wait_for_termination()      
+         await self._server.wait_for_termination()
+
+   async def stop(self, grace=None):
+      if self._server:
+         await self._server.stop(grace)
 
    def _iterate_data_rec(self, d, *args):
       """
@@ -188,7 +206,13 @@ class DXAgentExporter():
       @return True if node comes before an indexed node
       
       """
-      _before_indexed = ["vm", "kb", "cpus", "if", "sensors", "disks"]
+      _before_indexed = ["vm", "kb", "cpus", "if", "sensors", "disks",
+                         "cgroup", "stages"]
+      # metrics of the subservices that group list subservices, e.g.,
+      # /node/bm/cpus/net_rx_total, are not indexed
+      _list_parents = ["cpus", "sensors", "disks"]
+      if node.startswith("/") and node.rsplit("/", 1)[-1] in _list_parents:
+         return False
       if node in _before_indexed:
          return True
       for before_indexed in _before_indexed:
@@ -232,9 +256,9 @@ class DXAgentExporter():
              / 
 
       """
-      skip.append("symptoms")
-      skip.append("stats")
-      skip.append("health_scores")
+      # categories of running collectors are written without locking
+      skip = skip + ["symptoms", "stats", "health_scores"]
+      skip.extend(self.agent.busy_categories())
       if "/" in subscribed or "/metrics" in subscribed:
          for k,d in self.data.items():
             if k in skip:
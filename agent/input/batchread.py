@@ -0,0 +1,284 @@
+"""
+batchread.py
+
+   batched reads of small procfs and sysfs files
+
+@author: K.Edeline
+"""
+
+import os
+import mmap
+import errno
+import ctypes
+import struct
+import resource
+import platform
+
+# linux/include/uapi/asm-generic/unistd.h, new syscalls share their
+# numbers on all architectures but alpha and mips
+_NR_io_uring_setup = 425
+_NR_io_uring_enter = 426
+_uring_archs = ["x86_64", "i386", "i686", "aarch64", "armv7l", "armv8l",
+                "ppc64le", "ppc64", "s390x", "riscv64"]
+# linux/include/uapi/linux/io_uring.h
+_IORING_OFF_SQ_RING = 0
+_IORING_OFF_CQ_RING = 0x8000000
+_IORING_OFF_SQES = 0x10000000
+_IORING_ENTER_GETEVENTS = 1
+_IORING_OP_READ = 22
+# struct io_uring_sqe: opcode, flags, ioprio, fd, off, addr, len,
+# rw_flags, user_data, and unused fields
+_sqe = struct.Struct("=BBHiQQIIQ24x")
+# struct io_uring_cqe: user_data, res, flags
+_cqe = struct.Struct("=QiI")
+_u32 = struct.Struct("=I")
+
+class _SQRingOffsets(ctypes.Structure):
+   _fields_ = [("head", ctypes.c_uint32), ("tail", ctypes.c_uint32),
+               ("ring_mask", ctypes.c_uint32),
+               ("ring_entries", ctypes.c_uint32),
+               ("flags", ctypes.c_uint32), ("dropped", ctypes.c_uint32),
+               ("array", ctypes.c_uint32), ("resv1", ctypes.c_uint32),
+               ("user_addr", ctypes.c_uint64)]
+
+class _CQRingOffsets(ctypes.Structure):
+   _fields_ = [("head", ctypes.c_uint32), ("tail", ctypes.c_uint32),
+               ("ring_mask", ctypes.c_uint32),
+               ("ring_entries", ctypes.c_uint32),
+               ("overflow", ctypes.c_uint32), ("cqes", ctypes.c_uint32),
+               ("flags", ctypes.c_uint32), ("resv1", ctypes.c_uint32),
+               ("user_addr", ctypes.c_uint64)]
+
+class _Params(ctypes.Structure):
+   _fields_ = [("sq_entries", ctypes.c_uint32),
+               ("cq_entries", ctypes.c_uint32),
+               ("flags", ctypes.c_uint32),
+               ("sq_thread_cpu", ctypes.c_uint32),
+               ("sq_thread_idle", ctypes.c_uint32),
+               ("features", ctypes.c_uint32),
+               ("wq_fd", ctypes.c_uint32),
+               ("resv", ctypes.c_uint32*3),
+               ("sq_off", _SQRingOffsets),
+               ("cq_off", _CQRingOffsets)]
+
+class _IOUring():
+   """
+   _IOUring
+
+   Minimal io_uring through ctypes, it only submits IORING_OP_READ and
+   waits for all of them.
+
+   NOTE: no SQPOLL thread, the kernel only reads the submission queue in
+         io_uring_enter(), the syscall orders ring accesses.
+
+   """
+   def __init__(self, entries):
+      if platform.machine() not in _uring_archs:
+         raise OSError(errno.ENOSYS, "io_uring syscalls unknown on "
+                                     +platform.machine())
+      self._libc = ctypes.CDLL(None, use_errno=True)
+      self._libc.syscall.restype = ctypes.c_long
+      params = _Params()
+      fd = self._libc.syscall(ctypes.c_long(_NR_io_uring_setup),
+                              ctypes.c_uint(entries), ctypes.byref(params))
+      if fd < 0:
+         self._raise()
+      self.fd = fd
+      self.entries = params.sq_entries
+      self._sq_off = params.sq_off
+      self._cq_off = params.cq_off
+      prot = mmap.PROT_READ | mmap.PROT_WRITE
+      self._sq = mmap.mmap(fd, params.sq_off.array+params.sq_entries*4,
+                           mmap.MAP_SHARED, prot, offset=_IORING_OFF_SQ_RING)
+      self._cq = mmap.mmap(fd, params.cq_off.cqes+params.cq_entries*_cqe.size,
+                           mmap.MAP_SHARED, prot, offset=_IORING_OFF_CQ_RING)
+      self._sqes = mmap.mmap(fd, params.sq_entries*_sqe.size,
+                             mmap.MAP_SHARED, prot, offset=_IORING_OFF_SQES)
+      self._sq_mask = _u32.unpack_from(self._sq, self._sq_off.ring_mask)[0]
+      self._cq_mask = _u32.unpack_from(self._cq, self._cq_off.ring_mask)[0]
+
+   def _raise(self):
+      err = ctypes.get_errno()
+      raise OSError(err, os.strerror(err))
+
+   def _enter(self, to_submit, min_complete):
+      return self._libc.syscall(ctypes.c_long(_NR_io_uring_enter),
+                                ctypes.c_int(self.fd),
+                                ctypes.c_uint(to_submit),
+                                ctypes.c_uint(min_complete),
+                                ctypes.c_uint(_IORING_ENTER_GETEVENTS),
+                                None, ctypes.c_size_t(0))
+
+   def read(self, requests):
+      """
+      read at offset 0, ring size requests at a time
+
+      @param requests a list of (fd, ctypes buffer)
+      @return the list of read sizes, or -errno
+      """
+      results = [0]*len(requests)
+      for start in range(0, len(requests), self.entries):
+         chunk = requests[start:start+self.entries]
+         tail = _u32.unpack_from(self._sq, self._sq_off.tail)[0]
+         for i, (fd, buf) in enumerate(chunk):
+            index = (tail+i) & self._sq_mask
+            _sqe.pack_into(self._sqes, index*_sqe.size, _IORING_OP_READ, 0,
+                           0, fd, 0, ctypes.addressof(buf), len(buf), 0,
+                           start+i)
+            _u32.pack_into(self._sq, self._sq_off.array+index*4, index)
+         tail = (tail+len(chunk)) & 0xffffffff
+         _u32.pack_into(self._sq, self._sq_off.tail, tail)
+
+         pending = len(chunk)
+         while pending:
+            head = _u32.unpack_from(self._sq, self._sq_off.head)[0]
+            if self._enter((tail-head) & 0xffffffff, pending) < 0:
+               if ctypes.get_errno() not in [errno.EINTR, errno.EAGAIN,
+                                             errno.EBUSY]:
+                  self._raise()
+            pending -= self._reap(results)
+      return results
+
+   def _reap(self, results):
+      """
+      @return the number of completions
+      """
+      head = _u32.unpack_from(self._cq, self._cq_off.head)[0]
+      tail = _u32.unpack_from(self._cq, self._cq_off.tail)[0]
+      count = (tail-head) & 0xffffffff
+      for i in range(count):
+         index = (head+i) & self._cq_mask
+         user_data, res, _ = _cqe.unpack_from(self._cq,
+                                 self._cq_off.cqes+index*_cqe.size)
+         results[user_data] = res
+      _u32.pack_into(self._cq, self._cq_off.head, (head+count) & 0xffffffff)
+      return count
+
+   def close(self):
+      self._sqes.close()
+      self._cq.close()
+      self._sq.close()
+      os.close(self.fd)
+
+class BatchReader():
+   """
+   BatchReader
+
+   Collectors register the sets of small files (sysfs attributes,
+   /proc/<pid>/stat) they read every cycle, and read() reads all of them
+   in one batch. Files stay open between batches and are read again from
+   offset 0, they are closed once they leave all read sets or fail.
+
+   With io_uring (Linux 5.6+), a batch costs one io_uring_enter() per ring
+   size. Reads fall back to pread() if io_uring is unavailable, e.g.,
+   older kernels, kernel.io_uring_disabled, or seccomp profiles.
+
+   """
+   def __init__(self, backend="io_uring", entries=256, bufsize=4096,
+                info=None):
+      """
+      @param backend io_uring or pread
+      @param bufsize the maximum size read from a file, sysfs attributes
+                     are at most a page
+      """
+      self.info = info
+      self.bufsize = bufsize
+      self._sets = {}
+      self._files = {}
+      # leave file descriptors to the rest of the agent, files above the
+      # limit are opened for each batch
+      self.max_files = resource.getrlimit(resource.RLIMIT_NOFILE)[0] // 2
+      self._uring = None
+      if backend == "io_uring":
+         try:
+            self._uring = _IOUring(entries)
+            # IORING_OP_READ is not supported before Linux 5.6
+            fd = os.open("/proc/self/stat", os.O_RDONLY | os.O_CLOEXEC)
+            res = self._uring.read([(fd, ctypes.create_string_buffer(64))])
+            os.close(fd)
+            if res[0] < 0:
+               raise OSError(-res[0], os.strerror(-res[0]))
+         except (OSError, AttributeError) as e:
+            if self.info:
+               self.info("io_uring unavailable, using pread: {}".format(e))
+            if self._uring:
+               self._uring.close()
+               self._uring = None
+      self.backend = "io_uring" if self._uring else "pread"
+
+   def register(self, name, paths):
+      """
+      set the read set of a collector
+
+      @param paths the list of paths, read() results follow their order
+      """
+      self._sets[name] = list(paths)
+      used = set().union(*self._sets.values())
+      for path in [p for p in self._files if p not in used]:
+         self._close(path)
+
+   def unregister(self, name):
+      self.register(name, [])
+      del self._sets[name]
+
+   def _open(self, path):
+      """
+      @return (fd, buffer, cached), or None if path cannot be opened
+      """
+      entry = self._files.get(path)
+      if entry:
+         return entry
+      try:
+         fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+      except OSError:
+         return None
+      buf = ctypes.create_string_buffer(self.bufsize) if self._uring else None
+      cached = len(self._files) < self.max_files
+      entry = (fd, buf, cached)
+      if cached:
+         self._files[path] = entry
+      return entry
+
+   def _close(self, path):
+      fd, _, _ = self._files.pop(path)
+      os.close(fd)
+
+   def read(self):
+      """
+      read all registered sets in one batch
+
+      @return a dict {name: list of file contents}, a content is None if
+              its file could not be opened or read
+      """
+      paths = list(dict.fromkeys(path for paths in self._sets.values()
+                                 for path in paths))
+      entries = [(path, self._open(path)) for path in paths]
+      entries = [(path, entry) for path, entry in entries if entry]
+      contents = dict.fromkeys(paths)
+      if self._uring:
+         results = self._uring.read([(fd, buf) for _, (fd, buf, _)
+                                     in entries])
+         for (path, (_, buf, _)), res in zip(entries, results):
+            if res >= 0:
+               contents[path] = buf.raw[:res].decode(errors="replace")
+      else:
+         for path, (fd, _, _) in entries:
+            try:
+               contents[path] = os.pread(fd, self.bufsize, 0).decode(
+                                                         errors="replace")
+            except OSError:
+               pass
+      for path, (fd, _, cached) in entries:
+         if not cached:
+            os.close(fd)
+         # e.g., exited process or removed device, open it again next time
+         elif contents[path] is None:
+            self._close(path)
+      return {name: [contents[path] for path in paths]
+              for name, paths in self._sets.items()}
+
+   def exit(self):
+      for path in list(self._files):
+         self._close(path)
+      if self._uring:
+         self._uring.close()
@@ -7,10 +7,10 @@ bm_input.py
 """
 
 import os
-import netifaces
+import heapq
 import ipaddress
+import operator
 import time
-import subprocess
 import socket
 
 import json
@@ -20,11 +20,171 @@ import pyroute2
 
 from pyroute2.netlink.rtnl import rt_type
 from pyroute2.netlink.rtnl import rt_scope
+from pyroute2.netlink import NLM_F_REPLACE
 from pyroute2.netlink.rtnl import rt_proto
+from pyroute2.netlink.rtnl import RTMGRP_IPV4_ROUTE
+from pyroute2.netlink.rtnl import RTMGRP_IPV6_ROUTE
+from pyroute2.netlink.rtnl import RTMGRP_IPV4_IFADDR
+from pyroute2.netlink.rtnl import RTMGRP_IPV6_IFADDR
+from pyroute2.netlink.rtnl import RTMGRP_LINK
+from pyroute2.netlink.rtnl import RTMGRP_NEIGH
+from pyroute2.netlink.rtnl.ndmsg import states as nud_states
 
 from ..core.rbuffer import RingBuffer
+from ..core.rbuffer import MDict
 from ..core.rbuffer import init_rb_dict
+from ..core.rbuffer import append_rows
 from ..gnmi.client import BaseGNMIClient
+from .rtnl import RtnlMonitor
+from .resolver import ResolverCache
+from .fsprobe import FSProbe
+from .psi import PSITriggers
+from .psi import read_pressure
+from .psi import psi_resources
+from .psi import psi_keys
+from .sockdiag import SockDiag
+from .batchread import BatchReader
+from .sockdiag import tcp_states
+from .sockdiag import TCP_ESTABLISHED
+from .sockdiag import TCP_LISTEN
+
+# main routing table id
+_RT_TABLE_MAIN = 254
+# linux/include/uapi/linux/rtnetlink.h
+_rt_tables = {253: "default", 254: "main", 255: "local"}
+_rt_families = {socket.AF_INET: "ipv4", socket.AF_INET6: "ipv6"}
+
+# /proc/stat per-cpu attributes
+_stat_cpu_times = [
+   "user_time", "nice_time", "system_time", "idle_time", 
+   "iowait_time", "irq_time", "softirq_time", "steal_time", 
+   "guest_time", "guest_nice_time", "system_all_time",
+   "idle_all_time", "guest_all_time", "total_time",
+]
+_stat_cpu_periods = [t.replace("_time", "_period") for t in _stat_cpu_times]
+_stat_cpu_percs = [t.replace("_time", "_perc") for t in _stat_cpu_times[:-1]]
+
+# ethtool info is read again at least every _ethtool_ttl seconds
+_ethtool_ttl = 300
+# interrupt affinities of network devices are read again every
+# _irq_affinity_ttl seconds
+_irq_affinity_ttl = 60
+
+# neighbour states, linux/include/uapi/linux/neighbour.h
+_nud_names = {v:k for k,v in nud_states.items()}
+_nud_unusable = ["incomplete", "failed", "none"]
+# rtnetlink socket receive buffer, large neighbour tables generate bursts
+# of events
+_rtnl_rcvbuf = 4*1024*1024
+# linux/include/uapi/linux/if.h
+_IFF_UP = 0x1
+
+# /proc/<pid>/io of all processes is read again every _proc_io_ttl
+# seconds in top-k io mode
+_proc_io_ttl = 30
+
+# sensors sysfs paths are probed again every _sensors_ttl seconds
+_sensors_ttl = 600
+
+# numa nodes, and the number of busiest processes whose cpu is checked
+# against the numa node of network devices
+_numa_path = "/sys/devices/system/node"
+_numa_top_procs = 10
+
+# /proc/net/softnet_stat columns, linux/net/core/net-procfs.c
+_softnet_columns = {"processed": 0, "dropped": 1, "time_squeeze": 2,
+                    "received_rps": 9, "flow_limit_count": 10,
+                    "backlog_len": 11}
+_softnet_cpu_column = 12
+_softnet_rates = ["processed_rate", "dropped_rate", "squeeze_rate"]
+
+# /proc/vmstat summary counters, the fields that exist are summed
+_vmstat_summary = {
+   "pgscan": ["pgscan_kswapd", "pgscan_direct", "pgscan_khugepaged",
+              "pgscan_proactive"],
+   "pgsteal": ["pgsteal_kswapd", "pgsteal_direct", "pgsteal_khugepaged",
+               "pgsteal_proactive"],
+   "allocstall": ["allocstall", "allocstall_dma", "allocstall_dma32",
+                  "allocstall_normal", "allocstall_movable",
+                  "allocstall_device"],
+   "compact_stall": ["compact_stall"],
+   "pgmajfault": ["pgmajfault"],
+}
+# free memory fragmentation is measured for this order,
+# linux/include/linux/mmzone.h PAGE_ALLOC_COSTLY_ORDER
+_buddy_order = 3
+# slab caches with ringbuffers, ranked by size
+_slab_top = 10
+
+# sock_diag dumped protocols
+_sock_protocols = {"tcp": socket.IPPROTO_TCP, "udp": socket.IPPROTO_UDP}
+_sock_attrs = (list(tcp_states.values())
+               + ["total", "rx_queue", "tx_queue", "unacked", "retrans",
+                  "total_retrans"])
+
+# nf_conntrack sysctls, absent until the module is loaded
+_conntrack_path = "/proc/sys/net/netfilter"
+_conntrack_stat_path = "/proc/net/stat/nf_conntrack"
+
+# block devices, /proc/diskstats fields after the device name
+_block_path = "/sys/class/block"
+_sector_size = 512
+_disk_stat_attrs = ["reads_completed", "reads_merged", "sectors_read",
+   "time_reading", "writes_completed", "writes_merged", "sectors_written",
+   "time_writting", "current_io", "time_io", "time_io_weighted",
+   "discards_completed", "discards_merged", "sectors_discarded",
+   "time_discarding", "flushes_completed", "time_flushing"]
+# (completed, sectors, time spent) counters of each operation
+_disk_op_attrs = {
+   "read": ("reads_completed", "sectors_read", "time_reading"),
+   "write": ("writes_completed", "sectors_written", "time_writting"),
+   "discard": ("discards_completed", "sectors_discarded",
+               "time_discarding"),
+}
+_disk_time_attrs = ["time_writting", "time_reading", "time_io",
+                    "time_discarding"]
+_disk_period_attrs = ["period_writting", "period_reading", "period_io",
+                      "period_discarding"]
+_disk_perc_attrs = ["perc_writting", "perc_reading", "perc_io",
+                    "perc_discarding"]
+_disk_rate_attrs = [op+suffix for op in _disk_op_attrs
+                    for suffix in ["_iops", "_throughput", "_await"]]
+_disk_mount_attrs = ["fs_spec", "fs_file", "fs_vfstype", "fs_mntops"]
+_disk_space_attrs = ["size", "total", "free_root", "free_user", "used",
+                     "total_user", "usage_user"]
+# request queue settings are read again every _disk_queue_ttl seconds
+_disk_queue_attrs = ["scheduler", "rotational", "nr_requests",
+                     "read_ahead_kb", "max_sectors_kb"]
+_disk_queue_ttl = 300
+_disk_attrs = (["device_major", "device_minor", "device_type", "backing"]
+               + _disk_stat_attrs + ["inflight_reads", "inflight_writes"]
+               + _disk_queue_attrs + _disk_space_attrs + _disk_mount_attrs
+               + _disk_period_attrs + _disk_perc_attrs + _disk_rate_attrs
+               + ["queue_depth", "responsive"])
+_disk_types = [str if attr in ["device_type", "backing", "scheduler"]
+                      + _disk_mount_attrs
+               else float if attr in _disk_rate_attrs+["queue_depth"]
+               else int for attr in _disk_attrs]
+_disk_counters = [attr in _disk_stat_attrs and attr != "current_io"
+                  for attr in _disk_attrs]
+_disk_units = [
+   "ms" if attr in _disk_time_attrs+_disk_period_attrs
+           or attr.startswith("time_") or attr.endswith("_await")
+   else "%" if attr in _disk_perc_attrs+["usage_user"]
+   else "KB" if attr in _disk_space_attrs[:-1]
+           or attr.endswith("_kb")
+   else "KB/s" if attr.endswith("_throughput")
+   else "/s" if attr.endswith("_iops")
+   else None for attr in _disk_attrs]
+
+# linux/include/uapi/linux/pkt_sched.h
+_TC_H_ROOT = 0xffffffff
+_TC_H_INGRESS = 0xfffffff1
+_qdisc_attrs = ["if_name", "kind", "handle", "parent", "bytes", "packets",
+                "drops", "overlimits", "requeues", "backlog", "qlen"]
+_qdisc_types = [str]*4 + [int]*7
+_qdisc_counters = [False]*4 + [True]*5 + [False]*2
+_qdisc_units = [None]*4 + ["bytes", None, None, None, None, "bytes", None]
 
 # linux/include/linux/if_arp.h
 _linux_if_types = { "0":"netrom", "1":"ether", "2":"eether", "3":"ax25",
@@ -42,6 +202,68 @@ _linux_if_types = { "0":"netrom", "1":"ether", "2":"eether", "3":"ax25",
    "804":"ieee802154", "820":"phonet", "821":"phonet_pipe", "822":"caif"
 }
 
+# linux/include/uapi/linux/if.h
+_iff_flags = { "broadcast":0x2, "debug":0x4, "loopback":0x8,
+   "point_to_point":0x10, "notrailers":0x20, "running":0x40, "noarp":0x80,
+   "promisc":0x100, "allmulticast":0x200, "lb_master":0x400,
+   "lb_slave":0x800, "multicast_support":0x1000, "portselect":0x2000,
+   "automedia":0x4000, "dynamic":0x8000
+}
+
+def _listdir(path):
+   """
+   @return entries of directory path, empty if it does not exist
+   """
+   try:
+      return sorted(os.listdir(path))
+   except OSError:
+      return []
+
+def _parse_cpulist(cpulist):
+   """
+   @param cpulist a cpu list, e.g., 0-3,8
+   @return the set of cpu labels, e.g., cpu0
+   """
+   cpus = set()
+   for r in cpulist.split(","):
+      if not r.strip():
+         continue
+      first, _, last = r.partition("-")
+      cpus.update("cpu{}".format(i)
+                  for i in range(int(first), int(last or first)+1))
+   return cpus
+
+def _read_count_matrix(path):
+   """
+   parse a cpu x source counts file, i.e., /proc/softirqs or
+   /proc/interrupts
+
+   @return cpu labels, source labels, source names (last field) and the
+           counts matrix, with one row per source
+   """
+   labels, names, rows = [], [], []
+   with open(path, 'r') as f:
+      cpus = ["cpu"+c[3:] for c in f.readline().split()]
+      for l in f.readlines():
+         label, _, fields = l.partition(":")
+         fields = fields.split()
+         counts = [int(c) for c in fields[:len(cpus)] if c.isdigit()]
+         labels.append(label.strip())
+         names.append(fields[-1] if len(fields) > len(counts) else "")
+         # ERR and MIS are not per-cpu
+         rows.append(counts+[0]*(len(cpus)-len(counts)))
+   return cpus, labels, names, rows
+
+def _count_rates(labels, rows, previous, elapsed):
+   """
+   @param previous the previous counts rows, indexed by label
+   @param elapsed the time since previous counts, in seconds
+   @return the matrix of per-second rates
+   """
+   return [[round(max(c-p, 0)/elapsed, 2)
+               for c,p in zip(row, previous.get(label, row))]
+            for label, row in zip(labels, rows)]
+
 def ratio(v, total):
    try:
       return round(v/total*100.0)
@@ -103,11 +325,120 @@ class BMWatcher():
       self.gnmi_clients = []
       self._init_dicts()
       self.diskstats_timestamp=None
+      # mounts and their resolved backing devices, last diskstats
+      # counters, and request queue settings
+      self._disk_mounts = None
+      self._disk_devices = {}
+      self._disk_counts = {}
+      self._disk_queue_cache = {}
+      self._if_sysfs_cache = {}
+      self._ethtool_cache = {}
+      self._resolver = ResolverCache()
+      self._fsprobe = FSProbe(workers=self.parent.fsprobe_workers,
+                              timeout=self.parent.fsprobe_timeout)
+      self._sensor_sources = None
+      self._sensors_timestamp = None
+      # small files read every cycle, and their contents for this cycle
+      self._batch = BatchReader(self.parent.read_backend, info=self.info)
+      self._batch_contents = {}
+      self._proc_pids = []
+      # startup probe of sensors sysfs paths
+      self._probe_sensors()
+      # last /proc/stat sample, and per-cpu percentages (see
+      # stat_perc_index for column names)
+      self._stat_cpu_times = {}
+      self.stat_cpu_perc = {}
+      self.stat_perc_index = {name:i for i,name in enumerate(_stat_cpu_percs)}
+      # last /proc/softirqs and /proc/interrupts samples, and interrupts
+      # of network devices {irq: if_name}
+      self._softirq_counts = {}
+      self._softirqs_timestamp = None
+      self._softnet_counts = {}
+      self._softnet_timestamp = None
+      self._vmstat_counts = {}
+      self._vmstat_timestamp = None
+      self._irq_counts = {}
+      self._irq_cpus = None
+      self._irqs_timestamp = None
+      self._net_irqs = None
+      self._if_irq_rates = {}
+      self._irq_affinity_irqs = None
+      self._irq_affinity_timestamp = None
+      # busiest processes [(cpu time delta, cpu label)], for numa locality
+      self._numa_busiest = []
+      self._numa_proc_ticks = {}
+      # route aggregates, and routes that keep per-route ringbuffers in
+      # summary mode
+      self._route_watch = set()
+      for prefix in self.parent.route_watch:
+         network = ipaddress.ip_network(prefix, strict=False)
+         family = socket.AF_INET if network.version == 4 else socket.AF_INET6
+         key = "default" if network.prefixlen == 0 else str(network)
+         self._route_watch.add((family, key))
+      self._reset_route_counts()
+      self._route_changes = dict.fromkeys(_rt_families.values(), 0)
+      # route digests of the previous dump
+      self._route_digests = None
+      self._routes_timestamp = None
+      # neighbour tables, {(family, ifindex, dst): (state, lladdr)} and
+      # per-interface state counts and transitions
+      self._neighs = {}
+      self._neigh_counts = {}
+      self._neigh_changes = {}
+      self._if_names = {}
+      # top-k processes ranking state
+      self._proc_top_values = {}
+      self._proc_top_ticks = {}
+      self._proc_top_out = {}
+      self._proc_io_timestamp = None
+      # optional triggers that run the collection tick early on stall
+      # events
+      self._psi_triggers = None
+      if self.parent.psi_triggers and self._data["pressure"]:
+         self._psi_triggers = PSITriggers(self.parent.psi_triggers,
+                                          self._on_psi_trigger, self.info)
+      self._sockdiag = SockDiag()
+      # (protocol, family) dumps that failed, e.g., udp_diag not loaded
+      self._sockdiag_disabled = set()
       self._ethtool = pyroute2.Ethtool()
       self._route = pyroute2.IPRoute()
+      self._init_rtnl()
       if self.ioam_gnmi_nodes:
          self._init_gnmi_clients()
-         
+
+   def _init_rtnl(self):
+      """
+      subscribe to rtnetlink events
+
+      link events invalidate per-interface caches, route and neighbour
+      events are only tracked if their event-driven tracking is enabled
+
+      """
+      self._rtnl = None
+      self._rtnl_handlers = {}
+      self._rtnl_resyncs = []
+      self._routes_flushed = False
+      groups = RTMGRP_LINK
+      self._rtnl_handlers["RTM_NEWLINK"] = self._on_link_event
+      self._rtnl_handlers["RTM_DELLINK"] = self._on_link_event
+      self._rtnl_resyncs.append(self.invalidate_link_caches)
+      if self.parent.neigh_tracking == "events":
+         groups |= RTMGRP_NEIGH
+         self._rtnl_handlers["RTM_NEWNEIGH"] = self._on_neigh_event
+         self._rtnl_handlers["RTM_DELNEIGH"] = self._on_neigh_event
+         self._rtnl_resyncs.append(self._dump_neighbours)
+      if self.parent.route_tracking == "events":
+         # the kernel flushes routes without RTM_DELROUTE when a link goes
+         # down or an address is removed, address events catch the latter
+         groups |= (RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_ROUTE
+                    | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR)
+         self._rtnl_handlers["RTM_NEWROUTE"] = self._on_route_event
+         self._rtnl_handlers["RTM_DELROUTE"] = self._on_route_event
+         self._rtnl_handlers["RTM_DELADDR"] = self._on_addr_event
+         self._rtnl_resyncs.append(self._dump_routes)
+      if groups:
+         self._rtnl = RtnlMonitor(groups, rcvbuf=_rtnl_rcvbuf)
+
    def _init_gnmi_clients(self):
       """
       instantiate gNMI clients and try connecting nodes
@@ -120,7 +451,8 @@ class BMWatcher():
                                                      thread_safe=True)
          self._data["ioam/gnmi"][node].update({"namespace":{}})
          self.gnmi_clients.append(IOAMGNMIClient(node, self.info,
-                                                 self._data, sync_mode=False))
+                                                 self._data, self.parent.loop,
+                                                 sync_mode=False))
       self._connect_gnmi_clients()
 
    def _connect_gnmi_clients(self):
@@ -156,13 +488,27 @@ class BMWatcher():
       self._data["net/dev"] = {}
       self._data["routes4"] = {}
       self._data["routes6"] = {}
+      self._data["routes/summary"] = {}
+      self._data["routes/proto"] = {}
+      self._data["routes/table"] = {}
+      self._data["routes/nexthop"] = {}
       self._data["swaps"] = {}
-      self._data["net/arp"] = {}
+      self._data["net/neigh"] = {}
+      self._data["net/neigh/gw"] = {}
       self._data["stats"] = {}
       self._data["diskstats"] = {}
       self._data["sensors/thermal"] = {}
       self._data["sensors/fans"] = {}
       self._data["sensors/coretemp"] = {}
+      # interrupts of network devices come and go with interfaces
+      self._data["interrupts/net"] = MDict()
+      self._data["net/irqs"] = MDict()
+      self._data["numa/net"] = MDict()
+      self._data["sockets/listen"] = MDict()
+      self._data["slabinfo"] = MDict()
+      self._data["net/qdisc"] = MDict()
+      self._data["net/irq_affinity"] = MDict()
+      self._data["buddyinfo"] = {}
 
       # uptime
       attr_list = ["up", "idle"]
@@ -178,6 +524,27 @@ class BMWatcher():
       attr_list = ["1min", "5min", "15min", "runnable", "total"]
       self._data["loadavg"] = init_rb_dict(attr_list,type=float)
 
+      # sockets
+      self._data["sockets"] = {}
+      for proto in _sock_protocols:
+         self._data["sockets"][proto] = init_rb_dict(_sock_attrs)
+
+      # pressure, unsupported resources are skipped (e.g., psi=0)
+      self._data["pressure"] = {}
+      attr_list = psi_keys + ["trigger_events"]
+      type_list = [int if k.endswith("total") else float
+                   for k in psi_keys] + [int]
+      unit_list = ["us" if k.endswith("total") else "%"
+                   for k in psi_keys] + [None]
+      counter_list = [k.endswith("total") for k in psi_keys] + [True]
+      for resource in psi_resources:
+         try:
+            read_pressure(os.path.join("/proc/pressure", resource))
+         except OSError:
+            continue
+         self._data["pressure"][resource] = init_rb_dict(attr_list,
+                  types=type_list, units=unit_list, counters=counter_list)
+
       # meminfo
       attr_list, unit_list = [], []
       with open("/proc/meminfo", 'r') as f:
@@ -211,24 +578,23 @@ class BMWatcher():
             attr_list.extend([prefix+attr for attr in attrs[1:]])
       self._data["snmp"] = init_rb_dict(attr_list, counter=True)
 
+      # vmstat, values are read in file order into the precomputed list
+      # of ringbuffers, nr_ are gauges and the rest are event counters
+      with open("/proc/vmstat", 'r') as f:
+         attr_list = f.read().split()[::2]
+      self._data["vmstat"] = init_rb_dict(attr_list,
+               counters=[not attr.startswith("nr_") for attr in attr_list])
+      self._vmstat_rbs = [self._data["vmstat"][attr] for attr in attr_list]
+      self._vmstat_summary_indexes = {
+         key: [attr_list.index(attr) for attr in attrs if attr in attr_list]
+         for key, attrs in _vmstat_summary.items()}
+      attr_list = list(_vmstat_summary) + ["reclaim_efficiency"]
+      self._data["vmstat/summary"] = init_rb_dict(attr_list, type=float,
+               units=["/s"]*len(_vmstat_summary) + ["%"])
+
       # stat and stat/cpu
       attr_list = []
-      attr_list_cpu = [
-         "user_time", "nice_time", "system_time", "idle_time", 
-         "iowait_time", "irq_time", "softirq_time", "steal_time", 
-         "guest_time", "guest_nice_time", "system_all_time",
-         "idle_all_time", "guest_all_time", "total_time",
-
-         "user_period", "nice_period", "system_period", "idle_period", 
-         "iowait_period", "irq_period", "softirq_period", "steal_period", 
-         "guest_period", "guest_nice_period", "system_all_period",
-         "idle_all_period", "guest_all_period", "total_period",
-
-         "user_perc", "nice_perc", "system_perc", "idle_perc", 
-         "iowait_perc", "irq_perc", "softirq_perc", "steal_perc", 
-         "guest_perc", "guest_nice_perc", "system_all_perc",
-         "idle_all_perc", "guest_all_perc",
-       ]
+      attr_list_cpu = _stat_cpu_times + _stat_cpu_periods + _stat_cpu_percs
       attr_units = ["ms"] * 28 + ["%"] * 13
       attr_types = [int] * 28 + [float] * 13
 
@@ -239,13 +605,20 @@ class BMWatcher():
 
             if label.startswith("cpu"):
                self._data["stat/cpu"][label] = init_rb_dict(attr_list_cpu,
-                                                            units=attr_units)
+                                          types=attr_types, units=attr_units)
             else:
                attr_list.append(label)
 
       is_counter = [True, True, True, False, False, False, True]
       self._data["stat"] = init_rb_dict(attr_list, counters=is_counter)
 
+      # softirqs, per-second rates for all possible cpus
+      self._data["softirqs"] = {}
+      cpus, attr_list, _, _ = _read_count_matrix("/proc/softirqs")
+      for cpu_label in cpus:
+         self._data["softirqs"][cpu_label] = init_rb_dict(attr_list,
+                                                type=float, unit="/s")
+
       # proc/stat
       attr_list = [
          "net.core.rmem_default", "net.core.rmem_max", "net.core.wmem_default",
@@ -270,6 +643,45 @@ class BMWatcher():
       ]
       self._data["proc/sys"] =  init_rb_dict(attr_list, units=unit_list, type=str)
 
+      # numa nodes, and {cpu label: node}
+      self._data["numa/meminfo"] = {}
+      self._data["numa/numastat"] = {}
+      self._data["numa/vmstat"] = {}
+      self._numa_cpu_nodes = {}
+      for node in _listdir(_numa_path):
+         if not node.startswith("node") or not node[4:].isdigit():
+            continue
+         path = os.path.join(_numa_path, node)
+         with open(os.path.join(path, "cpulist"), 'r') as f:
+            for cpu_label in _parse_cpulist(f.read()):
+               self._numa_cpu_nodes[cpu_label] = int(node[4:])
+         # Node 0 MemTotal:        4554488 kB
+         attr_list, unit_list = [], []
+         with open(os.path.join(path, "meminfo"), 'r') as f:
+            for l in f.readlines():
+               elements = l.split()
+               attr_list.append(elements[2].rstrip(':'))
+               unit_list.append(elements[4] if len(elements)>4 else None)
+         self._data["numa/meminfo"][node] = init_rb_dict(attr_list,
+                                                         units=unit_list)
+         with open(os.path.join(path, "numastat"), 'r') as f:
+            attr_list = [l.split()[0] for l in f.readlines()]
+         self._data["numa/numastat"][node] = init_rb_dict(attr_list,
+                                                          counter=True)
+         # nr_ are gauges, the rest are event counters
+         with open(os.path.join(path, "vmstat"), 'r') as f:
+            attr_list = [l.split()[0] for l in f.readlines()]
+         self._data["numa/vmstat"][node] = init_rb_dict(attr_list,
+               counters=[not attr.startswith("nr_") for attr in attr_list])
+      self.numa_node_count = len(self._data["numa/meminfo"])
+
+      # softnet, cpus are added when they come online
+      self._data["softnet"] = {}
+
+      # conntrack, dicts are created once nf_conntrack is loaded
+      self._data["conntrack"] = {}
+      self._data["conntrack/summary"] = {}
+
       # rt-cache read attrs
       self._data["rt-cache"] = {}
       with open("/proc/net/stat/rt_cache", 'r') as f:
@@ -298,128 +710,177 @@ class BMWatcher():
       """
       baremetal health: Linux
 
+      each step is timed under agent/stages
+
       """
-      
-      self._process_proc_meminfo()
-      self._process_proc_stat()
-      self._process_proc_stats()
-      self._process_proc_loadavg()
-      self._process_proc_swaps()
-      self._process_proc_uptime()
-      self._process_proc_diskstats()
-      self._process_proc_net_netstat()
-      self._process_proc_net_snmp()
-      self._process_proc_net_stat_arp_cache()
-      self._process_proc_net_stat_ndisc_cache()
-      self._process_proc_net_stat_rt_cache()
-      self._process_proc_net_arp()
-      self._process_net_settings()
-      self._process_sensors()
-      self._process_interfaces()
-      self._process_routes()
+      processes = [
+         ("batch_read", self._batch_read),
+         ("proc_meminfo", self._process_proc_meminfo),
+         ("proc_vmstat", self._process_proc_vmstat),
+         ("proc_buddyinfo", self._process_proc_buddyinfo),
+         ("proc_slabinfo", self._process_proc_slabinfo),
+         ("proc_stat", self._process_proc_stat),
+         ("proc_softirqs", self._process_proc_softirqs),
+         ("proc_interrupts", self._process_proc_interrupts),
+         ("proc_stats", self._process_proc_stats),
+         ("proc_loadavg", self._process_proc_loadavg),
+         ("proc_pressure", self._process_proc_pressure),
+         ("proc_swaps", self._process_proc_swaps),
+         ("proc_uptime", self._process_proc_uptime),
+         ("proc_diskstats", self._process_proc_diskstats),
+         ("proc_net_netstat", self._process_proc_net_netstat),
+         ("proc_net_snmp", self._process_proc_net_snmp),
+         ("sockets", self._process_sockets),
+         ("proc_net_stat_arp_cache", self._process_proc_net_stat_arp_cache),
+         ("proc_net_stat_ndisc_cache",
+            self._process_proc_net_stat_ndisc_cache),
+         ("proc_net_stat_rt_cache", self._process_proc_net_stat_rt_cache),
+         ("proc_net_softnet_stat", self._process_proc_net_softnet_stat),
+         ("proc_net_stat_nf_conntrack",
+            self._process_proc_net_stat_nf_conntrack),
+         ("net_settings", self._process_net_settings),
+         ("sensors", self._process_sensors),
+         ("rtnl_events", self._process_rtnl_events),
+         ("routes", self._process_routes),
+         ("interfaces", self._process_interfaces),
+         ("qdiscs", self._process_qdiscs),
+         ("irq_affinity", self._process_irq_affinity),
+         ("numa", self._process_numa),
+         ("neighbours", self._process_neighbours),
+      ]
       if self.ioam_gnmi_nodes:
-         self._input_gnmi()
+         processes.append(("gnmi", self._input_gnmi))
+      for name, process in processes:
+         with self.parent.selfmon.measure("bm_"+name):
+            process()
+
+   def _probe_sensors(self):
+      """
+      resolve sensor source files
+
+      sysfs is only walked here, _process_sensors then reads the resolved
+      files. Labels and types do not change, they are read once.
+
+      """
+      sources = []
+      sensors = {"sensors/thermal": set(), "sensors/coretemp": set(),
+                 "sensors/fans": set()}
 
-   def _process_sensors(self):
       dev_cooling_path = "/sys/class/thermal/"
       attr_names = ["type", "temperature"]
       attr_types = [str, float]
       attr_units = ["", "C°"]
       category = "sensors/thermal"
-
-      for d in next(os.walk(dev_cooling_path))[1]:
+      for d in _listdir(dev_cooling_path):
          if "thermal" not in d:
             continue
-
          path = dev_cooling_path+d+"/"
+         type = self._open_read(path+"type")
+         if type is None or not os.path.exists(path+"temp"):
+            continue
          self._data[category].setdefault(d, init_rb_dict(
-                    attr_names, types=attr_types, units=attr_units))  
-
-         with open(path+"type", 'r') as f:
-            type = f.readlines()[0].rstrip()
-            self._data[category][d]["type"].append(type)
-         with open(path+"temp", 'r') as f:
-            temp = f.readlines()[0].rstrip()
-            self._data[category][d]["temperature"].append(int(temp)/1000)
-      
+                    attr_names, types=attr_types, units=attr_units))
+         sensors[category].add(d)
+         sources.append((category, d, {"type": type},
+                         {"temperature": (path+"temp", 1000)}))
+
       cpu_sensor_path="/sys/devices/platform/coretemp.0/hwmon/"
       attr_names = ["label", "input", "max", "critical"]
       attr_types = [str, float, float, float]
       attr_units = ["", "C°", "C°", "C°"]
       category = "sensors/coretemp"
-
-      for d in next(os.walk(cpu_sensor_path))[1]:
+      for d in _listdir(cpu_sensor_path):
          if "hwmon" not in d:
             continue
-         
          path = cpu_sensor_path+d+"/"
          for n in range(1,512):
             name = "temp{}".format(n)
-            if not os.path.exists(path+name+"_label"):
+            label = self._open_read(path+name+"_label")
+            if label is None:
                break
-
             self._data[category].setdefault(name, init_rb_dict(
                  attr_names, types=attr_types, units=attr_units))
-
-            with open(path+name+"_label") as f:
-               label = f.readlines()[0].rstrip()
-               self._data[category][name]["label"].append(label)
-            with open(path+name+"_input") as f:
-               input = f.readlines()[0].rstrip()
-               self._data[category][name]["input"].append(int(input)/1000.0)
-            with open(path+name+"_max") as f:
-               max = f.readlines()[0].rstrip()
-               self._data[category][name]["max"].append(int(max)/1000.0)
-            with open(path+name+"_crit") as f:
-               crit = f.readlines()[0].rstrip()
-               self._data[category][name]["critical"].append(int(crit)/1000.0)
+            sensors[category].add(name)
+            files = {}
+            for attr, suffix in [("input", "_input"), ("max", "_max"),
+                                 ("critical", "_crit")]:
+               if os.path.exists(path+name+suffix):
+                  files[attr] = (path+name+suffix, 1000.0)
+            sources.append((category, name, {"label": label}, files))
 
       fan_sensor_path="/sys/devices/platform/"
       attr_names = ["label", "input", "temperature"]
       attr_types = [str, int, float]
       attr_units = ["", "RPM", "C°"]
       category = "sensors/fans"
-
-      # find directories that monitor fans
-      fan_directories=[]
-      for d in next(os.walk(fan_sensor_path))[1]:
-         path=fan_sensor_path+d+"/hwmon/"
-         if os.path.exists(path) and "coretemp" not in d:
-            fan_directories.append(path)
-
-      for p in fan_directories:
-         for d in next(os.walk(p))[1]:
-            if "hwmon" not in d:
+      for d in _listdir(fan_sensor_path):
+         if "coretemp" in d:
+            continue
+         p = fan_sensor_path+d+"/hwmon/"
+         for h in _listdir(p):
+            if "hwmon" not in h:
+               continue
+            path = p+h+"/"
+            hwmon_name = self._open_read(path+"name")
+            if hwmon_name is None:
                continue
-            
-            path = p+d+"/"
-            with open(path+"name") as f:
-               name = f.readlines()[0].rstrip()
-
             for n in range(1,512):
-               
                prefix = "fan{}".format(n)
-               if not os.path.exists(path+prefix+"_label"):
+               label = self._open_read(path+prefix+"_label")
+               if label is None:
                   break
-
-               # create entry if needed
-               name += "-"+prefix
+               name = hwmon_name+"-"+prefix
                self._data[category].setdefault(name, init_rb_dict(
                        attr_names, types=attr_types, units=attr_units))
+               sensors[category].add(name)
+               files = {"input": (path+prefix+"_input", 1)}
+               temp_path = path+"temp{}_input".format(n)
+               if os.path.exists(temp_path):
+                  files["temperature"] = (temp_path, 1000.0)
+               sources.append((category, name, {"label": label}, files))
+
+      # cleanup removed sensors
+      for category, names in sensors.items():
+         for name in list(self._data[category].keys()):
+            if name not in names:
+               del self._data[category][name]
+      self._sensor_sources = sources
+      self._sensors_timestamp = time.monotonic()
+
+   def _batch_read(self):
+      """
+      register the small files read by collectors during this cycle,
+      i.e., sensors and /proc/<pid>/stat, and read them in one batch
 
-               with open(path+prefix+"_label") as f:
-                  label = f.readlines()[0].rstrip()
-                  self._data[category][name]["label"].append(label)
-               with open(path+prefix+"_input") as f:
-                  input = f.readlines()[0].rstrip()
-                  self._data[category][name]["input"].append(int(input))
+      """
+      if (self._sensor_sources is None
+            or time.monotonic()-self._sensors_timestamp > _sensors_ttl):
+         self._probe_sensors()
+      self._batch.register("sensors", [path
+         for _, _, _, files in self._sensor_sources
+         for path, _ in files.values()])
+      self._proc_pids = [pid for pid in os.listdir("/proc") if pid.isdigit()]
+      self._batch.register("proc_stats", ["/proc/"+pid+"/stat"
+                                          for pid in self._proc_pids])
+      self._batch_contents = self._batch.read()
 
-               prefix = "temp{}".format(n)
-               if os.path.exists(path+prefix+"_input"):
-                  with open(path+prefix+"_input") as f:
-                     temp = f.readlines()[0].rstrip()
-                     self._data[category][name]["temperature"].append(int(temp)/1000.0)                 
+   def _process_sensors(self):
+      """
+      read sensors resolved by _probe_sensors, they are probed again
+      every _sensors_ttl seconds
 
+      """
+      contents = iter(self._batch_contents["sensors"])
+      for category, name, statics, files in self._sensor_sources:
+         rbs = self._data[category][name]
+         for attr, val in statics.items():
+            rbs[attr].append(val)
+         for attr, (path, scale) in list(files.items()):
+            try:
+               rbs[attr].append(int(next(contents))/scale)
+            except (TypeError, ValueError):
+               # unreadable until next probe
+               del files[attr]
 
    def _process_proc_meminfo(self):
       with open("/proc/meminfo", 'r') as f:
@@ -427,7 +888,190 @@ class BMWatcher():
             elements = l.rstrip().split()
             self._data["meminfo"][elements[0].rstrip(':')].append(elements[1])
 
+   def _process_proc_vmstat(self):
+      """
+      vmstat fields are read by position, and rates of reclaim, stall and
+      fault counters are computed from their sums
+
+      """
+      with open("/proc/vmstat", 'r') as f:
+         values = list(map(int, f.read().split()[1::2]))
+      for rb, value in zip(self._vmstat_rbs, values):
+         rb.append(value)
+
+      now = time.monotonic()
+      counts = {key: sum(values[i] for i in indexes)
+                for key, indexes in self._vmstat_summary_indexes.items()}
+      previous, self._vmstat_counts = self._vmstat_counts, counts
+      elapsed = now-self._vmstat_timestamp if self._vmstat_timestamp else None
+      self._vmstat_timestamp = now
+      if not elapsed:
+         return
+      summary = self._data["vmstat/summary"]
+      for key, count in counts.items():
+         summary[key].append(round((count-previous[key])/elapsed, 2))
+      scanned = counts["pgscan"]-previous["pgscan"]
+      stolen = counts["pgsteal"]-previous["pgsteal"]
+      summary["reclaim_efficiency"].append(
+         round(stolen/scanned*100.0, 2) if scanned else 100.0)
+
+   def _process_proc_buddyinfo(self):
+      """
+      free pages per order of each zone, and the unusable free space index
+      for _buddy_order allocations (free memory in smaller blocks)
+
+      """
+      with open("/proc/buddyinfo", 'r') as f:
+         for l in f.readlines():
+            # Node 0, zone   Normal   2485   1202 ...
+            elements = l.split()
+            label = "{}:{}".format(elements[1].rstrip(','), elements[3])
+            counts = [int(c) for c in elements[4:]]
+            free = [c << order for order,c in enumerate(counts)]
+            total = sum(free)
+            unusable = sum(free[:_buddy_order])
+            # the number of orders depends on the kernel config
+            attr_list = (["order{}".format(order)
+                          for order in range(len(counts))]
+                         + ["free_pages", "unusable_index"])
+            if label not in self._data["buddyinfo"]:
+               self._data["buddyinfo"][label] = init_rb_dict(attr_list,
+                     types=[int]*(len(counts)+1)+[float],
+                     units=[None]*(len(counts)+1)+["%"])
+            append_rows([self._data["buddyinfo"][label]], attr_list,
+                        [counts+[total, round(unusable/total*100.0, 2)
+                                        if total else 0.0]])
+
+   def _process_proc_slabinfo(self):
+      """
+      keep ringbuffers for the _slab_top largest slab caches
+
+      """
+      caches = {}
+      try:
+         with open("/proc/slabinfo", 'r') as f:
+            # version and header
+            lines = f.readlines()[2:]
+      except PermissionError:
+         return
+      for l in lines:
+         # name active_objs num_objs objsize objperslab pagesperslab ...
+         elements = l.split()
+         caches[elements[0]] = (int(elements[1]), int(elements[2]),
+                                int(elements[3]))
+      top = heapq.nlargest(_slab_top, caches,
+                           key=lambda name: caches[name][1]*caches[name][2])
+
+      slabinfo = self._data["slabinfo"]
+      attr_list = ["active_objs", "num_objs", "objsize", "size"]
+      unit_list = [None, None, "B", "B"]
+      with slabinfo.lock():
+         for name in set(slabinfo)-set(top):
+            del slabinfo[name]
+         for name in top:
+            if name not in slabinfo:
+               slabinfo[name] = init_rb_dict(attr_list, units=unit_list)
+      append_rows([slabinfo[name] for name in top], attr_list,
+                  [list(caches[name])+[caches[name][1]*caches[name][2]]
+                     for name in top])
+
+   def _read_proc_io(self, pid):
+      """
+      @return bytes read and written by pid
+      """
+      io = 0
+      try:
+         with open("/proc/{}/io".format(pid), 'r') as f:
+            for l in f.readlines():
+               if l.startswith("read_bytes") or l.startswith("write_bytes"):
+                  io += int(l.split()[1])
+      except:
+         pass
+      return io
+
+   def _select_top_procs(self, procs):
+      """
+      select processes that have ring buffers, in top-k mode
+
+      Processes are ranked by cpu time delta, rss or io bytes delta. A
+      process that leaves the top-k is kept until it has been out of it
+      for proc_top_hysteresis consecutive cycles.
+
+      /proc/<pid>/io is only read for processes whose cpu time changed.
+      This is an approximation: cpu times are sampled on ticks, and a
+      process that issued io while running less than a tick keeps its
+      previous io bytes. All processes are read again every _proc_io_ttl
+      seconds, so that io is accounted for with a delay.
+
+      @param procs {pid: (comm, stat fields)} for all processes
+      @return the set of selected pids
+      """
+      key = self.parent.proc_top_key
+      scores, values, ticks = {}, {}, {}
+      full_io = False
+      if key == "io":
+         now = time.monotonic()
+         if (self._proc_io_timestamp is None
+               or now-self._proc_io_timestamp >= _proc_io_ttl):
+            self._proc_io_timestamp = now
+            full_io = True
+      for pid, (_, fields) in procs.items():
+         if key == "rss":
+            scores[pid] = int(fields[21])
+            continue
+         # utime + stime
+         ticks[pid] = int(fields[11]) + int(fields[12])
+         if key == "cpu":
+            values[pid] = ticks[pid]
+         elif key == "io":
+            if (not full_io and pid in self._proc_top_values
+                  and ticks[pid] == self._proc_top_ticks.get(pid)):
+               values[pid] = self._proc_top_values[pid]
+            else:
+               values[pid] = self._read_proc_io(pid)
+         scores[pid] = values[pid] - self._proc_top_values.get(pid,
+                                                               values[pid])
+      self._proc_top_values = values
+      self._proc_top_ticks = ticks
+
+      top = set(heapq.nlargest(self.parent.proc_top_k, scores,
+                               key=scores.get))
+      selected = set(top)
+      # out-of-top cycle counts of processes that are still tracked
+      out_counts = {}
+      for pid in self._data["stats"]:
+         if pid in top or pid not in procs:
+            continue
+         count = self._proc_top_out.get(pid, 0) + 1
+         if count < self.parent.proc_top_hysteresis:
+            out_counts[pid] = count
+            selected.add(pid)
+      self._proc_top_out = out_counts
+      return selected
+
+   def _numa_busiest_procs(self, procs):
+      """
+      @param procs {pid: (comm, stat fields)} for all processes
+      @return [(cpu time delta, cpu label)] of the _numa_top_procs
+              processes that used the most cpu time since last cycle, and
+              the cpu they last ran on
+      """
+      ticks = {pid: int(fields[11])+int(fields[12])
+               for pid, (_, fields) in procs.items()}
+      previous, self._numa_proc_ticks = self._numa_proc_ticks, ticks
+      deltas = {pid: t-previous[pid] for pid, t in ticks.items()
+                if pid in previous}
+      return [(deltas[pid], "cpu"+procs[pid][1][36])
+              for pid in heapq.nlargest(_numa_top_procs, deltas,
+                                        key=deltas.get)
+              if deltas[pid] > 0]
+
    def _process_proc_stats(self):
+      """
+      state counts are kept for all processes, ring buffers are kept for
+      all processes or for the top-k only (proc_tracking)
+
+      """
       attr_names = [ "comm", "state", "ppid", "pgrp", "sid",
                      "tty_nr", "tty_pgrp", "flags", "min_flt", "cmin_flt",
                      "maj_flt", "cmaj_flt", "utime", "stime", "cutime",
@@ -440,44 +1084,46 @@ class BMWatcher():
                      "cgtime"]
       attr_types = 2*[str] + 41*[int]
 
-      root_dir = "/proc/"
       proc_state = {"R":0, "S":0, "D":0, "T":0, "t":0, "X":0, "Z":0,
                     "P":0,"I": 0, }
-      active_procs = []
-      for d in next(os.walk(root_dir))[1]:
-
-         # not a proc
-         if not d.isdigit():
+      procs = {}
+      for pid, line in zip(self._proc_pids,
+                           self._batch_contents["proc_stats"]):
+         # process exited
+         if not line:
             continue
-
-         path = root_dir+d+"/stat"
-         try:
-            with open(path, 'r') as f:
-               line = f.readline().rstrip()
-               split = line.split('(')
-               pid = split[0].rstrip()
-               split = split[-1].split(')')
-               comm = split[0]
-
-               # create new rb if needed
-               self._data["stats"].setdefault(pid, 
-                  init_rb_dict(attr_names, types=attr_types))
-               # READ 
-               for i,e in enumerate( ([comm]+split[-1].split())[:len(attr_names)] ):
-                  self._data["stats"][pid][attr_names[i]].append(e)
-            
-            active_procs.append(pid)
-            proc_state[self._data["stats"][pid]["state"]._top()] += 1
-         except:
-            pass
-
-      # cleanup expired procs
+         line = line.rstrip()
+         # comm may contain parentheses
+         comm_start, comm_end = line.find('('), line.rfind(')')
+         fields = line[comm_end+1:].split()
+         if not fields or fields[0] not in proc_state:
+            continue
+         procs[pid] = (line[comm_start+1:comm_end], fields)
+         proc_state[fields[0]] += 1
+
+      if self.numa_node_count > 1:
+         self._numa_busiest = self._numa_busiest_procs(procs)
+      if self.parent.proc_tracking == "topk":
+         selected = self._select_top_procs(procs)
+      else:
+         selected = procs.keys()
+
+      for pid in selected:
+         comm, fields = procs[pid]
+         # create new rb if needed
+         self._data["stats"].setdefault(pid, 
+            init_rb_dict(attr_names, types=attr_types))
+         # READ 
+         for i,e in enumerate( ([comm]+fields)[:len(attr_names)] ):
+            self._data["stats"][pid][attr_names[i]].append(e)
+
+      # cleanup expired or unselected procs
       for monitored_pid in list(self._data["stats"].keys()):
-         if monitored_pid not in active_procs:
+         if monitored_pid not in selected:
             del self._data["stats"][monitored_pid]
 
       # count procs
-      self._data["stats_global"]["proc_count"].append(len(self._data["stats"]))
+      self._data["stats_global"]["proc_count"].append(len(procs))
       # count proc states
       proc_state_names = {"R":"run_count", "S":"sleep_count", "D":"wait_count", 
          "T":"stopped_count", "t":"ts_count",   "X":"dead_count",
@@ -487,73 +1133,289 @@ class BMWatcher():
          self._data["stats_global"][proc_state_names[d]].append(v)
 
    def _process_proc_stat(self):
-      time_names = [
-         "user_time", "nice_time", "system_time", "idle_time", 
-         "iowait_time", "irq_time", "softirq_time", "steal_time", 
-         "guest_time", "guest_nice_time", "system_all_time",
-         "idle_all_time", "guest_all_time", "total_time",
-      ]
-      period_names = [
-         "user_period", "nice_period", "system_period", "idle_period", 
-         "iowait_period", "irq_period", "softirq_period", "steal_period", 
-         "guest_period", "guest_nice_period", "system_all_period",
-         "idle_all_period", "guest_all_period",
-       ]
-      perc_names = [
-         "user_perc", "nice_perc", "system_perc", "idle_perc", 
-         "iowait_perc", "irq_perc", "softirq_perc", "steal_perc", 
-         "guest_perc", "guest_nice_perc", "system_all_perc",
-         "idle_all_perc", "guest_all_perc",
-      ]
+      """
+      per-cpu times are parsed into a matrix, and periods and percentages
+      are computed for all cpus at once
 
+      """
+      labels, times = [], []
       with open("/proc/stat", 'r') as f:
          for l in f.readlines():
             if l.startswith("cpu"):
-               split = l.rstrip().split()
-               cpu_label = split[0]
-
-               split = [int(s) for s in split[1:]]
-               # compute more metrics
-               #
-               # Guest time is already in usertime
-               usertime = split[0] - split[8]
-               nicetime = split[1] - split[9]
-               #  kernels >= 2.6
-               idlealltime = split[3] + split[4]
-               systemalltime = split[2] + split[5] + split[6]
-               virtalltime = split[8] + split[9]
-               totaltime = (usertime + nicetime + systemalltime + idlealltime
-                           + split[7] + virtalltime)
-
-               attr_val = [ 
-                  usertime, nicetime, split[2], split[3], split[4],
-                  split[5], split[6], split[7], split[8], split[9], 
-                  systemalltime, idlealltime, virtalltime, totaltime
-               ]
-               # append time attrs 
-               for k,v in zip(time_names, attr_val):
-                  v *= self.msec_per_jiffy
-                  self._data["stat/cpu"][cpu_label][k].append(v)
-
-               # compute total period first
-               totalperiod = self._data["stat/cpu"][cpu_label]["total_time"].delta(
-                                                                   count=1)
-               self._data["stat/cpu"][cpu_label]["total_period"].append(
-                                                                totalperiod)
-               # compute&append period attrs
-               for tname,pname,percname in zip(time_names, 
-                                               period_names, 
-                                               perc_names):
-
-                  v = self._data["stat/cpu"][cpu_label][tname].delta(count=1)
-                  #self.info("{}:{}: {} / {} = {}".format(cpu_label, percname, v,totalperiod, ratio(v,totalperiod)))
-                  self._data["stat/cpu"][cpu_label][pname].append(v)
-                  self._data["stat/cpu"][cpu_label][percname].append(
-                                                   ratio(v,totalperiod))
+               split = l.split()
+               labels.append(split[0])
+               times.append(split[1:11])
             else:
-               k, d = l.rstrip().split()[:2]
+               k, d = l.split()[:2]
                self._data["stat"][k].append(d)
 
+      (user, nice, system, idle, iowait, irq, softirq, steal, guest,
+         guest_nice) = ([int(v)*self.msec_per_jiffy for v in column]
+                                 for column in zip(*times))
+      # Guest time is already in usertime
+      usertime = list(map(operator.sub, user, guest))
+      nicetime = list(map(operator.sub, nice, guest_nice))
+      #  kernels >= 2.6
+      idlealltime = list(map(operator.add, idle, iowait))
+      systemalltime = [s+i+si for s,i,si in zip(system, irq, softirq)]
+      virtalltime = list(map(operator.add, guest, guest_nice))
+      totaltime = [sum(t) for t in zip(usertime, nicetime, systemalltime,
+                                       idlealltime, steal, virtalltime)]
+      time_rows = list(zip(usertime, nicetime, system, idle, iowait, irq,
+                           softirq, steal, guest, guest_nice, systemalltime,
+                           idlealltime, virtalltime, totaltime))
+
+      # periods since previous sample, total period is last
+      period_rows = [[t-p for t,p in zip(row, self._stat_cpu_times.get(label,
+                                                                   row))]
+                        for label, row in zip(labels, time_rows)]
+      perc_rows = [[round(v/row[-1]*100.0, 2) for v in row[:-1]] if row[-1]
+                      else [0.0]*len(_stat_cpu_percs)
+                        for row in period_rows]
+      self._stat_cpu_times = dict(zip(labels, time_rows))
+      self.stat_cpu_perc = dict(zip(labels, perc_rows))
+
+      append_rows([self._data["stat/cpu"][label] for label in labels],
+                  _stat_cpu_times + _stat_cpu_periods + _stat_cpu_percs,
+                  [list(t)+p+pc for t,p,pc in zip(time_rows, period_rows,
+                                                  perc_rows)])
+
+   def _process_proc_softirqs(self):
+      """
+      per-cpu softirq counts are parsed into a matrix, and rates are
+      computed for all cpus at once
+
+      """
+      cpus, labels, _, rows = _read_count_matrix("/proc/softirqs")
+      now = time.monotonic()
+      previous, self._softirq_counts = self._softirq_counts, dict(zip(labels,
+                                                                     rows))
+      elapsed = now-self._softirqs_timestamp if self._softirqs_timestamp else None
+      self._softirqs_timestamp = now
+      if not elapsed:
+         return
+      rates = _count_rates(labels, rows, previous, elapsed)
+      # transpose to one row per cpu
+      softirqs = self._data["softirqs"]
+      cpu_rows = [(softirqs[cpu], row) for cpu, row in zip(cpus, zip(*rates))
+                  if cpu in softirqs]
+      append_rows([rbs for rbs,_ in cpu_rows], labels,
+                  [row for _,row in cpu_rows])
+
+   def _get_net_irqs(self):
+      """
+      @return the MSI interrupts of network devices {irq: if_name}, they
+              are cached until next link event
+      """
+      if self._net_irqs is not None:
+         return self._net_irqs
+      self._net_irqs = {}
+      for if_name in _listdir("/sys/class/net"):
+         device = os.path.realpath(os.path.join("/sys/class/net", if_name,
+                                                "device"))
+         paths = [device]
+         # virtio devices use the interrupts of their pci device
+         if os.path.basename(device).startswith("virtio"):
+            paths.append(os.path.dirname(device))
+         for path in paths:
+            for irq in _listdir(os.path.join(path, "msi_irqs")):
+               self._net_irqs.setdefault(irq, if_name)
+      return self._net_irqs
+
+   def _process_irq_affinity(self):
+      """
+      compare the affinity of network device interrupts with the cpus
+      local to the device
+
+      Affinities rarely change, they are read again every
+      _irq_affinity_ttl seconds, or when the cached interrupts of network
+      devices are invalidated by a link event.
+
+      index is if_name
+      """
+      now = time.monotonic()
+      net_irqs = self._get_net_irqs()
+      # _get_net_irqs() returns a new dict after a link event
+      if (net_irqs is self._irq_affinity_irqs
+            and now-self._irq_affinity_timestamp < _irq_affinity_ttl):
+         return
+      self._irq_affinity_irqs = net_irqs
+      self._irq_affinity_timestamp = now
+
+      if_irqs = {}
+      for irq, if_name in net_irqs.items():
+         # the effective affinity (Linux 4.15+) is empty until the
+         # interrupt is started
+         for name in ["effective_affinity_list", "smp_affinity_list"]:
+            try:
+               with open(os.path.join("/proc/irq", irq, name)) as f:
+                  cpus = _parse_cpulist(f.read().strip())
+            except OSError:
+               continue
+            if cpus:
+               if_irqs.setdefault(if_name, []).append((irq, cpus))
+               break
+
+      interrupts = self._data["interrupts/net"]
+      rows = {}
+      for if_name, irqs in if_irqs.items():
+         device = os.path.realpath(os.path.join("/sys/class/net", if_name,
+                                                "device"))
+         local = set()
+         # virtio devices are local to their pci device
+         for path in [device, os.path.dirname(device)]:
+            try:
+               with open(os.path.join(path, "local_cpulist")) as f:
+                  local = _parse_cpulist(f.read().strip())
+               break
+            except OSError:
+               continue
+         if not local:
+            continue
+         remote = [irq for irq, cpus in irqs if not cpus & local]
+         spanning = sum(1 for _, cpus in irqs if cpus & local and cpus-local)
+         queues = [interrupts[irq]["name"]._top() if irq in interrupts
+                   else irq for irq in remote]
+         rows[if_name] = [len(irqs), len(local),
+                          len(set().union(*[cpus for _, cpus in irqs])),
+                          len(remote), spanning,
+                          ratio(len(remote), len(irqs)), ",".join(queues)]
+
+      affinity = self._data["net/irq_affinity"]
+      attr_list = ["irq_count", "local_cpus", "affinity_cpus", "remote_irqs",
+                   "spanning_irqs", "remote_perc", "remote_queues"]
+      type_list = [int]*6 + [str]
+      unit_list = [None]*5 + ["%", None]
+      with affinity.lock():
+         for if_name in set(affinity)-set(rows):
+            del affinity[if_name]
+         for if_name in rows:
+            if if_name not in affinity:
+               affinity[if_name] = init_rb_dict(attr_list, types=type_list,
+                                                units=unit_list)
+      append_rows([affinity[if_name] for if_name in rows], attr_list,
+                  list(rows.values()))
+
+   def _process_proc_interrupts(self):
+      """
+      per-cpu interrupt counts of network devices are parsed into a matrix,
+      and the distribution of their rates over cpus is computed for all
+      queues at once
+
+      """
+      cpus, labels, names, rows = _read_count_matrix("/proc/interrupts")
+      now = time.monotonic()
+      net_irqs = self._get_net_irqs()
+      selected = [i for i,label in enumerate(labels) if label in net_irqs]
+      labels = [labels[i] for i in selected]
+      names = [names[i] for i in selected]
+      rows = [rows[i] for i in selected]
+
+      interrupts = self._data["interrupts/net"]
+      irqs = self._data["net/irqs"]
+      # cpus were hotplugged, columns changed
+      if cpus != self._irq_cpus:
+         self._irq_cpus = cpus
+         self._irq_counts = {}
+         self._irqs_timestamp = None
+         with interrupts.lock():
+            interrupts.clear()
+      previous, self._irq_counts = self._irq_counts, dict(zip(labels, rows))
+      elapsed = now-self._irqs_timestamp if self._irqs_timestamp else None
+      self._irqs_timestamp = now
+      if not elapsed:
+         return
+      rates = _count_rates(labels, rows, previous, elapsed)
+
+      # per-queue distribution over cpus
+      attr_list = ["if_name", "name", "rate", "cpu_count"] + cpus
+      type_list = [str, str, float, int] + [float]*len(cpus)
+      unit_list = [None, None, "/s", None] + ["/s"]*len(cpus)
+      with interrupts.lock():
+         for label in set(interrupts)-set(labels):
+            del interrupts[label]
+         for label in labels:
+            if label not in interrupts:
+               interrupts[label] = init_rb_dict(attr_list, types=type_list,
+                                                units=unit_list)
+      append_rows([interrupts[label] for label in labels], attr_list,
+                  [[net_irqs[label], name, round(sum(row), 2),
+                    sum(1 for r in row if r > 0)] + row
+                     for label, name, row in zip(labels, names, rates)])
+
+      # per-interface sums
+      if_rows = {}
+      for label, row in zip(labels, rates):
+         count, if_row = if_rows.get(net_irqs[label], (0, [0.0]*len(cpus)))
+         if_rows[net_irqs[label]] = (count+1, list(map(operator.add,
+                                                       if_row, row)))
+      self._if_irq_rates = {if_name: row
+                            for if_name, (_, row) in if_rows.items()}
+      attr_list = ["irq_count", "rate", "cpu_count", "max_cpu_share"]
+      type_list = [int, float, int, int]
+      unit_list = [None, "/s", None, "%"]
+      with irqs.lock():
+         for if_name in set(irqs)-set(if_rows):
+            del irqs[if_name]
+         for if_name in if_rows:
+            if if_name not in irqs:
+               irqs[if_name] = init_rb_dict(attr_list, types=type_list,
+                                            units=unit_list)
+      append_rows([irqs[if_name] for if_name in if_rows], attr_list,
+                  [[count, round(sum(row), 2), sum(1 for r in row if r > 0),
+                    ratio(max(row), sum(row))]
+                     for count, row in if_rows.values()])
+
+   def _process_numa(self):
+      """
+      per-node memory stats, and locality of network devices with their
+      interrupts and with the busiest processes
+
+      """
+      for node, meminfo in self._data["numa/meminfo"].items():
+         path = os.path.join(_numa_path, node)
+         with open(os.path.join(path, "meminfo"), 'r') as f:
+            for l in f.readlines():
+               elements = l.split()
+               meminfo[elements[2].rstrip(':')].append(elements[3])
+         for name in ["numastat", "vmstat"]:
+            rbs = self._data["numa/"+name][node]
+            with open(os.path.join(path, name), 'r') as f:
+               for l in f.readlines():
+                  attr, val = l.split()
+                  if attr in rbs:
+                     rbs[attr].append(val)
+
+      # locality is only relevant with several nodes
+      if self.numa_node_count < 2:
+         return
+      numa_net = self._data["numa/net"]
+      attr_list = ["numa_node", "irq_remote_perc", "proc_remote_perc"]
+      unit_list = [None, "%", "%"]
+      proc_total = sum(delta for delta, _ in self._numa_busiest)
+      for if_name, if_dict in self._data["net/dev"].items():
+         try:
+            node = int(if_dict["numa_node"]._top())
+         except ValueError:
+            continue
+         # no affinity reported by the device
+         if node < 0:
+            continue
+         if if_name not in numa_net:
+            with numa_net.lock():
+               numa_net[if_name] = init_rb_dict(attr_list, units=unit_list)
+         rbs = numa_net[if_name]
+         rbs["numa_node"].append(node)
+         row = self._if_irq_rates.get(if_name)
+         if row:
+            remote = sum(rate for cpu_label, rate in zip(self._irq_cpus, row)
+                         if self._numa_cpu_nodes.get(cpu_label) != node)
+            rbs["irq_remote_perc"].append(ratio(remote, sum(row)))
+         if proc_total:
+            remote = sum(delta for delta, cpu_label in self._numa_busiest
+                         if self._numa_cpu_nodes.get(cpu_label) != node)
+            rbs["proc_remote_perc"].append(ratio(remote, proc_total))
+
    def _process_proc_loadavg(self):
       attr_names = ["1min", "5min", "15min", "runnable", "total"]
 
@@ -567,6 +1429,29 @@ class BMWatcher():
             else:
                self._data["loadavg"][attr_names[i]].append(e)
 
+   def _process_proc_pressure(self):
+      for resource, rbs in self._data["pressure"].items():
+         pressure = read_pressure(os.path.join("/proc/pressure", resource))
+         for key, val in pressure.items():
+            if key in rbs:
+               rbs[key].append(val)
+         if self._psi_triggers:
+            rbs["trigger_events"].append(self._psi_triggers.events[resource])
+
+   def input_pressure(self):
+      """
+      read pressure outside of the collection tick, e.g., on stall events
+
+      """
+      self._process_proc_pressure()
+
+   def _on_psi_trigger(self, resource):
+      """
+      a stall threshold was exceeded, called from the triggers thread
+
+      """
+      self.parent.wake()
+
    def _process_proc_swaps(self):
       """
       index is swap filename
@@ -599,124 +1484,202 @@ class BMWatcher():
          for i,e in enumerate(f.readline().rstrip().split()):
             self._data["uptime"][attr_names[i]].append(e)
 
-   def _process_proc_diskstats(self):
-
-      mount_names = ["fs_spec", "fs_file", "fs_vfstype", 
-         "fs_mntops"]#, "fs_freq", "fs_passno"]
-      mount_counters = [False]*4
-      mount_units = [ "" ]*4
-      mount_types = [str]*4
-
-      time_names = [ "period_writting", "period_reading", "period_io",
-                     "period_discarding",
-                    "perc_writting", "perc_reading", "perc_io", 
-                    "perc_discarding"]
-      time_counters = [False]*8
-      time_units = ["ms"]*4 + ["%"]*4
-      time_types = [int]*8
-
-      attr_names = [
-         "device_major", "device_minor", "device_name",
-         "reads_completed", "reads_merged", "sectors_read",
-         "time_reading", "writes_completed", "writes_merged",
-         "sectors_written", "time_writting", "current_io",
-         "time_io", "time_io_weighted", "discards_completed",
-         "discards_merged", "sectors_discarded", "time_discarding",
-         "size", "total", "free_root", "free_user", 
-         "used", "total_user", "usage_user"
-      ] + mount_names + time_names
-      attr_units = [  "", "", "", "", "", "", "ms", "",
-         "", "", "ms", "", "ms", "ms", "", "", "", "ms", "KB",
-         "KB","KB","KB","KB","KB","%",
-         
-      ] + mount_units + time_units
-      attr_counters = [ False, False, False, True, True, True,
-         False, True, True, True, False, False, False, False, # ??
-         True, True, True, False, False, False, False, False, 
-         False,  False, False,
-      ] + mount_counters + time_counters
-      attr_types = [ int ] * 25 + mount_types + time_types
-
-      mounted_devs = []
-      with open("/proc/mounts") as f:
+   def _resolve_disks(self, mounts, majmin):
+      """
+      resolve mounted block devices and the devices backing them, i.e.,
+      the slaves of dm and md devices and the disks of partitions,
+      recursively
+
+      @param mounts the list of /proc/mounts fields
+      @param majmin a dict {(major, minor): device name}
+      @return a dict {device name: (mount fields or None, backing list,
+              device type)}
+      """
+      mounted = {}
+      for fields in mounts:
+         fs_spec = fields[0]
+         if not fs_spec.startswith("/dev/"):
+            continue
+         try:
+            st = os.stat(fs_spec)
+            dev_name = majmin.get((os.major(st.st_rdev),
+                                   os.minor(st.st_rdev)))
+         except OSError:
+            # e.g., /dev/root
+            dev_name = fs_spec.split("/")[-1]
+         if dev_name and dev_name not in mounted:
+            mounted[dev_name] = fields[:len(_disk_mount_attrs)]
+
+      devices = {}
+      pending = list(mounted)
+      while pending:
+         dev_name = pending.pop()
+         if dev_name in devices:
+            continue
+         path = os.path.join(_block_path, dev_name.replace("/", "!"))
+         backing = [slave.replace("!", "/")
+                    for slave in _listdir(os.path.join(path, "slaves"))]
+         if os.path.exists(os.path.join(path, "partition")):
+            dev_type = "partition"
+            backing.append(os.path.basename(
+               os.path.dirname(os.path.realpath(path))).replace("!", "/"))
+         elif dev_name.startswith("dm-"):
+            dev_type = "dm"
+         elif dev_name.startswith("md"):
+            dev_type = "md"
+         elif dev_name.startswith("loop"):
+            dev_type = "loop"
+         else:
+            dev_type = "disk"
+         devices[dev_name] = (mounted.get(dev_name), backing, dev_type)
+         pending.extend(backing)
+      return devices
 
-         for l in f.readlines():
-            attr_val = l.rstrip().split()[:-2]
-            dev_name = attr_val[0].split("/")[-1]
+   def _read_disk_queue(self, dev_name):
+      """
+      read request queue settings of a device, they are cached for
+      _disk_queue_ttl seconds
 
-            if not dev_name[-1].isdigit():
-               continue
+      @return a list of _disk_queue_attrs values, None if the device has
+              no request queue (e.g., partitions)
+      """
+      now = time.monotonic()
+      cached = self._disk_queue_cache.get(dev_name)
+      if cached and now - cached[0] < _disk_queue_ttl:
+         return cached[1]
+      path = os.path.join(_block_path, dev_name.replace("/", "!"), "queue")
+      values = []
+      try:
+         for attr in _disk_queue_attrs:
+            with open(os.path.join(path, attr)) as f:
+               value = f.read().strip()
+            if attr == "scheduler":
+               # the active scheduler is bracketed
+               value = value.partition("[")[2].partition("]")[0] or value
+            else:
+               value = int(value)
+            values.append(value)
+      except (OSError, ValueError):
+         values = None
+      self._disk_queue_cache[dev_name] = (now, values)
+      return values
 
-            # add disk if not tracked
-            self._data["diskstats"].setdefault(dev_name, init_rb_dict(
-                 attr_names, counters=attr_counters, units=attr_units,
-                  types=attr_types))
-            mounted_devs.append(dev_name)
+   def _process_proc_diskstats(self):
+      """
+      mounted block devices and their backing devices (whole disks, dm and
+      md), /proc/diskstats is parsed once per cycle for all devices
 
-            for i,attr in enumerate(attr_val):
-               (self._data["diskstats"][dev_name]
-                              [mount_names[i]].append(attr))       
+      IOPS, throughput (KB/s), average latency (ms) and queue depth are
+      derived from counter deltas
 
+      index is device name
+      """
+      with open("/proc/mounts") as f:
+         mounts = [l.split() for l in f.readlines()]
+      rows, majmin = {}, {}
+      with open("/proc/diskstats", 'r') as f:
+         now = time.monotonic()
+         for l in f.readlines():
+            fields = l.split()
+            counts = [int(v) for v in fields[3:3+len(_disk_stat_attrs)]]
+            # flushes are reported since Linux 5.5
+            counts += [0]*(len(_disk_stat_attrs)-len(counts))
+            rows[fields[2]] = [int(fields[0]), int(fields[1])] + counts
+            majmin[(int(fields[0]), int(fields[1]))] = fields[2]
+      sizes = {}
       with open("/proc/partitions") as f:
-
          for l in f.readlines()[2:]:
-            attr_val = l.rstrip().split()
-            dev_name = attr_val[-1]
-
-            if not dev_name[-1].isdigit():
-               continue
-
-            # skip disk if not present in /proc/mounts
-            if dev_name not in self._data["diskstats"]:
-               continue
-            self._data["diskstats"][dev_name]["size"].append(attr_val[2])
-
-      with open("/proc/diskstats", 'r') as f:
-         tstamp = time.time()
-         for disk in f.readlines():
-
-            attr_val = disk.rstrip().split()
-            dev_name = attr_val[2]
-            if not dev_name[-1].isdigit():
-               continue
-
-            # skip disk if not present in /proc/mounts
-            if dev_name not in self._data["diskstats"]:
-               continue
-            for i,v in enumerate(attr_val):
-               if i == 2:
-                  continue
-               self._data["diskstats"][dev_name][attr_names[i]].append(v)
-            # compute periods and percentages
-            if self.diskstats_timestamp != None:
-               totalperiod=(tstamp-self.diskstats_timestamp)*1000
-               # compute&append period attrs
-               time_names = ["time_writting", "time_reading", "time_io",
-                             "time_discarding"]
-               period_names = ["period_writting", "period_reading", "period_io",
-                              "period_discarding"]
-               perc_names = ["perc_writting", "perc_reading", "perc_io",
-                             "perc_discarding"]
-               for tname,pname,percname in zip(time_names, 
-                                               period_names, 
-                                               perc_names):
-                  v = self._data["diskstats"][dev_name][tname].delta(count=1)
-                  # periods are sums of per-CPU counters, compute avg.
-                  self._data["diskstats"][dev_name][pname].append(v)
-                  self._data["diskstats"][dev_name][percname].append(
-                                                   ratio(v,totalperiod))
-         self.diskstats_timestamp=tstamp
-
-      for monitored_dev in list(self._data["diskstats"].keys()):
-          # cleanup unmounted dev
-         if monitored_dev not in mounted_devs:
-            del self._data["diskstats"][monitored_dev]
+            fields = l.split()
+            if fields:
+               sizes[fields[-1]] = int(fields[2])
+
+      # mounts or devices changed, resolve backing devices again
+      if (mounts != self._disk_mounts
+            or not all(dev_name in rows for dev_name in self._disk_devices)):
+         self._disk_mounts = mounts
+         self._disk_devices = self._resolve_disks(mounts, majmin)
+      devices = self._disk_devices
+
+      diskstats = self._data["diskstats"]
+      for dev_name in list(diskstats.keys()):
+         if dev_name not in devices:
+            del diskstats[dev_name]
+            self._disk_counts.pop(dev_name, None)
+            self._disk_queue_cache.pop(dev_name, None)
+      elapsed = (now-self.diskstats_timestamp
+                 if self.diskstats_timestamp else None)
+      self.diskstats_timestamp = now
+
+      for dev_name, (mount, backing, dev_type) in devices.items():
+         row = rows.get(dev_name)
+         if row is None:
             continue
-         
-         path,_ = self._data["diskstats"][monitored_dev]["fs_file"].top()
+         if dev_name not in diskstats:
+            diskstats[dev_name] = init_rb_dict(_disk_attrs,
+                  counters=_disk_counters, units=_disk_units,
+                  types=_disk_types)
+         rbs = diskstats[dev_name]
+         rbs["device_type"].append(dev_type)
+         rbs["backing"].append(",".join(backing))
+         if mount:
+            for attr, value in zip(_disk_mount_attrs, mount):
+               rbs[attr].append(value)
+         if dev_name in sizes:
+            rbs["size"].append(sizes[dev_name])
+         append_rows([rbs], ["device_major", "device_minor"]
+                     + _disk_stat_attrs, [row])
+         path = os.path.join(_block_path, dev_name.replace("/", "!"))
          try:
-            st = os.statvfs(path)
-         except:
+            with open(os.path.join(path, "inflight")) as f:
+               reads, writes = f.read().split()
+            rbs["inflight_reads"].append(reads)
+            rbs["inflight_writes"].append(writes)
+         except (OSError, ValueError):
+            pass
+         queue = self._read_disk_queue(dev_name)
+         if queue:
+            append_rows([rbs], _disk_queue_attrs, [queue])
+
+         # counters deltas
+         counts = row[2:]
+         previous = self._disk_counts.get(dev_name)
+         self._disk_counts[dev_name] = counts
+         if not elapsed or not previous:
+            continue
+         delta = dict(zip(_disk_stat_attrs,
+                          [max(c-p, 0) for c,p in zip(counts, previous)]))
+         for op in ["read", "write", "discard"]:
+            completed = delta[_disk_op_attrs[op][0]]
+            sectors = delta[_disk_op_attrs[op][1]]
+            spent = delta[_disk_op_attrs[op][2]]
+            rbs[op+"_iops"].append(round(completed/elapsed, 2))
+            rbs[op+"_throughput"].append(
+               round(sectors*_sector_size/1024/elapsed, 2))
+            rbs[op+"_await"].append(
+               round(spent/completed, 2) if completed else 0.0)
+         # time_io_weighted grows by the number of in-flight requests
+         # every ms
+         rbs["queue_depth"].append(
+            round(delta["time_io_weighted"]/(elapsed*1000), 2))
+         for tname,pname,percname in zip(_disk_time_attrs,
+                                         _disk_period_attrs,
+                                         _disk_perc_attrs):
+            rbs[pname].append(delta[tname])
+            rbs[percname].append(ratio(delta[tname], elapsed*1000))
+
+      # statvfs may block on hung network or FUSE mounts, it runs on the
+      # fs probe workers and unresponsive mounts keep their last values,
+      # mounts that were not probed in time keep their responsiveness
+      calls = {}
+      for dev_name, (mount, _, _) in devices.items():
+         if mount and dev_name in diskstats:
+            calls[dev_name] = (os.statvfs, (mount[1],))
+
+      for monitored_dev, (responsive, st) in self._fsprobe.run(calls).items():
+         if responsive is not None:
+            self._data["diskstats"][monitored_dev]["responsive"].append(
+                                                               responsive)
+         if st is None:
             continue
          # Total space (only available to root)
          total = (st.f_blocks * st.f_frsize) / 1024
@@ -768,6 +1731,75 @@ class BMWatcher():
             for attr,val in zip(attrs[1:], vals[1:]):
                self._data["snmp"][prefix+attr].append(val)
 
+   def _process_sockets(self):
+      """
+      sockets are aggregated while they are dumped: per-state counts,
+      queues and retransmissions per protocol, and accept queues and
+      established connections per tcp listening port
+
+      """
+      listen = {}
+      established = {}
+      for proto, protocol in _sock_protocols.items():
+         counts = dict.fromkeys(_sock_attrs, 0)
+         info = protocol == socket.IPPROTO_TCP
+         dumped = False
+         for family in [socket.AF_INET, socket.AF_INET6]:
+            if (protocol, family) in self._sockdiag_disabled:
+               continue
+            # the dump fails before any socket, e.g., if its diag module
+            # is not available
+            try:
+               for (state, sport, _, rqueue, wqueue, unacked, retrans,
+                    total_retrans) in self._sockdiag.dump(family, protocol,
+                                                          info=info):
+                  counts[tcp_states.get(state, "close")] += 1
+                  if not info:
+                     counts["rx_queue"] += rqueue
+                     counts["tx_queue"] += wqueue
+                     continue
+                  if state == TCP_LISTEN:
+                     sockets, queue, backlog = listen.get(sport, (0, 0, 0))
+                     listen[sport] = (sockets+1, queue+rqueue, backlog+wqueue)
+                     continue
+                  if state == TCP_ESTABLISHED:
+                     established[sport] = established.get(sport, 0)+1
+                  counts["rx_queue"] += rqueue
+                  counts["tx_queue"] += wqueue
+                  counts["unacked"] += unacked
+                  counts["retrans"] += retrans
+                  counts["total_retrans"] += total_retrans
+            except OSError as e:
+               self.info("sock_diag {} dump failed, disabled: {}".format(
+                           proto+("6" if family == socket.AF_INET6 else ""),
+                           e))
+               self._sockdiag_disabled.add((protocol, family))
+               continue
+            dumped = True
+         if not dumped:
+            continue
+         counts["total"] = sum(counts[state] for state in tcp_states.values())
+         rbs = self._data["sockets"][proto]
+         for attr, count in counts.items():
+            rbs[attr].append(count)
+
+      # tcp listening ports
+      listen_dict = self._data["sockets/listen"]
+      attr_list = ["sockets", "accept_queue", "accept_max", "accept_perc",
+                   "established"]
+      unit_list = [None, None, None, "%", None]
+      ports = [str(port) for port in listen]
+      with listen_dict.lock():
+         for port in set(listen_dict)-set(ports):
+            del listen_dict[port]
+         for port in ports:
+            if port not in listen_dict:
+               listen_dict[port] = init_rb_dict(attr_list, units=unit_list)
+      append_rows([listen_dict[port] for port in ports], attr_list,
+                  [[sockets, queue, backlog, ratio(queue, backlog),
+                    established.get(port, 0)]
+                     for port, (sockets, queue, backlog) in listen.items()])
+
    def _process_proc_net_stat_arp_cache(self):
       with open("/proc/net/stat/arp_cache", 'r') as f:
          attr_names = f.readline().split()
@@ -801,37 +1833,91 @@ class BMWatcher():
             for i,e in enumerate(l.rstrip().split()):
                self._data["rt-cache"][cpu_label][attr_names[i]].append(int(e,16))
 
-   def _inet_ntoa(self, addr):
+   def _process_proc_net_softnet_stat(self):
       """
-      addr is a hex network-ordered ip address
+      per-cpu softnet counters are parsed into a matrix, and rates of
+      processed, dropped (backlog full) and time squeezed (budget
+      exhausted) packets are computed for all cpus at once
 
-      return numbers-and-dots string 
       """
-      return str(ipaddress.ip_address(bytes(reversed(bytearray.fromhex(addr)))))
-
-   def _process_proc_net_arp(self):
-      """
-      list index is ip address
+      with open("/proc/net/softnet_stat", 'r') as f:
+         rows = [[int(v, 16) for v in l.split()] for l in f.readlines()]
+      # one line per online cpu, the cpu column is missing before 5.10
+      labels = ["cpu{}".format(row[_softnet_cpu_column]
+                               if len(row) > _softnet_cpu_column else i)
+                for i,row in enumerate(rows)]
+      rows = [[row[i] if i < len(row) else 0
+               for i in _softnet_columns.values()] for row in rows]
+      now = time.monotonic()
+      elapsed = now-self._softnet_timestamp if self._softnet_timestamp else None
+      self._softnet_timestamp = now
+      previous = self._softnet_counts
+      self._softnet_counts = {label: row[:len(_softnet_rates)]
+                              for label, row in zip(labels, rows)}
+      if elapsed:
+         rates = _count_rates(labels, [row[:len(_softnet_rates)]
+                                       for row in rows], previous, elapsed)
+      else:
+         rates = [[0.0]*len(_softnet_rates)]*len(rows)
+
+      attr_list = list(_softnet_columns) + _softnet_rates
+      type_list = [int]*len(_softnet_columns) + [float]*len(_softnet_rates)
+      counter_list = ([True]*(len(_softnet_columns)-1) + [False]
+                      + [False]*len(_softnet_rates))
+      unit_list = [None]*len(_softnet_columns) + ["/s"]*len(_softnet_rates)
+      softnet = self._data["softnet"]
+      for label in labels:
+         if label not in softnet:
+            softnet[label] = init_rb_dict(attr_list, types=type_list,
+                                    counters=counter_list, units=unit_list)
+      append_rows([softnet[label] for label in labels], attr_list,
+                  [row+rate for row, rate in zip(rows, rates)])
+
+   def _process_proc_net_stat_nf_conntrack(self):
       """
-      attr_names = ["type", "flags", "link_addr", "mask", "dev"]
+      conntrack table usage, and per-cpu conntrack counters summed
+      column-wise over cpus
 
-      active_entry=[]
-      with open("/proc/net/arp", 'r') as f:
-         for l in f.readlines()[1:]:
-            split = l.rstrip().split()
-
-            # create entry if needed
-            ip_addr = split[0]
-            active_entry.append(ip_addr)
-            self._data["net/arp"].setdefault(ip_addr, init_rb_dict(attr_names,type=str))
+      index is cpu label, nothing is collected while nf_conntrack is not
+      loaded
+      """
+      try:
+         with open(os.path.join(_conntrack_path, "nf_conntrack_count")) as f:
+            count = int(f.read())
+         with open(os.path.join(_conntrack_path, "nf_conntrack_max")) as f:
+            maximum = int(f.read())
+         with open(_conntrack_stat_path, 'r') as f:
+            attr_names = f.readline().split()
+            rows = [[int(e, 16) for e in l.split()] for l in f.readlines()]
+      except OSError:
+         return
+      # entries is the global table size, repeated on each line
+      summed = [attr for attr in attr_names if attr != "entries"]
+      per_cpu = self._data["conntrack"]
+      summary = self._data["conntrack/summary"]
+      labels = ["cpu{}".format(i) for i in range(len(rows))]
+      for label in labels:
+         if label not in per_cpu:
+            per_cpu[label] = init_rb_dict(attr_names,
+                     counters=[attr != "entries" for attr in attr_names])
+      if not summary:
+         summary.update(init_rb_dict(["count", "max", "fill_perc"],
+                                     units=[None, None, "%"]))
+         summary.update(init_rb_dict(summed, counter=True))
+      append_rows([per_cpu[label] for label in labels], attr_names, rows)
+
+      totals = dict(zip(attr_names, [sum(column) for column in zip(*rows)]))
+      append_rows([summary], ["count", "max", "fill_perc"] + summed,
+                  [[count, maximum, ratio(count, maximum)]
+                   + [totals[attr] for attr in summed]])
 
-            for i,e in enumerate(split[1:]):
-               self._data["net/arp"][ip_addr][attr_names[i]].append(e)
+   def _inet_ntoa(self, addr):
+      """
+      addr is a hex network-ordered ip address
 
-      # cleanup old entries
-      for monitored_entry in list(self._data["net/arp"].keys()):
-         if monitored_entry not in active_entry:
-            del self._data["net/arp"][monitored_entry]
+      return numbers-and-dots string 
+      """
+      return str(ipaddress.ip_address(bytes(reversed(bytearray.fromhex(addr)))))
 
    def _process_proc_net_route(self):
       attr_names = ["if_name", "dst", "gateway", "flags", "ref_cnt", "use",
@@ -871,12 +1957,60 @@ class BMWatcher():
       except:
          return None
 
+   def _if_gateways(self):
+      """
+      find gateways from main table routes
+
+      @return {family: {ifindex: (gw_addr, is_default)}}, default routes
+              are preferred
+      """
+      gws = {socket.AF_INET: {}, socket.AF_INET6: {}}
+      for family, category in [(socket.AF_INET, "routes4"),
+                               (socket.AF_INET6, "routes6")]:
+         for key, rbs in self._data[category].items():
+            if rbs["RTA_GATEWAY"].is_empty() or rbs["RTA_OIF"].is_empty():
+               continue
+            index = int(rbs["RTA_OIF"]._top())
+            if index in gws[family] and gws[family][index][1]:
+               continue
+            gws[family][index] = (rbs["RTA_GATEWAY"]._top(), key == "default")
+      return gws
+
+   def _read_if_sysfs(self, if_name, if_dict, index, carrier_changes):
+      """
+      read non-standard if attributes from sysfs
+
+      They are device properties, and are only read again if the interface
+      is renamed or if its carrier changed.
+      https://www.kernel.org/doc/Documentation/ABI/testing/sysfs-class-net
+
+      """
+      cached = self._if_sysfs_cache.get(index)
+      if cached and cached[:2] == (if_name, carrier_changes):
+         return
+      self._if_sysfs_cache[index] = (if_name, carrier_changes)
+
+      path_prefix="/sys/class/net/{}/".format(if_name)
+      for attr, path in [("numa_node", "device/numa_node"),
+                         ("local_cpulist", "device/local_cpulist"),
+                         ("local_cpu", "device/local_cpu"),
+                         ("enable", "device/enable"),
+                         ("current_link_speed", "device/current_link_speed"),
+                         ("current_link_width", "device/current_link_width"),
+                         ("duplex", "duplex")]:
+         self._open_read_append(path_prefix+path, if_dict[attr])
+      if_dict["wireless"].append(
+            int(os.path.exists(path_prefix+"wireless")))
+
    def _process_interfaces(self):
       """
       list interfaces and get their addresses
 
       index is if_name
 
+      links and addresses are obtained with a single RTM_GETLINK and a
+      single RTM_GETADDR dump, whatever the interface count.
+
       """
       attr_list_netdev = [ 
          "rx_bytes", "rx_packets", "rx_errs", "rx_drop", "rx_fifo",
@@ -890,7 +2024,6 @@ class BMWatcher():
       ]
       attr_list = [
          "link_addr", "link_broadcast", "link_peer",  
-         "link_gw_addr", "link_gw_if", "link_gw_default",  
          "ip4_addr", "ip4_broadcast", "ip4_netmask", "ip4_peer",
          "ip4_gw_addr", "ip4_gw_if", "ip4_gw_default",  
          "ip6_addr", "ip6_broadcast", "ip6_netmask", "ip6_peer",  
@@ -935,221 +2068,629 @@ class BMWatcher():
          # counters
          "carrier_down_count", "carrier_up_count", "carrier_changes",
       ] + attr_list_netdev
-      type_list = 37*[str] + 72*[int] + 27*[int]
-      counter_list = 109*[False] + 27*[True]
+      type_list = 34*[str] + 72*[int] + 27*[int]
+      counter_list = 106*[False] + 27*[True]
 
-      gws = netifaces.gateways()
-      active_ifs = []
+      gws = self._if_gateways()
+      if_names = {}
       
-      # DNS
-      # before ~2018 dns are stored in /etc/resolv.conf
-      nameserver=""
-      nameservers={}
-      with open('/etc/resolv.conf') as f:
-         for l in f.readlines():
-            if l.startswith("nameserver"):
-               nameserver = l.split()[-1]
-               break
-      # post-2018 systems use systemd based resolution
-      # 127.0.0.53 indicates such behavior
-      if not nameserver or nameserver == "127.0.0.53":
-         try:
-            res=subprocess.run(["systemd-resolve","--no-pager","--status"],
-                                capture_output=True)
-            this_if = "global"
-            for l in res.stdout.split(b'\n'):
-               if b"Link" in l:
-                  this_if=l.split()[-1][1:-1].decode()
-               elif b"Current DNS Server" in l:
-                  nameservers[this_if]=l.split()[-1].decode()
-         except:
-            self.info("systemd probe failed")
-
-      # DHCP
-      # parse dhcp lease files
-      dhcp_servers={}
-      prefix='/var/lib/dhcp/'
-      for suffix in os.listdir(prefix):
-         if not suffix.endswith("leases"):
+      self._resolver.refresh()
+
+      # links
+      for link in self._route.get_links():
+         index = link["index"]
+         link_attrs = dict(link["attrs"])
+         if_name = link_attrs.get("IFLA_IFNAME")
+         if not if_name:
             continue
-         with open(prefix+suffix) as f:
-            for l in f.readlines():
-               if "interface" in l:
-                  this_if = l.split()[-1][1:-2]
-               elif "dhcp-server-identifier" in l:
-                  dhcp_servers[this_if] = l.split()[-1][:-1]
-      
-      for if_name in netifaces.interfaces(): #os.listdir("/sys/class/net")
+         if_names[index] = if_name
          
          # create dict if interface was never observed
-         active_ifs.append(if_name)
          self._data["net/dev"].setdefault(if_name, init_rb_dict(attr_list, 
                                           types=type_list, counters=counter_list))
          if_dict = self._data["net/dev"][if_name]
-         # link
-         addrs = netifaces.ifaddresses(if_name)
-         if netifaces.AF_LINK in addrs:
-            # addresses
-            for item in addrs[netifaces.AF_LINK]:
-               if "addr" in item:
-                  if_dict["link_addr"].append(item["addr"])
-               if "broadcast" in item:
-                  if_dict["link_broadcast"].append(item["broadcast"])
-               if "peer" in item:
-                  if_dict["link_peer"].append(item["peer"])
-            # gateways
-            if netifaces.AF_LINK in gws:
-               for item in gws[netifaces.AF_LINK]:
-                  if item[1] != if_name:
-                     continue
-                  if_dict["link_gw_addr"].append(item[0])
-                  if_dict["link_gw_if"].append(item[1])
-                  if_dict["link_gw_default"].append(item[2])
-
-         # ip4
-         if netifaces.AF_INET in addrs:
-            # addr
-            for item in addrs[netifaces.AF_INET]:
-               if "addr" in item:
-                  if_dict["ip4_addr"].append(item["addr"])
-               if "broadcast" in item:
-                  if_dict["ip4_broadcast"].append(item["broadcast"])
-               if "netmask" in item:
-                  if_dict["ip4_netmask"].append(item["netmask"])
-               if "peer" in item:
-                  if_dict["ip4_peer"].append(item["peer"])
-            # gateways
-            if netifaces.AF_INET in gws:
-               for item in gws[netifaces.AF_INET]:
-                  if item[1] != if_name:
-                     continue
-                  if_dict["ip4_gw_addr"].append(item[0])
-                  if_dict["ip4_gw_if"].append(item[1])
-                  if_dict["ip4_gw_default"].append(item[2])
-
-         # ip6 addr
-         if netifaces.AF_INET6 in addrs:
-            # addr
-            for item in addrs[netifaces.AF_INET6]:
-               if "addr" in item:
-                  if_dict["ip6_addr"].append(item["addr"])
-               if "broadcast" in item:
-                  if_dict["ip6_broadcast"].append(item["broadcast"])
-               if "netmask" in item:
-                  if_dict["ip6_netmask"].append(item["netmask"])
-               if "peer" in item:
-                  if_dict["ip6_peer"].append(item["peer"])
-            # gateways
-            if netifaces.AF_INET6 in gws:
-               for item in gws[netifaces.AF_INET6]:
-                  if item[1] != if_name:
-                     continue
-                  if_dict["ip6_gw_addr"].append(item[0])
-                  if_dict["ip6_gw_if"].append(item[1])
-                  if_dict["ip6_gw_default"].append(item[2])
-                  
-         self.read_ethtool_info(if_name, if_dict)
-                  
-         #
-         # non-standard if attributes
-         # https://www.kernel.org/doc/Documentation/ABI/testing/sysfs-class-net
-         #
-         path_prefix="/sys/class/net/{}/".format(if_name)
-         self._open_read_append(path_prefix+"carrier_down_count",
-             if_dict["carrier_down_count"])
-         self._open_read_append(path_prefix+"carrier_up_count",
-             if_dict["carrier_up_count"])
-         self._open_read_append(path_prefix+"carrier_changes",
-             if_dict["carrier_changes"])             
-         self._open_read_append(path_prefix+"device/numa_node",
-             if_dict["numa_node"])
-         self._open_read_append(path_prefix+"device/local_cpulist",
-             if_dict["local_cpulist"])
-         self._open_read_append(path_prefix+"device/local_cpu",
-             if_dict["local_cpu"])
-         self._open_read_append(path_prefix+"device/enable",
-             if_dict["enable"])
-         self._open_read_append(path_prefix+"device/current_link_speed",
-             if_dict["current_link_speed"])
-         self._open_read_append(path_prefix+"device/current_link_width",
-             if_dict["current_link_width"])
-         self._open_read_append(path_prefix+"mtu",
-             if_dict["mtu"])
-         self._open_read_append(path_prefix+"tx_queue_len",
-             if_dict["tx_queue_len"])
-         self._open_read_append(path_prefix+"duplex",
-             if_dict["duplex"])
-         self._open_read_append(path_prefix+"carrier",
-             if_dict["carrier"])
-         self._open_read_append(path_prefix+"operstate",
-             if_dict["operstate"])
-         if_type = _linux_if_types.get(self._open_read(path_prefix+"type"),
-                                       "unknown")
-         if_dict["type"].append(if_type)
-         if_dict["wireless"].append(
-               int(os.path.exists(path_prefix+"wireless")))
+
+         # link addresses
+         flags = link["flags"]
+         if "IFLA_ADDRESS" in link_attrs:
+            if_dict["link_addr"].append(link_attrs["IFLA_ADDRESS"])
+         if "IFLA_BROADCAST" in link_attrs:
+            if flags & _iff_flags["point_to_point"]:
+               if_dict["link_peer"].append(link_attrs["IFLA_BROADCAST"])
+            else:
+               if_dict["link_broadcast"].append(link_attrs["IFLA_BROADCAST"])
+
+         # gateways
+         for family, prefix in [(socket.AF_INET, "ip4"),
+                                (socket.AF_INET6, "ip6")]:
+            if index not in gws[family]:
+               continue
+            gw_addr, gw_default = gws[family][index]
+            if_dict[prefix+"_gw_addr"].append(gw_addr)
+            if_dict[prefix+"_gw_if"].append(if_name)
+            if_dict[prefix+"_gw_default"].append(gw_default)
+
+         # link state
+         for attr, nla in [("mtu", "IFLA_MTU"),
+                           ("tx_queue_len", "IFLA_TXQLEN"),
+                           ("carrier", "IFLA_CARRIER"),
+                           ("carrier_changes", "IFLA_CARRIER_CHANGES"),
+                           ("carrier_up_count", "IFLA_CARRIER_UP_COUNT"),
+                           ("carrier_down_count", "IFLA_CARRIER_DOWN_COUNT")]:
+            if nla in link_attrs:
+               if_dict[attr].append(link_attrs[nla])
+         if "IFLA_OPERSTATE" in link_attrs:
+            if_dict["operstate"].append(link_attrs["IFLA_OPERSTATE"].lower())
+         if_dict["type"].append(_linux_if_types.get(str(link["ifi_type"]),
+                                                    "unknown"))
+         for attr, flag in _iff_flags.items():
+            if_dict[attr].append((flags & flag) != 0)
+
+         # 64-bit stats, fields are combined as in /proc/net/dev
+         stats = link_attrs.get("IFLA_STATS64")
+         if stats:
+            netdev_vals = [
+               stats["rx_bytes"], stats["rx_packets"], stats["rx_errors"],
+               stats["rx_dropped"] + stats["rx_missed_errors"],
+               stats["rx_fifo_errors"],
+               stats["rx_length_errors"] + stats["rx_over_errors"]
+                  + stats["rx_crc_errors"] + stats["rx_frame_errors"],
+               stats["rx_compressed"], stats["multicast"],
+               stats["tx_bytes"], stats["tx_packets"], stats["tx_errors"],
+               stats["tx_dropped"], stats["tx_fifo_errors"],
+               stats["collisions"],
+               stats["tx_carrier_errors"] + stats["tx_aborted_errors"]
+                  + stats["tx_window_errors"] + stats["tx_heartbeat_errors"],
+               stats["tx_compressed"],
+            ]
+            for attr, val in zip(attr_list_netdev, netdev_vals):
+               if_dict[attr].append(val)
+
+         self.read_ethtool_info(if_name, if_dict, index)
+         self._read_if_sysfs(if_name, if_dict, index,
+                             link_attrs.get("IFLA_CARRIER_CHANGES"))
          if_dict["dns_server"].append(
-               nameservers.get(if_name, nameserver))
+               self._resolver.dns_server(if_name, index))
          if_dict["dhcp_server"].append(
-               dhcp_servers.get(if_name, ""))               
-               
-      with open("/proc/net/dev", 'r') as f:
-         for l in f.readlines()[2:]:
-            attr_val = [e.rstrip(':') for e in l.rstrip().split()]
-            index = attr_val[0] 
-            self._data["net/dev"].setdefault(index, init_rb_dict(attr_list, 
-                                    types=type_list, counters=counter_list))
-            for i,e in enumerate(attr_val[1:]):
-               self._data["net/dev"][index][attr_list_netdev[i]].append(e)
-            active_ifs.append(index)
+               self._resolver.dhcp_server(if_name, index))
+
+      # addresses
+      for addr in self._route.get_addr():
+         if_name = if_names.get(addr["index"])
+         if not if_name:
+            continue
+         if_dict = self._data["net/dev"][if_name]
+         addr_attrs = dict(addr["attrs"])
+         if addr["family"] == socket.AF_INET:
+            prefix = "ip4"
+         elif addr["family"] == socket.AF_INET6:
+            prefix = "ip6"
+         else:
+            continue
+         # IFA_ADDRESS is the peer address on point-to-point links
+         local = addr_attrs.get("IFA_LOCAL", addr_attrs.get("IFA_ADDRESS"))
+         if not local:
+            continue
+         if_dict[prefix+"_addr"].append(local)
+         peer = addr_attrs.get("IFA_ADDRESS")
+         if peer and peer != local:
+            if_dict[prefix+"_peer"].append(peer)
+         if "IFA_BROADCAST" in addr_attrs:
+            if_dict[prefix+"_broadcast"].append(addr_attrs["IFA_BROADCAST"])
+         netmask = ipaddress.ip_interface("{}/{}".format(local,
+                                       addr["prefixlen"])).netmask
+         if prefix == "ip6":
+            if_dict[prefix+"_netmask"].append("{}/{}".format(netmask,
+                                              addr["prefixlen"]))
+         else:
+            if_dict[prefix+"_netmask"].append(str(netmask))
+
+      self._if_names = if_names
 
       # cleanup expired ifs
+      active_ifs = set(if_names.values())
       for monitored_ifs in list(self._data["net/dev"].keys()):
          if monitored_ifs not in active_ifs:
             del self._data["net/dev"][monitored_ifs]
+      for index in list(self._if_sysfs_cache.keys()):
+         if index not in if_names:
+            del self._if_sysfs_cache[index]
+      for index in list(self._ethtool_cache.keys()):
+         if index not in if_names:
+            del self._ethtool_cache[index]
+
+   def _process_qdiscs(self):
+      """
+      traffic-control qdiscs of all interfaces, from a single RTM_GETQDISC
+      dump
+
+      index is <if_name>:<parent>, i.e., <if_name>:root for the root
+      qdisc, whose statistics include its children (e.g., mq)
+      """
+      rows = {}
+      for qdisc in self._route.get_qdiscs():
+         if_name = self._if_names.get(qdisc["index"])
+         if not if_name:
+            continue
+         parent = qdisc["parent"]
+         if parent == _TC_H_ROOT:
+            parent_label = "root"
+         elif parent == _TC_H_INGRESS:
+            parent_label = "ingress"
+         else:
+            parent_label = "{:x}:{:x}".format(parent >> 16, parent & 0xffff)
+         handle = qdisc["handle"]
+         handle_label = "{:x}:{:x}".format(handle >> 16, handle & 0xffff)
+         stats2 = qdisc.get_attr("TCA_STATS2")
+         basic = stats2.get_attr("TCA_STATS_BASIC") if stats2 else None
+         queue = stats2.get_attr("TCA_STATS_QUEUE") if stats2 else None
+         if basic and queue:
+            counts = [basic["bytes"], basic["packets"], queue["drops"],
+                      queue["overlimits"], queue["requeues"],
+                      queue["backlog"], queue["qlen"]]
+         else:
+            # pre-2.6.15 kernels only have struct tc_stats
+            stats = qdisc.get_attr("TCA_STATS")
+            if not stats:
+               continue
+            counts = [stats["bytes"], stats["packets"], stats["drop"],
+                      stats["overlimits"], 0, stats["backlog"],
+                      stats["qlen"]]
+         rows["{}:{}".format(if_name, parent_label)] = [
+            if_name, qdisc.get_attr("TCA_KIND") or "", handle_label,
+            parent_label] + counts
+
+      qdiscs = self._data["net/qdisc"]
+      with qdiscs.lock():
+         for label in set(qdiscs)-set(rows):
+            del qdiscs[label]
+         for label in rows:
+            if label not in qdiscs:
+               qdiscs[label] = init_rb_dict(_qdisc_attrs, types=_qdisc_types,
+                                            counters=_qdisc_counters,
+                                            units=_qdisc_units)
+      append_rows([qdiscs[label] for label in rows], _qdisc_attrs,
+                  list(rows.values()))
             
+
+   def _process_rtnl_events(self):
+      """
+      dispatch pending rtnetlink events to their handlers
+
+      If events were lost, every tracked table is dumped again instead.
+
+      """
+      if not self._rtnl:
+         return
+      events = self._rtnl.poll()
+      if self._rtnl.resync:
+         self._rtnl.resync = False
+         # pending events are already reflected in the dumps
+         for resync in self._rtnl_resyncs:
+            resync()
+         return
+      for msg in events:
+         handler = self._rtnl_handlers.get(msg["event"])
+         if handler:
+            handler(msg)
+      if self._routes_flushed:
+         self._routes_flushed = False
+         self._dump_routes()
+
    def _process_routes(self):
-   
+      """
+      event-driven mode: per-cycle cost is proportional to route churn,
+                         see _on_route_event()
+      dump mode: routing tables are dumped every cycle
+
+      Aggregates (route count per protocol, table and next-hop, default
+      routes and churn) are kept for all tables. Per-route ringbuffers
+      are kept for the main table, or only for route_watch prefixes in
+      summary mode.
+
+      """
+      if self.parent.route_tracking == "dump":
+         self._dump_routes()
+
+      now = time.monotonic()
+      elapsed = now - self._routes_timestamp if self._routes_timestamp else 0
+      self._routes_timestamp = now
+      attr_list = ["total", "main", "default", "changes", "churn"]
+      type_list = [int, int, int, int, float]
+      counter_list = [False, False, False, True, False]
+      for family in _rt_families.values():
+         rbs = self._data["routes/summary"].setdefault(family,
+                  init_rb_dict(attr_list, types=type_list,
+                               counters=counter_list))
+         if elapsed and not rbs["changes"].is_empty():
+            rbs["churn"].append(round((self._route_changes[family]
+                                       - rbs["changes"]._top())/elapsed, 2))
+         rbs["total"].append(self._route_counts["total"][family])
+         rbs["main"].append(self._route_counts["main"][family])
+         rbs["default"].append(self._route_counts["default"][family])
+         rbs["changes"].append(self._route_changes[family])
+
+      for category in ["proto", "table", "nexthop"]:
+         counts = self._route_counts[category]
+         data = self._data["routes/"+category]
+         for label in list(counts.keys()):
+            if not any(counts[label].values()):
+               del counts[label]
+         for label in list(data.keys()):
+            if label not in counts:
+               del data[label]
+         for label, count in counts.items():
+            rbs = data.setdefault(label, init_rb_dict(list(count.keys())))
+            for family, val in count.items():
+               rbs[family].append(val)
+
+   def _on_link_event(self, link):
+      """
+      a link was added, removed or changed, read its ethtool and sysfs
+      info again
+
+      Routes through a link that is removed or goes down are flushed
+      without notification, routing tables are dumped again.
+
+      """
+      self.invalidate_link_caches(link["index"])
+      if (self.parent.route_tracking == "events"
+            and (link["event"] == "RTM_DELLINK"
+                 or not link["flags"] & _IFF_UP)):
+         self._routes_flushed = True
+
+   def _on_addr_event(self, addr):
+      """
+      an address was removed, its prefix and the routes through it were
+      flushed without notification
+
+      """
+      self._routes_flushed = True
+
+   def invalidate_link_caches(self, index=None):
+      """
+      invalidate cached per-interface info
+
+      @param index the interface index, or None for all interfaces
+      """
+      self._resolver.invalidate()
+      self._net_irqs = None
+      if index is None:
+         self._ethtool_cache.clear()
+         self._if_sysfs_cache.clear()
+      else:
+         self._ethtool_cache.pop(index, None)
+         self._if_sysfs_cache.pop(index, None)
+
+   def _route_dict_key(self, route, route_attrs):
+      """
+      @return (the routes dict of route family, route key)
+              or (None, None) if route is not tracked
+
+      """
+      # atm, we only consider main table
+      if route_attrs.get('RTA_TABLE', route['table']) != _RT_TABLE_MAIN:
+         return None, None
+      if route["family"] == socket.AF_INET:
+         route_dict = self._data["routes4"]
+      elif route["family"] == socket.AF_INET6:
+         route_dict = self._data["routes6"]
+      else:
+         return None, None
+
+      if 'RTA_DST' in route_attrs:
+         key = "{}/{}".format(route_attrs["RTA_DST"], route['dst_len'])
+      else:
+         key = "default"
+      if (self.parent.route_summary
+            and (route["family"], key) not in self._route_watch):
+         return None, None
+      return route_dict, key
+
+   def _reset_route_counts(self):
+      self._route_counts = {
+         "total": dict.fromkeys(_rt_families.values(), 0),
+         "main": dict.fromkeys(_rt_families.values(), 0),
+         "default": dict.fromkeys(_rt_families.values(), 0),
+         "proto": {}, "table": {}, "nexthop": {},
+      }
+
+   def _route_nexthops(self, route, route_attrs):
+      """
+      @return the list of next-hop labels of route
+      """
+      if 'RTA_GATEWAY' in route_attrs:
+         return [route_attrs['RTA_GATEWAY']]
+      elif 'RTA_MULTIPATH' in route_attrs:
+         return [nh.get_attr('RTA_GATEWAY') or "oif:{}".format(nh['oif'])
+                 for nh in route_attrs['RTA_MULTIPATH']]
+      elif 'RTA_OIF' in route_attrs:
+         return ["oif:{}".format(route_attrs['RTA_OIF'])]
+      return [rt_type.get(route['type'], str(route['type']))]
+
+   def _count_route(self, route, route_attrs, sign, replace=False):
+      """
+      add (sign=1) or remove (sign=-1) a route from aggregates
+
+      A replaced route is not counted again in totals. Replace
+      notifications do not carry the previous route, its protocol and
+      next-hops counts are corrected on next dump.
+
+      main counts main table routes but IPv6 link-local prefixes, that
+      are present on every interface. default counts unicast default
+      routes of all tables, e.g., of VRF tables.
+
+      """
+      family = _rt_families[route["family"]]
+      table = route_attrs.get('RTA_TABLE', route['table'])
+      table = _rt_tables.get(table, str(table))
+      proto = rt_proto.get(route['proto'], str(route['proto']))
+      nexthops = self._route_nexthops(route, route_attrs)
+
+      counts = self._route_counts
+      if not replace:
+         counts["total"][family] += sign
+         if (table == "main" and not str(route_attrs.get('RTA_DST',
+                                                         "")).startswith("fe80:")):
+            counts["main"][family] += sign
+         if (route['dst_len'] == 0 and table != "local"
+               and rt_type.get(route['type']) == "unicast"):
+            counts["default"][family] += sign
+      for category, label in ([("proto", proto), ("table", table)]
+                              + [("nexthop", nh) for nh in nexthops]):
+         count = counts[category].setdefault(label,
+                     dict.fromkeys(_rt_families.values(), 0))
+         count[family] += sign
+
+   def _append_route(self, route, route_dict, key, route_attrs):
+      """
+      append a RTM_NEWROUTE message to route ringbuffers
+
+      """
       # https://man7.org/linux/man-pages/man7/rtnetlink.7.html
       #
       extra_attrs = ['RTA_PRIORITY', 'RTA_GATEWAY', 'RTA_OIF', 'RTA_DST',
          'RTA_SRC', 'RTA_IIF', 'RTA_PREFSRC',]
       base_attrs = [ 'dst_len', 'src_len', 'tos', 'proto', 'scope',
-         'type',  
-      ] 
+         'type',
+      ]
       attrs = base_attrs+ extra_attrs
 
-      # atm, we only consider main table
-      for route in self._route.get_routes(table=254):
+      route['proto'] = rt_proto[route['proto']]
+      route['scope'] = rt_scope[route['scope']]
+      route['type'] = rt_type[route['type']]
+
+      route_dict.setdefault(key, init_rb_dict(attrs, type=str))
+      for attr in base_attrs:
+         route_dict[key][attr].append(route[attr])
+      for attr in extra_attrs:
+         if attr in route_attrs:
+            route_dict[key][attr].append(route_attrs[attr])
+
+   def _on_route_event(self, route):
+      """
+      apply a RTM_NEWROUTE/RTM_DELROUTE event
+
+      """
+      if route["family"] not in _rt_families:
+         return
+      route_attrs = dict(route["attrs"])
+      self._route_changes[_rt_families[route["family"]]] += 1
+      if route['event'] == 'RTM_NEWROUTE':
+         self._count_route(route, route_attrs, 1,
+               replace=bool(route['header']['flags'] & NLM_F_REPLACE))
+      else:
+         self._count_route(route, route_attrs, -1)
+
+      route_dict, key = self._route_dict_key(route, route_attrs)
+      if route_dict is None:
+         return
+      if route['event'] == 'RTM_NEWROUTE':
+         self._append_route(route, route_dict, key, route_attrs)
+      elif key in route_dict:
+         del route_dict[key]
+
+   def _dump_routes(self):
+      """
+      dump all tables, count routes and remove routes that are gone
+
+      In dump mode, churn is estimated from a digest per family, table
+      and protocol: the route count and the xor of route hashes. A digest
+      that changed counts the difference of its route counts as changes,
+      at least one. Event-driven mode counts events instead.
+
+      """
+      active_routes = set()
+      digests = {}
+      self._reset_route_counts()
+      for route in self._route.get_routes():
          if route['event'] != 'RTM_NEWROUTE':
             self.info("Unexpected route event: {}".format(route['event']))
-         route['proto'] = rt_proto[route['proto']]
-         route['scope'] = rt_scope[route['scope']]
-         route['type'] = rt_type[route['type']]
+         if route["family"] not in _rt_families:
+            continue
          route_attrs = dict(route["attrs"])
-         if route["family"] == socket.AF_INET:
-            route_dict = self._data["routes4"]
-         elif route["family"] == socket.AF_INET6:
-            route_dict = self._data["routes6"]
-            
-         if 'RTA_DST' in route_attrs:
-            key = "{}/{}".format(route_attrs["RTA_DST"], route['dst_len'])
-         else:
-            key = "default"
-         
-         route_dict.setdefault(key, init_rb_dict(attrs, type=str))
-         for attr in base_attrs:
-            route_dict[key][attr].append(route[attr])
-         for attr in extra_attrs:
-            if attr in route_attrs:
-               route_dict[key][attr].append(route_attrs[attr])
-      
+         self._count_route(route, route_attrs, 1)
+         if self.parent.route_tracking == "dump":
+            digest = digests.setdefault((route["family"],
+                        route_attrs.get('RTA_TABLE', route['table']),
+                        route['proto']), [0, 0])
+            digest[0] += 1
+            digest[1] ^= hash((route_attrs.get('RTA_DST'), route['dst_len'],
+                               route['tos'], route_attrs.get('RTA_PRIORITY'),
+                               route['type'],
+                               tuple(self._route_nexthops(route,
+                                                          route_attrs))))
+         route_dict, key = self._route_dict_key(route, route_attrs)
+         if route_dict is None:
+            continue
+         active_routes.add((route["family"], key))
+         self._append_route(route, route_dict, key, route_attrs)
+
+      # cleanup expired routes
+      for family, category in [(socket.AF_INET, "routes4"),
+                               (socket.AF_INET6, "routes6")]:
+         for key in list(self._data[category].keys()):
+            if (family, key) not in active_routes:
+               del self._data[category][key]
+
+      if self.parent.route_tracking != "dump":
+         return
+      if self._route_digests is not None:
+         previous = self._route_digests
+         for key in previous.keys() | digests.keys():
+            old, new = previous.get(key, [0, 0]), digests.get(key, [0, 0])
+            if old != new:
+               self._route_changes[_rt_families[key[0]]] += max(
+                                             abs(new[0]-old[0]), 1)
+      self._route_digests = digests
+
+   def _neigh_key(self, neigh):
+      """
+      @return the neighbour key, or None if neighbour is not tracked
+              (e.g., bridge fdb entries)
+
+      """
+      if neigh["family"] not in [socket.AF_INET, socket.AF_INET6]:
+         return None
+      dst = neigh.get_attr("NDA_DST")
+      if dst is None:
+         return None
+      return neigh["family"], neigh["ifindex"], dst
+
+   def _set_neigh(self, key, state, lladdr):
+      """
+      add or update a neighbour, and its interface state counts
+
+      """
+      ifindex = key[1]
+      counts = self._neigh_counts.setdefault(ifindex,
+                                             dict.fromkeys(_nud_names.values(), 0))
+      old = self._neighs.get(key)
+      if old:
+         counts[old[0]] -= 1
+      counts[state] += 1
+      self._neighs[key] = (state, lladdr)
+      if not old or old[0] != state:
+         self._neigh_changes[ifindex] = self._neigh_changes.get(ifindex, 0)+1
+
+   def _del_neigh(self, key):
+      old = self._neighs.pop(key, None)
+      if not old:
+         return
+      ifindex = key[1]
+      self._neigh_counts[ifindex][old[0]] -= 1
+      self._neigh_changes[ifindex] = self._neigh_changes.get(ifindex, 0)+1
 
-   def read_ethtool_info(self, if_name, if_dict):
+   def _on_neigh_event(self, neigh):
       """
+      apply a RTM_NEWNEIGH/RTM_DELNEIGH event
+
+      """
+      key = self._neigh_key(neigh)
+      if key is None:
+         return
+      if neigh["event"] == "RTM_NEWNEIGH":
+         self._set_neigh(key, _nud_names.get(neigh["state"], "none"),
+                         neigh.get_attr("NDA_LLADDR") or "")
+      else:
+         self._del_neigh(key)
+
+   def _dump_neighbours(self):
+      """
+      dump IPv4 and IPv6 neighbour tables, and remove neighbours that
+      are gone
+
+      """
+      active_neighs = set()
+      for neigh in self._route.get_neighbours():
+         key = self._neigh_key(neigh)
+         if key is None:
+            continue
+         active_neighs.add(key)
+         self._set_neigh(key, _nud_names.get(neigh["state"], "none"),
+                         neigh.get_attr("NDA_LLADDR") or "")
+      for key in list(self._neighs.keys()):
+         if key not in active_neighs:
+            self._del_neigh(key)
+
+   def _process_neighbours(self):
+      """
+      event-driven mode: neighbours are updated by _on_neigh_event()
+      dump mode: neighbour tables are dumped every cycle
+
+      Only per-interface state counts are kept in net/neigh, and full
+      entries for gateways in net/neigh/gw.
+
+      """
+      if self.parent.neigh_tracking == "dump":
+         self._dump_neighbours()
+
+      states = list(_nud_names.values())
+      attr_list = states + ["total", "changes", "ip4_gw_state",
+                            "ip6_gw_state"]
+      type_list = [int]*(len(states)+2) + [str]*2
+      counter_list = [False]*(len(states)+1) + [True] + [False]*2
+      gws = self._if_gateways()
+      active_gws = set()
+      for index, if_name in self._if_names.items():
+         if_dict = self._data["net/neigh"].setdefault(if_name,
+                     init_rb_dict(attr_list, types=type_list,
+                                  counters=counter_list))
+         counts = self._neigh_counts.get(index, {})
+         for state in states:
+            if_dict[state].append(counts.get(state, 0))
+         if_dict["total"].append(sum(counts.values()))
+         if_dict["changes"].append(self._neigh_changes.get(index, 0))
+
+         # gateways
+         for family, prefix in [(socket.AF_INET, "ip4"),
+                                (socket.AF_INET6, "ip6")]:
+            if index not in gws[family]:
+               continue
+            gw_addr, gw_default = gws[family][index]
+            state, lladdr = self._neighs.get((family, index, gw_addr),
+                                             ("none", ""))
+            if_dict[prefix+"_gw_state"].append(state)
+            key = gw_addr
+            if gw_addr.startswith("fe80"):
+               key = "{}%{}".format(gw_addr, if_name)
+            active_gws.add(key)
+            gw_dict = self._data["net/neigh/gw"].setdefault(key,
+                        init_rb_dict(["dev", "lladdr", "state", "default"],
+                                     type=str))
+            gw_dict["dev"].append(if_name)
+            gw_dict["lladdr"].append(lladdr)
+            gw_dict["state"].append(state)
+            gw_dict["default"].append(gw_default)
+
+      # cleanup expired ifs and gateways
+      for if_name in list(self._data["net/neigh"].keys()):
+         if if_name not in self._if_names.values():
+            del self._data["net/neigh"][if_name]
+      for index in list(self._neigh_counts.keys()):
+         if (index not in self._if_names
+               and not any(self._neigh_counts[index].values())):
+            del self._neigh_counts[index]
+            self._neigh_changes.pop(index, None)
+      for key in list(self._data["net/neigh/gw"].keys()):
+         if key not in active_gws:
+            del self._data["net/neigh/gw"][key]
+
+   def read_ethtool_info(self, if_name, if_dict, index):
+      """
+      read driver, features and ring parameters
+
+      They are cached per ifindex until a link event, a rename, or
+      _ethtool_ttl seconds elapsed.
 
       @see ethtool.c from python3-ethtool
       """
+      now = time.monotonic()
+      cached = self._ethtool_cache.get(index)
+      if cached and cached[0] == if_name and now - cached[1] < _ethtool_ttl:
+         return
+      self._ethtool_cache[index] = (if_name, now)
+
       getters = [("driver", ethtool.get_module), 
                  ("bus_info", ethtool.get_businfo),
                 # ("ufo", ethtool.get_ufo),
@@ -1162,7 +2703,8 @@ class BMWatcher():
             pass
             
       for feature in self._ethtool.get_features(if_name)[0].values():
-         if not feature.name or not feature.available:
+         if (not feature.name or not feature.available
+               or feature.name not in if_dict):
             continue
          #self.info("if: {} feature: {}".format(if_name,feature.name))
          if_dict[feature.name].append(int(feature.enable))
@@ -1183,26 +2725,6 @@ class BMWatcher():
             if_dict[attr].append(val)
       except:
          pass
-         
-      try:
-         flags = ethtool.get_flags(if_name)
-      except:
-         return
-      if_dict["broadcast"].append((flags & ethtool.IFF_BROADCAST) != 0)
-      if_dict["debug"].append((flags & ethtool.IFF_DEBUG) != 0)
-      #if_dict["loopback"].append((flags & ethtool.IFF_LOOPBACK) != 0)
-      if_dict["point_to_point"].append((flags & ethtool.IFF_POINTOPOINT) != 0)
-      if_dict["notrailers"].append((flags & ethtool.IFF_NOTRAILERS) != 0)
-      if_dict["running"].append((flags & ethtool.IFF_RUNNING) != 0)
-      if_dict["noarp"].append((flags & ethtool.IFF_NOARP) != 0)
-      if_dict["promisc"].append((flags & ethtool.IFF_PROMISC) != 0)
-      if_dict["allmulticast"].append((flags & ethtool.IFF_ALLMULTI) != 0)
-      if_dict["lb_master"].append((flags & ethtool.IFF_MASTER) != 0)
-      if_dict["lb_slave"].append((flags & ethtool.IFF_SLAVE) != 0)
-      if_dict["multicast_support"].append((flags & ethtool.IFF_MULTICAST) != 0)
-      if_dict["portselect"].append((flags & ethtool.IFF_PORTSEL) != 0)
-      if_dict["automedia"].append((flags & ethtool.IFF_AUTOMEDIA) != 0)
-      if_dict["dynamic"].append((flags & ethtool.IFF_DYNAMIC) != 0)
 
    def _process_net_settings(self):
       """
@@ -1287,6 +2809,13 @@ class BMWatcher():
          
          
    def exit(self):
+      self._fsprobe.exit()
+      self._batch.exit()
+      self._sockdiag.close()
+      if self._psi_triggers:
+         self._psi_triggers.exit()
       for c in self.gnmi_clients:
          c.disconnect()
+      if self._rtnl:
+         self._rtnl.close()
          
@@ -0,0 +1,258 @@
+"""
+cgroup_input.py
+
+   Input parsing for cgroup v2 hierarchy monitoring
+
+@author: K.Edeline
+"""
+
+import os
+import time
+
+from ..core.rbuffer import init_rb_dict
+from ..core.rbuffer import MDict
+from .psi import read_pressure
+
+# cgroup v2 mount points, pure v2 first then hybrid
+_cgroup2_roots = ["/sys/fs/cgroup", "/sys/fs/cgroup/unified"]
+
+# cpu.stat
+_cpu_stat_keys = ["usage_usec", "user_usec", "system_usec",
+                  "nr_periods", "nr_throttled", "throttled_usec"]
+# memory.stat, in bytes except for event counters
+_memory_stat_keys = ["anon", "file", "kernel_stack", "slab", "sock",
+                     "shmem", "file_dirty", "file_writeback"]
+_memory_stat_counters = ["pgfault", "pgmajfault"]
+# io.stat, summed over devices
+_io_stat_keys = ["rbytes", "wbytes", "rios", "wios"]
+# *.pressure
+_pressure_resources = ["cpu", "memory", "io"]
+_pressure_keys = [r+"_"+kind+"_"+field
+                  for r in _pressure_resources
+                  for kind in ["some", "full"]
+                  for field in ["avg10", "avg60", "total"]]
+
+def cgroup2_root():
+   """
+   @return the cgroup v2 mount point, None if not mounted
+   """
+   for root in _cgroup2_roots:
+      if os.path.exists(os.path.join(root, "cgroup.controllers")):
+         return root
+   return None
+
+def cgroup_label(rel_path):
+   """
+   @return the subservice name of a cgroup, subservice names cannot
+           contain '/'
+   """
+   return rel_path.replace("/", ":")
+
+def _read_flat_keyed(path):
+   """
+   parse a 'key value' cgroup file
+
+   """
+   d = {}
+   with open(path) as f:
+      for line in f:
+         key, val = line.split()
+         d[key] = int(val)
+   return d
+
+class CGroupWatcher():
+   """
+   CGroupWatcher
+
+   Walk the cgroup v2 hierarchy down to max_depth, and read cpu, memory,
+   io and pressure stats of each cgroup into data["cgroups"][label].
+
+   Directory mtimes are not updated by kernfs when cgroups are created or
+   removed, the hierarchy is instead rescanned below the cgroups whose
+   cgroup.stat nr_descendants changed. A full rescan is done every
+   rescan_interval seconds to catch creations and removals that cancel
+   each other out.
+
+   """
+   def __init__(self, data, info, parent):
+      self._data = data
+      self.info = info
+      self.parent = parent
+      self.max_depth = self.parent.cgroup_max_depth
+      self.rescan_interval = self.parent.cgroup_rescan_interval
+      self.root = cgroup2_root()
+      # hierarchy state, keyed by path relative to root ("" is root)
+      self._cgroups = set()
+      self._children = {}
+      self._descendants = {}
+      self._last_full_scan = None
+      self._timestamp = None
+      if self.root:
+         # cgroups are added and removed while the main thread iterates
+         self._data["cgroups"] = MDict()
+
+   def input(self):
+      """
+      rescan the hierarchy and read stats of tracked cgroups
+
+      """
+      if not self.root:
+         return
+      now = time.monotonic()
+      if (self._last_full_scan is None
+            or now - self._last_full_scan > self.rescan_interval):
+         self._descendants = {}
+         self._last_full_scan = now
+      self._scan("", 0)
+
+      elapsed = now - self._timestamp if self._timestamp else None
+      self._timestamp = now
+      for rel_path in list(self._cgroups):
+         try:
+            self._process_cgroup(rel_path, elapsed)
+         except FileNotFoundError:
+            # removed since last scan
+            self._drop(rel_path)
+
+   def exit(self):
+      pass
+
+   def _scan(self, rel_path, depth):
+      """
+      update children of rel_path if its number of descendants changed,
+      and recurse down to max_depth
+
+      """
+      path = os.path.join(self.root, rel_path)
+      try:
+         count = _read_flat_keyed(os.path.join(path,
+                                  "cgroup.stat"))["nr_descendants"]
+         if self._descendants.get(rel_path) == count:
+            return
+         children = set(os.path.join(rel_path, e.name)
+                        for e in os.scandir(path)
+                        if e.is_dir(follow_symlinks=False))
+      except (OSError, KeyError):
+         self._drop(rel_path)
+         return
+      self._descendants[rel_path] = count
+      for child in self._children.get(rel_path, set()) - children:
+         self._drop(child)
+      self._children[rel_path] = children
+      for child in children:
+         self._cgroups.add(child)
+         if depth+1 < self.max_depth:
+            self._scan(child, depth+1)
+
+   def _drop(self, rel_path):
+      """
+      forget a cgroup and its descendants
+
+      """
+      if not rel_path:
+         return
+      prefix = rel_path+"/"
+      for d in [self._cgroups, self._children, self._descendants]:
+         for p in [p for p in d if p == rel_path or p.startswith(prefix)]:
+            if isinstance(d, set):
+               d.discard(p)
+            else:
+               del d[p]
+      with self._data["cgroups"].lock():
+         for p in list(self._data["cgroups"]):
+            if p == cgroup_label(rel_path) or p.startswith(
+                                                cgroup_label(prefix)):
+               del self._data["cgroups"][p]
+
+   def _cgroup_dict(self, label):
+      """
+      @return ringbuffers of a cgroup, they are created if needed
+      """
+      cgroups = self._data["cgroups"]
+      if label not in cgroups:
+         attr_list = (["path", "cpu_usage_perc", "throttled_perc",
+                       "memory_current"]
+                      + _cpu_stat_keys + _memory_stat_keys
+                      + _memory_stat_counters + _io_stat_keys
+                      + _pressure_keys)
+         type_list = ([str, float, float, int]
+                      + [int]*len(_cpu_stat_keys)
+                      + [int]*len(_memory_stat_keys)
+                      + [int]*len(_memory_stat_counters)
+                      + [int]*len(_io_stat_keys)
+                      + [float if not k.endswith("total") else int
+                         for k in _pressure_keys])
+         counter_list = ([False]*4 + [True]*len(_cpu_stat_keys)
+                         + [False]*len(_memory_stat_keys)
+                         + [True]*len(_memory_stat_counters)
+                         + [True]*len(_io_stat_keys)
+                         + [k.endswith("total") for k in _pressure_keys])
+         with cgroups.lock():
+            cgroups[label] = init_rb_dict(attr_list, types=type_list,
+                                          counters=counter_list)
+      return cgroups[label]
+
+   def _process_cgroup(self, rel_path, elapsed):
+      """
+      read stat files of a cgroup, files of controllers that are not
+      enabled for this cgroup are missing and skipped
+
+      @param elapsed the time since last cycle, in seconds
+      """
+      path = os.path.join(self.root, rel_path)
+      # FileNotFoundError if cgroup was removed
+      cpu_stat = _read_flat_keyed(os.path.join(path, "cpu.stat"))
+      rbs = self._cgroup_dict(cgroup_label(rel_path))
+      rbs["path"].append("/"+rel_path)
+
+      # cpu
+      if elapsed and not rbs["usage_usec"].is_empty():
+         usage = cpu_stat["usage_usec"]-rbs["usage_usec"]._top()
+         rbs["cpu_usage_perc"].append(round(
+            usage/(elapsed*1000000.0)*100.0, 2))
+      if "nr_periods" in cpu_stat and not rbs["nr_periods"].is_empty():
+         periods = cpu_stat["nr_periods"]-rbs["nr_periods"]._top()
+         throttled = cpu_stat["nr_throttled"]-rbs["nr_throttled"]._top()
+         rbs["throttled_perc"].append(
+            round(throttled/periods*100.0, 2) if periods > 0 else 0.0)
+      for key in _cpu_stat_keys:
+         if key in cpu_stat:
+            rbs[key].append(cpu_stat[key])
+
+      # memory
+      try:
+         with open(os.path.join(path, "memory.current")) as f:
+            rbs["memory_current"].append(f.read())
+         memory_stat = _read_flat_keyed(os.path.join(path, "memory.stat"))
+         for key in _memory_stat_keys+_memory_stat_counters:
+            if key in memory_stat:
+               rbs[key].append(memory_stat[key])
+      except FileNotFoundError:
+         pass
+
+      # io
+      try:
+         io_stat = dict.fromkeys(_io_stat_keys, 0)
+         with open(os.path.join(path, "io.stat")) as f:
+            for line in f:
+               # MAJ:MIN rbytes=.. wbytes=.. rios=.. wios=.. ...
+               for field in line.split()[1:]:
+                  key, val = field.split("=")
+                  if key in io_stat:
+                     io_stat[key] += int(val)
+         for key, val in io_stat.items():
+            rbs[key].append(val)
+      except FileNotFoundError:
+         pass
+
+      # pressure stall information
+      for resource in _pressure_resources:
+         try:
+            pressure = read_pressure(os.path.join(path,
+                                                  resource+".pressure"))
+         except OSError:
+            continue
+         for key, val in pressure.items():
+            attr = resource+"_"+key
+            if attr in rbs:
+               rbs[attr].append(val)
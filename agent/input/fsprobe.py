@@ -0,0 +1,89 @@
+"""
+fsprobe.py
+
+   non-blocking filesystem probes
+
+@author: K.Edeline
+"""
+
+import queue
+import threading
+import concurrent.futures
+
+class FSProbe():
+   """
+   FSProbe
+
+   Run potentially blocking filesystem calls (e.g., statvfs on a hung NFS
+   or FUSE mount) on a bounded pool of daemon threads, and only wait up
+   to timeout seconds for them.
+
+   A call that is still pending is not submitted again, its key is
+   reported as unresponsive until it returns. A call that is still queued
+   behind hung calls is reported as unknown, it did not get a chance to
+   run. Hung workers are daemon threads, they do not prevent the agent
+   from exiting.
+
+   """
+   def __init__(self, workers=4, timeout=0.5):
+      self.timeout = timeout
+      self._queue = queue.Queue()
+      self._pending = {}
+      self._workers = [threading.Thread(target=self._work, daemon=True,
+                                        name="fsprobe-{}".format(i))
+                       for i in range(workers)]
+      for worker in self._workers:
+         worker.start()
+
+   def _work(self):
+      while True:
+         item = self._queue.get()
+         if item is None:
+            return
+         future, func, args = item
+         if not future.set_running_or_notify_cancel():
+            continue
+         try:
+            future.set_result(func(*args))
+         except Exception as e:
+            future.set_exception(e)
+
+   def run(self, calls):
+      """
+      run calls concurrently, and wait until they return or timeout
+      expires
+
+      @param calls a dict {key: (func, args)}
+      @return a dict {key: (responsive, result)}, result is None if the
+              call raised or did not return in time, responsive is None
+              if the call did not start in time
+      """
+      futures = {}
+      for key, (func, args) in calls.items():
+         future = self._pending.get(key)
+         if future is None or future.done():
+            future = concurrent.futures.Future()
+            self._queue.put((future, func, args))
+            self._pending[key] = future
+         futures[key] = future
+      concurrent.futures.wait(list(futures.values()), timeout=self.timeout)
+
+      ret = {}
+      for key, future in futures.items():
+         if not future.done():
+            ret[key] = (False if future.running() else None, None)
+            continue
+         del self._pending[key]
+         try:
+            ret[key] = (True, future.result())
+         except Exception:
+            ret[key] = (True, None)
+      # forget returned calls that are no longer probed
+      for key in [k for k,f in self._pending.items()
+                  if k not in calls and f.done()]:
+         del self._pending[key]
+      return ret
+
+   def exit(self):
+      for _ in self._workers:
+         self._queue.put(None)
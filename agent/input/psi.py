@@ -0,0 +1,119 @@
+"""
+psi.py
+
+   pressure stall information (PSI) parsing and triggers
+
+@author: K.Edeline
+"""
+
+import os
+import select
+import threading
+
+psi_resources = ["cpu", "memory", "io"]
+psi_kinds = ["some", "full"]
+psi_keys = [kind+"_"+field for kind in psi_kinds
+            for field in ["avg10", "avg60", "avg300", "total"]]
+# linux/kernel/sched/psi.c trigger window bounds, in us
+_psi_window_min = 500000
+_psi_window_max = 10000000
+
+def read_pressure(path):
+   """
+   parse a pressure file, i.e., /proc/pressure/<resource> or
+   <cgroup>/<resource>.pressure
+
+   @return a dict {<kind>_<field>: value}, e.g., some_avg10
+   """
+   d = {}
+   with open(path) as f:
+      for line in f:
+         kind, *fields = line.split()
+         for field in fields:
+            key, val = field.split("=")
+            d[kind+"_"+key] = int(val) if key == "total" else float(val)
+   return d
+
+def parse_trigger(trigger):
+   """
+   parse a trigger, e.g., "memory some 150000 1000000" for 150ms of
+   partial memory stall within a 1s window
+
+   @return (resource, kind, stall_us, window_us)
+   @raise ValueError if trigger is invalid
+   """
+   resource, kind, stall, window = trigger.split()
+   stall, window = int(stall), int(window)
+   if (resource not in psi_resources or kind not in psi_kinds
+         or not _psi_window_min <= window <= _psi_window_max
+         or not 0 < stall <= window):
+      raise ValueError(trigger)
+   return resource, kind, stall, window
+
+class PSITriggers():
+   """
+   PSITriggers
+
+   Register PSI triggers on /proc/pressure files, and wait for them on a
+   daemon thread. callback(resource) is called from that thread each time
+   a trigger fires, at most once per trigger window.
+
+   NOTE: pressure files are always readable, the kernel only signals
+         triggers with POLLPRI, they cannot be waited for on the asyncio
+         loop.
+
+   """
+   def __init__(self, triggers, callback, info):
+      """
+      @param triggers a list of (resource, kind, stall_us, window_us)
+      @param callback called with the resource name when a trigger fires
+      """
+      self.callback = callback
+      self.info = info
+      self.events = dict.fromkeys(psi_resources, 0)
+      self._fds = {}
+      self._poll = select.poll()
+      for resource, kind, stall, window in triggers:
+         path = os.path.join("/proc/pressure", resource)
+         try:
+            fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+         except OSError as e:
+            self.info("cannot open {}: {}".format(path, e))
+            continue
+         try:
+            os.write(fd, "{} {} {}\0".format(kind, stall, window).encode())
+         except OSError as e:
+            self.info("cannot register psi trigger {} {} {} {}: {}".format(
+                      resource, kind, stall, window, e))
+            os.close(fd)
+            continue
+         self._fds[fd] = resource
+         self._poll.register(fd, select.POLLPRI)
+      # exit() writes to the pipe to stop the thread
+      self._pipe_r, self._pipe_w = os.pipe()
+      self._poll.register(self._pipe_r, select.POLLIN)
+      self._thread = None
+      if self._fds:
+         self._thread = threading.Thread(target=self._wait, daemon=True,
+                                         name="psi-triggers")
+         self._thread.start()
+
+   def _wait(self):
+      while True:
+         for fd, event in self._poll.poll():
+            if fd == self._pipe_r:
+               return
+            if event & select.POLLERR:
+               # pressure file went away
+               self._poll.unregister(fd)
+               continue
+            resource = self._fds[fd]
+            self.events[resource] += 1
+            self.callback(resource)
+
+   def exit(self):
+      os.write(self._pipe_w, b"\0")
+      if self._thread:
+         self._thread.join()
+      for fd in list(self._fds)+[self._pipe_r, self._pipe_w]:
+         os.close(fd)
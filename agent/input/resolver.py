@@ -0,0 +1,167 @@
+"""
+resolver.py
+
+   Cached DNS and DHCP servers discovery
+
+@author: K.Edeline
+"""
+
+import os
+import time
+
+# revalidate at least every _resolver_ttl seconds
+_resolver_ttl = 300
+# files are stat'ed at most every _resolver_check_interval seconds,
+# unless the cache is invalidated
+_resolver_check_interval = 60
+
+_resolv_conf = "/etc/resolv.conf"
+# systemd-resolved and systemd-networkd runtime state
+_resolved_conf = "/run/systemd/resolve/resolv.conf"
+_resolved_netif_dir = "/run/systemd/resolve/netif/"
+_networkd_leases_dir = "/run/systemd/netif/leases/"
+# dhclient lease files
+_dhclient_leases_dir = "/var/lib/dhcp/"
+
+class ResolverCache():
+   """
+   ResolverCache
+
+   Discover DNS and DHCP servers from resolv.conf, systemd-resolved and
+   systemd-networkd state files and dhclient leases, without forking.
+
+   Files are parsed again only if one of their mtime changed, if one was
+   added or removed, or if the cache is older than _resolver_ttl. They are
+   only checked every check_interval seconds, or after invalidate().
+
+   """
+   def __init__(self, ttl=_resolver_ttl,
+                check_interval=_resolver_check_interval):
+      self.ttl = ttl
+      self.check_interval = check_interval
+      self._signature = None
+      self._timestamp = 0
+      self._checked = None
+      self.nameserver = ""
+      self._nameservers = {}
+      self._dhcp_servers = {}
+
+   def _scan(self, path):
+      """
+      @return list of (path, mtime) for path and its entries,
+              empty if path does not exist
+      """
+      try:
+         st = os.stat(path)
+      except OSError:
+         return []
+      ret = [(path, st.st_mtime_ns)]
+      if not os.path.isdir(path):
+         return ret
+      try:
+         with os.scandir(path) as it:
+            for e in it:
+               ret.append((e.path, e.stat().st_mtime_ns))
+      except OSError:
+         pass
+      return sorted(ret)
+
+   def _parse_kv(self, path):
+      """
+      parse systemd KEY=value state file
+
+      """
+      ret = {}
+      try:
+         with open(path) as f:
+            for l in f.readlines():
+               if "=" not in l or l.startswith("#"):
+                  continue
+               k, v = l.rstrip().split("=", 1)
+               ret[k] = v
+      except OSError:
+         pass
+      return ret
+
+   def _parse_resolv_conf(self, path):
+      try:
+         with open(path) as f:
+            for l in f.readlines():
+               if l.startswith("nameserver"):
+                  return l.split()[-1]
+      except OSError:
+         pass
+      return ""
+
+   def _parse(self):
+      # before ~2018 dns are stored in /etc/resolv.conf
+      # post-2018 systems use systemd based resolution
+      # 127.0.0.53 indicates such behavior
+      self.nameserver = self._parse_resolv_conf(_resolv_conf)
+      if not self.nameserver or self.nameserver == "127.0.0.53":
+         self.nameserver = (self._parse_resolv_conf(_resolved_conf)
+                            or self.nameserver)
+
+      # per-link systemd-resolved servers, indexed by ifindex
+      self._nameservers = {}
+      for path, _ in self._scan(_resolved_netif_dir)[1:]:
+         servers = self._parse_kv(path).get("SERVERS", "").split()
+         if servers:
+            self._nameservers[os.path.basename(path)] = servers[0]
+
+      # dhcp servers, indexed by ifindex (networkd) or if_name (dhclient)
+      self._dhcp_servers = {}
+      for path, _ in self._scan(_networkd_leases_dir)[1:]:
+         server = self._parse_kv(path).get("SERVER_ADDRESS")
+         if server:
+            self._dhcp_servers[os.path.basename(path)] = server
+      for path, _ in self._scan(_dhclient_leases_dir)[1:]:
+         if not path.endswith("leases"):
+            continue
+         try:
+            with open(path) as f:
+               this_if = None
+               for l in f.readlines():
+                  if "interface" in l:
+                     this_if = l.split()[-1][1:-2]
+                  elif "dhcp-server-identifier" in l and this_if:
+                     self._dhcp_servers[this_if] = l.split()[-1][:-1]
+         except OSError:
+            pass
+
+   def refresh(self):
+      """
+      revalidate cache
+
+      @return True if files were parsed again
+      """
+      now = time.monotonic()
+      if (self._checked is not None
+            and now - self._checked < self.check_interval):
+         return False
+      self._checked = now
+      signature = [self._scan(path) for path in [_resolv_conf,
+                     _resolved_conf, _resolved_netif_dir,
+                     _networkd_leases_dir, _dhclient_leases_dir]]
+      if (signature == self._signature
+            and now - self._timestamp < self.ttl):
+         return False
+      self._signature = signature
+      self._timestamp = now
+      self._parse()
+      return True
+
+   def invalidate(self):
+      """
+      check files on next refresh, e.g., after a link change
+
+      """
+      self._checked = None
+
+   def dns_server(self, if_name, index):
+      return self._nameservers.get(str(index), self.nameserver)
+
+   def dhcp_server(self, if_name, index):
+      return self._dhcp_servers.get(str(index),
+               self._dhcp_servers.get(if_name, ""))
+
@@ -0,0 +1,56 @@
+"""
+rtnl.py
+
+   rtnetlink event monitoring
+
+@author: K.Edeline
+"""
+
+import errno
+import select
+import socket
+import pyroute2
+
+class RtnlMonitor():
+   """
+   RtnlMonitor
+
+   Subscribe to rtnetlink multicast groups on a dedicated socket, and
+   fetch pending events without blocking.
+
+   If the socket receive buffer overflows, events are lost and resync is
+   set to True: consumers are expected to re-dump the tables they track
+   and to clear the flag.
+
+   """
+   def __init__(self, groups, rcvbuf=None):
+      self.groups = groups
+      # start with a full dump
+      self.resync = True
+      self._ipr = pyroute2.IPRoute()
+      if rcvbuf:
+         self._ipr.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+      self._ipr.bind(groups=self.groups)
+
+   def fileno(self):
+      return self._ipr.fileno()
+
+   def poll(self):
+      """
+      @return the list of pending rtnetlink messages
+
+      """
+      msgs = []
+      while select.select([self._ipr], [], [], 0)[0]:
+         try:
+            msgs.extend(self._ipr.get())
+         except OSError as e:
+            if e.errno != errno.ENOBUFS:
+               raise
+            # events were dropped by the kernel, keep draining
+            self.resync = True
+      return msgs
+
+   def close(self):
+      self._ipr.close()
+
@@ -0,0 +1,135 @@
+"""
+sockdiag.py
+
+   NETLINK_SOCK_DIAG inet sockets dump
+
+@author: K.Edeline
+"""
+
+import os
+import socket
+import struct
+
+# linux/include/uapi/linux/netlink.h
+NETLINK_SOCK_DIAG = 4
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 0x2
+NLMSG_DONE = 0x3
+# linux/include/uapi/linux/sock_diag.h
+SOCK_DIAG_BY_FAMILY = 20
+# linux/include/uapi/linux/inet_diag.h
+INET_DIAG_INFO = 2
+
+# linux/include/net/tcp_states.h
+tcp_states = {1: "established", 2: "syn_sent", 3: "syn_recv",
+              4: "fin_wait1", 5: "fin_wait2", 6: "time_wait", 7: "close",
+              8: "close_wait", 9: "last_ack", 10: "listen", 11: "closing",
+              12: "new_syn_recv"}
+TCP_ESTABLISHED = 1
+TCP_LISTEN = 10
+_all_states = 0xffffffff
+
+# struct nlmsghdr
+_nlmsghdr = struct.Struct("=IHHII")
+# struct inet_diag_req_v2, with a zeroed struct inet_diag_sockid
+_inet_diag_req_v2 = struct.Struct("=BBBxI48x")
+# struct inet_diag_msg (72 bytes): family, state, timer, retrans,
+# sport, dport (network order), then rqueue and wqueue at offset 56
+_inet_diag_msg = struct.Struct("!BBBBHH")
+_inet_diag_msg_len = 72
+_inet_diag_queues = struct.Struct("=II")
+# struct rtattr
+_rtattr = struct.Struct("=HH")
+# struct tcp_info: unacked, sacked, lost, retrans at offset 24, and
+# total_retrans at offset 100
+_tcp_info_retrans = struct.Struct("=I8xI")
+_tcp_info_total_retrans = struct.Struct("=I")
+
+def _align(length):
+   return (length+3) & ~3
+
+class SockDiag():
+   """
+   SockDiag
+
+   Dump inet sockets over NETLINK_SOCK_DIAG. Responses are parsed in place
+   from a reusable receive buffer, one socket at a time, the socket list is
+   never materialized.
+
+   """
+   def __init__(self, bufsize=128*1024):
+      self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                 NETLINK_SOCK_DIAG)
+      self._sock.bind((0, 0))
+      self._buf = bytearray(bufsize)
+      self._view = memoryview(self._buf)
+      self._seq = 0
+
+   def dump(self, family, protocol, states=_all_states, info=False):
+      """
+      dump sockets of a family and protocol
+
+      @param states a bitmask of tcp_states, 1<<state
+      @param info request struct tcp_info (TCP only)
+      @return a generator of (state, sport, dport, rqueue, wqueue,
+              unacked, retrans, total_retrans), tcp_info fields are 0
+              if info is False. For listening sockets, rqueue and wqueue
+              are the accept queue length and its maximum.
+      """
+      self._seq += 1
+      ext = 1 << (INET_DIAG_INFO-1) if info else 0
+      req = _inet_diag_req_v2.pack(family, protocol, ext, states)
+      hdr = _nlmsghdr.pack(_nlmsghdr.size+len(req), SOCK_DIAG_BY_FAMILY,
+                           NLM_F_REQUEST | NLM_F_DUMP, self._seq, 0)
+      self._sock.send(hdr+req)
+
+      buf, view = self._buf, self._view
+      while True:
+         length = self._sock.recv_into(buf)
+         offset = 0
+         while offset+_nlmsghdr.size <= length:
+            msg_len, msg_type, _, seq, _ = _nlmsghdr.unpack_from(buf, offset)
+            if msg_len < _nlmsghdr.size:
+               return
+            if seq != self._seq:
+               offset += _align(msg_len)
+               continue
+            if msg_type == NLMSG_DONE:
+               return
+            if msg_type == NLMSG_ERROR:
+               error = -struct.unpack_from("=i", buf,
+                                           offset+_nlmsghdr.size)[0]
+               if error:
+                  raise OSError(error, os.strerror(error))
+               return
+            yield self._parse(view, offset+_nlmsghdr.size,
+                              offset+msg_len)
+            offset += _align(msg_len)
+
+   def _parse(self, view, start, end):
+      """
+      parse a struct inet_diag_msg and its attributes
+
+      """
+      _, state, _, _, sport, dport = _inet_diag_msg.unpack_from(view, start)
+      rqueue, wqueue = _inet_diag_queues.unpack_from(view, start+56)
+      unacked, retrans, total_retrans = 0, 0, 0
+      offset = start+_inet_diag_msg_len
+      while offset+_rtattr.size <= end:
+         rta_len, rta_type = _rtattr.unpack_from(view, offset)
+         if rta_len < _rtattr.size:
+            break
+         # older kernels have a shorter struct tcp_info
+         if rta_type == INET_DIAG_INFO and rta_len >= _rtattr.size+104:
+            data = offset+_rtattr.size
+            unacked, retrans = _tcp_info_retrans.unpack_from(view, data+24)
+            total_retrans, = _tcp_info_total_retrans.unpack_from(view,
+                                                                data+100)
+         offset += _align(rta_len)
+      return (state, sport, dport, rqueue, wqueue, unacked, retrans,
+              total_retrans)
+
+   def close(self):
+      self._view.release()
+      self._sock.close()
@@ -9,8 +9,6 @@ vpp_input.py
 import os
 import fnmatch
 import json
-import threading
-import time
  
 vpp_libs=[]
 # VPP BM libs
@@ -31,16 +29,7 @@ except:
 
 from ..core.rbuffer import init_rb_dict
 from ..core.rbuffer import RingBuffer
-
-#
-# The rate at which gNMI sends updates
-GNMI_SAMPLING_PERIOD=int(1e9)*10
-#
-# gNMI client max consecutive retries
-MAX_RETRIES=3
-#
-# time for gNMI to wait before retry connecting
-GNMI_RETRY_INTERVAL=30
+from ..gnmi.client import BaseGNMIClient
 
 def vpp_support(api_sock='/run/vpp/api.sock',
                 stats_sock='/run/vpp/stats.sock'):
@@ -53,21 +42,8 @@ def vpp_support(api_sock='/run/vpp/api.sock',
            "vpp" in vpp_libs and os.path.exists(stats_sock),
            "gnmi" in vpp_libs)
 
-class VPPGNMIClient(threading.Thread):
-   def __init__(self, node, info, data, user='a', password='a'):
-      super().__init__()
-      self.node = node
-      self.info = info
-      self._data = data
-      self.user = user
-      self.password = password
-      self.client = None
-      self.connected = False
-      self.last_attempt = None
-      self.retry=0
-      self._exit=False
-      self.synced = False
-      
+class VPPGNMIClient(BaseGNMIClient):
+
    def append_value(self, path, root, val):
       """
       append value to data dict
@@ -119,82 +95,6 @@ class VPPGNMIClient(threading.Thread):
          for name in path_json[2:]:
             path += "/{}".format(name["name"])
          self.append_value(path, root, val)
-         
-   def disconnect(self):
-      self._exit=True
-
-   def connect(self):
-      """
-      connect
-      
-      If more than MAX_RETRIES, do not connect. Wait at least 
-      GNMI_RETRY_INTERVAL before re-connecting.
-
-      """
-      # too much retries
-      if self.retry > MAX_RETRIES:
-         return False
-      # Less than GNMI_RETRY_INTERVAL since last attempt
-      if (self.last_attempt != None and
-         time.time()-self.last_attempt < GNMI_RETRY_INTERVAL):
-         return False
-      self.last_attempt = time.time()
-
-      self.info("connecting to gNMI node {}".format(self.node))
-      try:
-         builder = ClientBuilder(self.node)
-         builder.set_secure_from_target()
-         builder.set_call_authentication(self.user, self.password)
-         self.client = builder.construct()
-         self.connected=True
-         self.retry = 0
-         return True
-      except Exception as e:
-         self.info(e)
-         self.retry += 1
-         return False
-
-   def is_connected(self):
-      return self.connected and self.is_alive()
-
-   def status(self):
-      """
-      @return synced, fetching, connected, abandonned, connecting
-      
-      """
-      if self.connected and self.is_alive():
-         if self.synced:
-            return "synced"    
-         else: 
-            return "fetching"
-      if self.connected and not self.is_alive():
-         return "connected"
-      if not self.connected and self.retry > MAX_RETRIES:
-         return "abandonned"
-      if not self.connected and self.retry <= MAX_RETRIES:
-         return "connecting"
-
-   def run(self,xpath="/"):
-      """
-      
-      """
-      _synced = False
-
-      try:
-         for response in self.client.subscribe_xpaths(xpath,
-                         sample_interval=GNMI_SAMPLING_PERIOD):
-            if self._exit:
-               break
-            if response.sync_response:
-               _synced = True
-            elif _synced:
-               self.parse_json(json_format.MessageToJson(response))
-               self.synced = True
-      except Exception as e:
-         self.info(e)
-      finally:
-         self.connected = False
-         self.synced = False
 
 class VPPWatcher():
    def __init__(self, data={}, info=None, parent=None,
@@ -232,7 +132,8 @@ class VPPWatcher():
          self._data["vpp/gnmi"][node] = init_rb_dict(attr_names, type=str,
                                                      thread_safe=True)
          self._data["vpp/gnmi"][node].update({"net_if":{}})
-         self.gnmi_clients.append(VPPGNMIClient(node, self.info, self._data))
+         self.gnmi_clients.append(VPPGNMIClient(node, self.info, self._data,
+                                                self.parent.loop))
       self._connect_gnmi_clients()
 
    def _connect_gnmi_clients(self):